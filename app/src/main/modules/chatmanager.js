@@ -103,6 +103,8 @@ class ChatManager{
     }
     /**
      * Uploads one or more files to the backend for processing.
+     * Each file is streamed as a raw request body, then the batch is committed for processing.
+     * Falls back to the JSON upload when the backend does not provide the raw upload endpoint.
      * @param {FileList|Array} files - Files to upload.
      * @param {boolean} immediate - Whether to process files immediately after upload.
      * @returns {Promise<string|undefined>} - Success message from server or undefined on failure.
@@ -116,6 +118,55 @@ class ChatManager{
             return;
         }
         console.log('file uploaded : ',files);
+        try {
+            const uploaded = [];
+            for(const file of Array.from(files)){
+                const params = new URLSearchParams({id:file.id,name:file.name,session_id:this.session_id});
+                const response = await fetch(`${this.server_address}/upload/raw?${params}`, {
+                    method: "POST",
+                    headers: {
+                        'Content-Type': 'application/octet-stream'
+                    },
+                    body: new Uint8Array(file.arrayBuffer)
+                });
+                if(response.status === 404){
+                    return await this.uploadFileJSON(files,immediate);
+                }
+                if(!response.ok){
+                    console.error("Upload failed", await response.text());
+                    return;
+                }
+                const result = await response.json();
+                console.log(`Uploaded ${result.name} : ${result.bytes} bytes at ${result.mb_per_s.toFixed(1)} MB/s`);
+                uploaded.push({id:file.id,name:file.name,token:result.token});
+            }
+
+            const response = await fetch(`${this.server_address}/upload/commit`, {
+                method: "POST",
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({session_id:this.session_id,files:uploaded,IMMEDIATE_PROCESS:immediate})
+            });
+
+            if(!response.ok){
+                console.error("Upload failed", await response.text());
+                return;
+            }
+            
+            const data = await response.json();
+            return data.message;
+        } catch(error) {
+            console.error("Upload failed: ", error);
+        }
+    }
+    /**
+     * Uploads files with their bytes inside a JSON body. Used with backends without /upload/raw.
+     * @param {FileList|Array} files - Files to upload.
+     * @param {boolean} immediate - Whether to process files immediately after upload.
+     * @returns {Promise<string|undefined>} - Success message from server or undefined on failure.
+     */
+    async uploadFileJSON(files,immediate){
         try {
             // Convert files to ArrayBuffer format
             const filesData = await Promise.all(Array.from(files).map(async (file) => {
@@ -160,6 +211,8 @@ class ChatManager{
      */
     async loadSession(userId,courseId,topicId){
         const sessionId = path.join(userId,courseId,topicId);
+        // Uploads name the session they belong to, so switching sessions cannot misplace them
+        this.session_id = sessionId;
         
         const response = await fetch(`${this.server_address}/loadSession`,{
             method:"POST",
@@ -0,0 +1,102 @@
+"""
+Decode and resample time per minute of audio for the Whisper input path.
+
+Writes synthetic stereo recordings at common sample rates and formats, then decodes
+each one to 16kHz mono float32 with:
+  - legacy:  soundfile read, then librosa.resample when installed, else scipy's
+             resample_poly designing its filter on every call (the old _load_audio_direct)
+  - decoder: AudioDecoder.load, with the cached polyphase filter
+  - blocks:  AudioDecoder.iter_blocks, the streaming path of transcribe_stream
+  - ffmpeg:  AudioDecoder.load piping PCM from FFmpeg, when FFmpeg is on the PATH
+For each file and method it reports the median milliseconds per audio minute over
+the repeats and the speedup of each method over "legacy".
+
+Run from the python/ folder:
+    python -m benchmarks.bench_audio_decode --minutes 5 --output audio_decode.json
+"""
+import argparse
+import time
+import numpy as np
+from modules.AudioModules import AUDIO_DECODER,SAMPLE_RATE
+from benchmarks.common import git_commit,percentiles,scratch_workdir,write_results
+
+METHODS = ["legacy", "decoder", "blocks", "ffmpeg"]
+
+def synthetic_audio(seconds: float, sample_rate: int, seed: int = 0) -> np.ndarray:
+    """Stereo float32 audio with speech-like bursts of harmonics over background noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 120 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    voice = sum(np.sin(2 * np.pi * k * np.cumsum(pitch) / sample_rate) / k for k in range(1, 6))
+    envelope = (np.sin(2 * np.pi * 0.5 * t) > -0.3).astype(np.float64)
+    mono = 0.2 * voice * envelope + 0.01 * rng.standard_normal(len(t))
+    return np.stack([mono, 0.9 * mono], axis=1).astype(np.float32)
+
+def legacy_load(path: str) -> np.ndarray:
+    import soundfile as sf
+    audio, sample_rate = sf.read(path)
+    if len(audio.shape) > 1 and audio.shape[1] > 1:
+        audio = audio.mean(axis=1)
+    if sample_rate != SAMPLE_RATE:
+        try:
+            from librosa import resample
+            audio = resample(y=audio, orig_sr=sample_rate, target_sr=SAMPLE_RATE)
+        except ImportError:
+            import scipy.signal
+            audio = scipy.signal.resample_poly(audio, SAMPLE_RATE, sample_rate)
+    return audio.astype(np.float32)
+
+def run_method(method, path):
+    if method == "legacy":
+        return legacy_load(path)
+    if method == "decoder":
+        return AUDIO_DECODER.load(path)
+    if method == "blocks":
+        return np.concatenate(list(AUDIO_DECODER.iter_blocks(path)))
+    return AUDIO_DECODER.load(path, backend="ffmpeg")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=2)
+    parser.add_argument("--rates", type=int, nargs="+", default=[44100, 48000, 16000])
+    parser.add_argument("--formats", nargs="+", default=["wav", "flac"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=METHODS)
+    parser.add_argument("--output", help="Write JSON results to this file.")
+    args = parser.parse_args()
+    import soundfile as sf
+    methods = [method for method in args.methods if method != "ffmpeg" or AUDIO_DECODER._ffmpeg_path]
+    results = []
+    with scratch_workdir():
+        for rate in args.rates:
+            audio = synthetic_audio(args.minutes * 60, rate)
+            for extension in args.formats:
+                path = f"audio-{rate}.{extension}"
+                sf.write(path, audio, rate)
+                row = {"sample_rate": rate, "format": extension}
+                for method in methods:
+                    # The first run also warms the OS file cache and any lazy imports
+                    run_method(method, path)
+                    timings = []
+                    for _ in range(args.repeats):
+                        start = time.perf_counter()
+                        decoded = run_method(method, path)
+                        timings.append((time.perf_counter() - start) * 1000 / args.minutes)
+                    row[f"{method}_ms_per_minute"] = percentiles(timings, (50,))["p50"]
+                    row[f"{method}_samples"] = len(decoded)
+                legacy = row.get("legacy_ms_per_minute")
+                for method in methods:
+                    row[f"{method}_speedup"] = legacy / row[f"{method}_ms_per_minute"] if legacy else None
+                results.append(row)
+                print(row)
+    write_results({
+        "benchmark": "audio_decode",
+        "commit": git_commit(),
+        "minutes": args.minutes,
+        "soundfile_formats": sorted(AUDIO_DECODER.soundfile_formats),
+        "ffmpeg": AUDIO_DECODER._ffmpeg_path,
+        "results": results,
+    }, args.output)
+
+if __name__ == "__main__":
+    main()
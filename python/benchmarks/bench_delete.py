@@ -0,0 +1,46 @@
+"""
+Delete latency against index size.
+
+Builds document indexes of increasing size with a stub embedding model, then
+deletes one file and times `delete_by_metadata_id`. The `reembed_ms` column is
+the time the embedding model needs to re-encode every surviving chunk, which is
+what a delete used to cost on top of the index rebuild.
+
+Run from the python/ folder:
+    python -m benchmarks.bench_delete --sizes 1000 10000 50000 --output delete.json
+"""
+import argparse
+import time
+from modules.FAISSModules import DocumentFaissManager
+from modules.EmbeddingModules import BASE_EMBEDDING_MODEL
+from benchmarks.common import StubEmbeddingModel,fill_documents,scratch_workdir,timer,write_results
+
+def run(sizes, chunks_per_file, embedding_model):
+    results = []
+    for size in sizes:
+        with scratch_workdir():
+            manager = DocumentFaissManager(embedding_model=embedding_model, session_id="bench", index_path="doc.index")
+            row = {"index_size": size}
+            with timer(row, "ingest_ms"):
+                fill_documents(manager, size, chunks_per_file)
+            with timer(row, "delete_ms"):
+                row["deleted"] = manager.delete_by_metadata_id("file-0")
+            texts = [manager.get_embedding_text(metadata) for metadata in manager.metadata.values()]
+            start = time.perf_counter()
+            embedding_model.encode(texts, batch_size=64)
+            row["reembed_ms"] = (time.perf_counter() - start) * 1000
+            results.append(row)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--chunks-per-file", type=int, default=50)
+    parser.add_argument("--real-model", action="store_true", help="Use the SentenceTransformer model instead of the stub.")
+    parser.add_argument("--output", help="Write JSON results to this file.")
+    args = parser.parse_args()
+    embedding_model = BASE_EMBEDDING_MODEL if args.real_model else StubEmbeddingModel()
+    write_results({"benchmark": "delete", "results": run(args.sizes, args.chunks_per_file, embedding_model)}, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Time-to-first-token benchmark for LLMManager.stream_generator and the prompt cache.
+
+Simulates a conversation that alternates between two sessions with different retrieved
+context, so consecutive prompts only share the static instructions. Each turn asks a
+new question and generates a few tokens. Prompt cache modes compared:
+  - cold: the model context is reset before every turn (full prompt evaluation)
+  - none: no prompt cache, llama.cpp only reuses the prefix still in its context
+  - ram:  LLM_PROMPT_CACHE="ram"
+  - disk: LLM_PROMPT_CACHE="disk" (one cache per session)
+For each mode it reports time to first token (p50/p95/p99, ms) over the turns after the
+first of each session, and the median speedup over "cold".
+
+Needs the GGUF model at config.MODEL_PATH. Run from the python/ folder:
+    python -m benchmarks.bench_generation --turns 12 --output generation.json
+"""
+import argparse
+import random
+from modules import config
+from modules.LLMModules import LLMManager,load_llm
+from benchmarks.common import StubEmbeddingModel,git_commit,percentiles,scratch_workdir,synthetic_text,write_results
+
+MODES = ["cold", "none", "ram", "disk"]
+
+def session_context(rng: random.Random, chunks: int) -> str:
+    """Retrieved-context block like the one format_prompt builds, from synthetic chunks."""
+    context = "Added Information : \n"
+    for i in range(chunks):
+        context += f"Type: document\nTitle: notes-{i}\nText: {synthetic_text(rng, 60)}\n"
+    return context
+
+def run_mode(llm, mode, contexts, questions, max_tokens):
+    llm.set_cache(None)
+    llm.reset()
+    config.LLM_PROMPT_CACHE = "none" if mode == "cold" else mode
+    llm_manager = LLMManager(embedding_model=StubEmbeddingModel(), stt_model=None, session_id="bench-generation", llm=llm)
+    ttfts = []
+    for turn, question in enumerate(questions):
+        session = turn % len(contexts)
+        llm_manager.session_id = f"bench-session-{session}"
+        if mode == "cold":
+            llm.reset()
+        prompt = llm_manager.build_chat_prompt(question, contexts[session])
+        for _ in llm_manager.stream_generator(prompt, max_tokens=max_tokens):
+            pass
+        # The first turn of each session has nothing to reuse in any mode
+        if turn >= len(contexts):
+            ttfts.append(llm_manager.generation_history[-1]["ttft_ms"])
+    llm_manager.search_pool.shutdown()
+    llm.set_cache(None)
+    return {"mode": mode, "turns": len(ttfts), **{f"ttft_{key}_ms": value for key, value in percentiles(ttfts).items()}}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--sessions", type=int, default=2)
+    parser.add_argument("--context-chunks", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--output", help="Write JSON results to this file.")
+    args = parser.parse_args()
+    commit = git_commit()
+    rng = random.Random(3)
+    contexts = [session_context(rng, args.context_chunks) for _ in range(args.sessions)]
+    questions = [f"Question {turn}: explain {synthetic_text(rng, 8)}" for turn in range(args.turns)]
+    # Load before switching to the scratch folder, MODEL_PATH may be relative
+    llm = load_llm()
+    results = []
+    with scratch_workdir():
+        for mode in args.modes:
+            results.append(run_mode(llm, mode, contexts, questions, args.max_tokens))
+            print(results[-1])
+    cold = next((row["ttft_p50_ms"] for row in results if row["mode"] == "cold"), None)
+    for row in results:
+        row["speedup_vs_cold"] = cold / row["ttft_p50_ms"] if cold and row["ttft_p50_ms"] else None
+    write_results({
+        "benchmark": "generation",
+        "commit": commit,
+        "model": config.MODEL_PATH,
+        "n_gpu_layers": config.N_GPU_LAYERS,
+        "results": results,
+    }, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Ingestion and retrieval benchmark for the FAISS managers.
+
+For each index size, fills a DocumentFaissManager and an ImageFaissManager with
+synthetic chunks and reports:
+  - ingest throughput (chunks/s)
+  - single query search latency (p50/p95/p99, ms) and batched search throughput
+  - recall@k against an exact brute-force search over the stored vectors
+  - delete + rebuild time for one file
+  - on-disk size of the session and peak RSS of the process
+It also times LLMManager.search_all over both indexes (without loading the LLM).
+
+A stub embedding model is used by default so the benchmark runs offline and the
+numbers reflect FAISS and storage rather than the transformer.
+
+Run from the python/ folder:
+    python -m benchmarks.bench_retrieval --sizes 1000 10000 50000 --output retrieval.json
+    python -m benchmarks.bench_retrieval --sizes 1000 10000 --compare retrieval.json
+"""
+import argparse
+import json
+import random
+import time
+import numpy as np
+from modules import config
+from modules.FAISSModules import DocumentFaissManager,ImageFaissManager
+from benchmarks.common import (StubEmbeddingModel,fill_documents,fill_images,folder_size,git_commit,percentiles,
+                               peak_rss_mb,scratch_workdir,synthetic_text,timer,write_results)
+
+# Metrics where a higher value is better, used by --compare
+HIGHER_IS_BETTER = {"ingest_chunks_per_s", "batch_queries_per_s", "recall_at_k"}
+
+def exact_neighbours(manager, queries: np.ndarray, k: int):
+    """Internal IDs of the exact k nearest stored vectors of each query (squared L2)."""
+    manager._save_vectors()
+    ids, vectors = manager.vectors.load()
+    vectors = np.asarray(vectors, dtype=np.float32)
+    distances = (queries ** 2).sum(axis=1, keepdims=True) - 2 * queries @ vectors.T + (vectors ** 2).sum(axis=1)
+    order = np.argsort(distances, axis=1)[:, :k]
+    return ids[order]
+
+def recall_at_k(manager, queries, k: int) -> float:
+    """Fraction of the exact top-k that the index returns, averaged over queries."""
+    vectors = np.asarray(manager.embedding_model.encode(queries), dtype=np.float32)
+    exact = exact_neighbours(manager, vectors, k)
+    found = manager._search_vectors(vectors, top_k=k)
+    text_of = {internal_id: metadata.get("text") for internal_id, metadata in manager.metadata.get_many(exact.ravel()).items()}
+    hits = 0
+    for row, results in zip(exact, found):
+        expected = {text_of.get(int(internal_id)) for internal_id in row}
+        hits += sum(1 for result in results if result["metadata"].get("text") in expected)
+    return hits / (len(queries) * k)
+
+def bench_manager(name, manager, fill, size, queries, top_k, batch_size):
+    row = {"manager": name, "index_size": size}
+    start = time.perf_counter()
+    fill(manager, size)
+    row["ingest_chunks_per_s"] = size / (time.perf_counter() - start)
+    row["engine"] = manager.index_spec.describe()
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        manager.search(query, top_k=top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    row.update({f"search_{key}_ms": value for key, value in percentiles(latencies).items()})
+
+    start = time.perf_counter()
+    for offset in range(0, len(queries), batch_size):
+        manager.search_batch(queries[offset:offset + batch_size], top_k=top_k)
+    row["batch_queries_per_s"] = len(queries) / (time.perf_counter() - start)
+
+    row["recall_at_k"] = recall_at_k(manager, queries, top_k)
+    manager.flush()
+    row["disk_bytes"] = folder_size(manager.session_folder)
+    with timer(row, "delete_ms"):
+        manager.delete_by_metadata_id("file-0")
+    row["peak_rss_mb"] = peak_rss_mb()
+    return row
+
+def bench_search_all(doc_manager, image_manager, queries, top_k, embedding_model):
+    from modules.LLMModules import LLMManager
+    llm_manager = LLMManager(embedding_model=embedding_model, stt_model=None, session_id="bench-search-all", llm=object())
+    llm_manager.docManager, llm_manager.imageManager = doc_manager, image_manager
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        llm_manager.search_all(query, top_k=top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    row = {"manager": "search_all", "index_size": doc_manager.index.ntotal + image_manager.index.ntotal}
+    row.update({f"search_{key}_ms": value for key, value in percentiles(latencies).items()})
+    llm_manager.search_pool.shutdown()
+    return row
+
+def run(sizes, n_queries, top_k, batch_size, embedding_model):
+    rng = random.Random(1)
+    queries = [synthetic_text(rng, 20) for _ in range(n_queries)]
+    results = []
+    for size in sorted(sizes):
+        with scratch_workdir():
+            doc_manager = DocumentFaissManager(embedding_model=embedding_model, session_id="bench", index_path="doc.index")
+            image_manager = ImageFaissManager(embedding_model=embedding_model, session_id="bench", index_path="image.index")
+            results.append(bench_manager("document", doc_manager, fill_documents, size, queries, top_k, batch_size))
+            results.append(bench_manager("image", image_manager, fill_images, size, queries, top_k, batch_size))
+            results.append(bench_search_all(doc_manager, image_manager, queries, top_k, embedding_model))
+            print(json.dumps(results[-3:], indent=2))
+            doc_manager.close()
+            image_manager.close()
+    return results
+
+def compare(current, baseline_path, tolerance):
+    """Print metric changes against a previous run and return the number of regressions."""
+    with open(baseline_path, "r") as f:
+        baseline = {(row["manager"], row["index_size"]): row for row in json.load(f)["results"]}
+    regressions = 0
+    for row in current:
+        previous = baseline.get((row["manager"], row["index_size"]))
+        if previous is None:
+            continue
+        for metric, value in row.items():
+            old = previous.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or metric == "index_size" or old == 0:
+                continue
+            change = (value - old) / abs(old)
+            worse = change < -tolerance if metric in HIGHER_IS_BETTER else change > tolerance
+            regressions += worse
+            print(f"{row['manager']:>10} {row['index_size']:>8} {metric:<22} {old:>12.3f} -> {value:>12.3f} ({change:+.1%}){'  REGRESSION' if worse else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--real-model", action="store_true", help="Use the SentenceTransformer model instead of the stub.")
+    parser.add_argument("--output", help="Write JSON results to this file.")
+    parser.add_argument("--compare", help="Compare against a previous JSON output.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change reported as a regression.")
+    args = parser.parse_args()
+    if args.real_model:
+        from modules.EmbeddingModules import BASE_EMBEDDING_MODEL
+        embedding_model = BASE_EMBEDDING_MODEL
+    else:
+        embedding_model = StubEmbeddingModel()
+    commit = git_commit()
+    results = run(args.sizes, args.queries, args.top_k, args.batch_size, embedding_model)
+    write_results({
+        "benchmark": "retrieval",
+        "commit": commit,
+        "index_type": config.FAISS_INDEX_TYPE,
+        "top_k": args.top_k,
+        "results": results,
+    }, args.output)
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        print(f"{regressions} regressions beyond {args.tolerance:.0%}")
+        raise SystemExit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
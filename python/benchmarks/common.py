@@ -0,0 +1,144 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import tempfile
+import subprocess
+import numpy as np
+from contextlib import contextmanager
+from modules import config
+
+WORDS = (
+    "lecture topic matrix vector gradient entropy protein cell market supply demand "
+    "theorem proof integral derivative network layer neuron history empire treaty "
+    "reaction molecule energy force velocity algorithm graph tree sorting memory "
+    "schedule exam chapter summary definition example exercise figure table"
+).split()
+
+class StubEmbeddingModel:
+    """
+    Deterministic, offline stand-in for SentenceTransformer.
+
+    Each text is mapped to a unit vector seeded from a hash of the text, so the
+    same text always gets the same embedding and no model download is needed.
+    """
+    def __init__(self, dimension=config.FAISS_DIM):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+            vectors[i] = np.random.default_rng(seed).standard_normal(self.dimension)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+def synthetic_text(rng: random.Random, words: int = 80) -> str:
+    """Return a random sentence-like string built from a small vocabulary."""
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def synthetic_files(n_files: int, chunks_per_file: int, seed: int = 0):
+    """
+    Generate synthetic files split into chunks.
+
+    Yields:
+        tuple: (file id, path, list of chunk texts)
+    """
+    rng = random.Random(seed)
+    for f in range(n_files):
+        file_id = f"file-{f}"
+        chunks = [f"{file_id} chunk {c}: {synthetic_text(rng)}" for c in range(chunks_per_file)]
+        yield file_id, f"./temp/{file_id}.txt", chunks
+
+def fill_documents(manager, n_chunks: int, chunks_per_file: int = 50, seed: int = 0):
+    """Fill a DocumentFaissManager with `n_chunks` synthetic chunks using add_many."""
+    n_files = max(1, n_chunks // chunks_per_file)
+    with manager.transaction():
+        for file_id, path, chunks in synthetic_files(n_files, chunks_per_file, seed):
+            metadatas = [{"id": file_id, "path": path, "text": chunk, "title": file_id} for chunk in chunks]
+            manager.add_many(chunks, metadatas)
+
+def fill_images(manager, n_chunks: int, chunks_per_file: int = 5, seed: int = 0):
+    """Fill an ImageFaissManager with `n_chunks` synthetic OCR chunks using add_many."""
+    rng = random.Random(seed)
+    n_files = max(1, n_chunks // chunks_per_file)
+    with manager.transaction():
+        for file_id, path, chunks in synthetic_files(n_files, chunks_per_file, seed):
+            objects = rng.sample(WORDS, 3)
+            metadatas = [{"id": file_id, "path": path, "text": chunk, "objects": objects} for chunk in chunks]
+            manager.add_many(chunks, metadatas)
+
+def percentiles(values, points=(50, 95, 99)) -> dict:
+    """Return the given percentiles of `values` as {"p50": ..., ...}."""
+    if not values:
+        return {f"p{point}": None for point in points}
+    return {f"p{point}": float(np.percentile(values, point)) for point in points}
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process so far, in MB, or None if it cannot be measured.
+    The value never decreases, so run sizes in increasing order.
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 / 1024
+    except ImportError:
+        return None
+
+def folder_size(path: str) -> int:
+    """Total size in bytes of the files below `path`."""
+    total = 0
+    for folder, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(folder, name))
+    return total
+
+def git_commit():
+    """Current git commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+@contextmanager
+def scratch_workdir():
+    """Run the block inside a temporary working directory that is removed afterwards."""
+    previous = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="intellecta-bench-")
+    os.chdir(workdir)
+    try:
+        yield workdir
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+@contextmanager
+def timer(results: dict, key: str):
+    """Store the elapsed wall time of the block, in milliseconds, in results[key]."""
+    start = time.perf_counter()
+    yield
+    results[key] = (time.perf_counter() - start) * 1000
+
+def write_results(results, output: str = None):
+    """Print results as JSON and optionally write them to a file."""
+    text = json.dumps(results, indent=2)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
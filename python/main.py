@@ -1,19 +1,33 @@
 from fastapi.responses import StreamingResponse
 from fastapi import FastAPI,UploadFile,File,BackgroundTasks,Request,Form,HTTPException
 from modules import config,LLMModules
-from modules.EmbeddingModules import EMBEDDING_MODEL,split_text
+from modules.DocumentModules import shutdown_pdf_pool
+from modules.EmbeddingModules import EMBEDDING_MODEL,EMBEDDING_CACHE
+from modules.ResultCacheModules import get_result_cache
 from modules.WhisperModules import WhisperNoFFmpeg,install_required_packages
 from modules.FAISSModules import FileData,FileClass
+from modules.IngestionModules import IngestionQueue
+from modules.ModelModules import RESIDENCY,readiness,warm_up
+from modules.SchedulerModules import InferenceScheduler,QueueFullError
 from pydantic import BaseModel
 from typing import List
 import os
 import shutil
+import asyncio
+import threading
+import multiprocessing
 import uvicorn
 import hashlib
 import sqlite3
 import base64
-install_required_packages()
-llm_manager = LLMModules.LLMManager(stt_model=WhisperNoFFmpeg(config.STT_MODEL),embedding_model=EMBEDDING_MODEL)
+import time
+import uuid
+llm_manager : LLMModules.LLMManager = None
+ingestion_queue : IngestionQueue = None
+inference_scheduler : InferenceScheduler = None
+# Set once the background start-up has created llm_manager, or failed to
+backend_started = threading.Event()
+startup_error : str = None
 
 userDB = 'users.db'
 
@@ -59,9 +73,67 @@ class FileUploadRequest(BaseModel):
     files:List[FileData]
     IMMEDIATE_PROCESS: bool
 
+class UploadedFile(BaseModel):
+    id:str
+    name:str
+    token:str
+
+class UploadCommitRequest(BaseModel):
+    session_id:str
+    files:List[UploadedFile]
+    IMMEDIATE_PROCESS: bool
+
 app = FastAPI()
+
+def start_backend():
+    """
+    Checks the required packages, opens the session indexes and then warms up the models listed in WARMUP_MODELS.
+    Runs in the background so /health answers while it works; /ready reports its progress.
+    """
+    global llm_manager, startup_error
+    try:
+        install_required_packages()
+        llm_manager = LLMModules.LLMManager(stt_model=WhisperNoFFmpeg(config.STT_MODEL),embedding_model=EMBEDDING_MODEL)
+    except Exception as e:
+        startup_error = str(e)
+        print(f"Backend start-up failed : {e}")
+        return
+    finally:
+        backend_started.set()
+    warm_up(config.WARMUP_MODELS)
+
+def started_manager() -> LLMModules.LLMManager:
+    """Returns the LLM manager, waiting for the background start-up to create it."""
+    backend_started.wait()
+    if llm_manager is None:
+        raise HTTPException(status_code=503, detail=f"Backend failed to start: {startup_error}")
+    return llm_manager
+
+async def await_manager() -> LLMModules.LLMManager:
+    """`started_manager` for async endpoints, waiting off the event loop."""
+    if backend_started.is_set():
+        return started_manager()
+    return await asyncio.to_thread(started_manager)
+
+@app.on_event("startup")
+def load_models():
+    # Only what requests need up front is created here, so the port is served right away
+    global ingestion_queue, inference_scheduler
+    # Uploads wait for the manager before queuing files, so it exists when jobs run
+    ingestion_queue = IngestionQueue(lambda **kwargs: llm_manager.process_file(**kwargs))
+    inference_scheduler = InferenceScheduler()
+    RESIDENCY.start()
+    threading.Thread(target=start_backend, name="backend-startup", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown():
+    shutdown_pdf_pool()
+    if EMBEDDING_CACHE is not None:
+        EMBEDDING_CACHE.flush()
+
 UPLOAD_FOLDER =config.UPLOAD_FOLDER
 files_memory = []
+pending_jobs = []
 process_new_file = False
 
 @app.post("/register")
@@ -103,6 +175,7 @@ def login(user: User):
 async def import_db(userId: str = Form(...), dbFile: UploadFile = File(...)):
     # Save the uploaded file to disk
     binary_data  = await dbFile.read()
+    await await_manager()
     if llm_manager.scheduleManager == None:
         llm_manager._load_schedulemanager(userId)
     llm_manager.import_database(binary_data)
@@ -112,6 +185,8 @@ async def import_db(userId: str = Form(...), dbFile: UploadFile = File(...)):
 async def delete_session(request : Request):
     session_id = (await request.body()).decode("utf-8").strip()
     path = os.path.join('index',session_id)
+    await await_manager()
+    llm_manager.discard_session(session_id)
     if os.path.exists(path):
         print(f'deleting {path}')
         shutil.rmtree(path)
@@ -121,20 +196,110 @@ async def delete_files(delete : dict):
     print("Deleting File")
     file_id = delete['ids']  
     type = delete['types']   
+    await await_manager()
     llm_manager.delete_files(file_id,type)
 
 
 
+def session_upload_folder(session_id : str):
+    """Upload folder of a session."""
+    normalized_path = os.path.normpath(session_id)
+    if os.path.isabs(normalized_path) or normalized_path.split(os.sep)[0] == '..':
+        raise HTTPException(status_code=400, detail=f"Invalid session id: {session_id}")
+    return os.path.join('index',session_id,'upload')
+
+def upload_path(name : str, folder : str = None):
+    """Path in an upload folder, the active session's by default, for a file name. Directory parts of the name are dropped."""
+    return os.path.join(folder or UPLOAD_FOLDER, os.path.basename(name))
+
+def raw_upload_path(folder : str, token : str):
+    """Path of a file received by /upload/raw and not committed yet."""
+    if not token.isalnum():
+        raise HTTPException(status_code=400, detail=f"Invalid upload token: {token}")
+    return os.path.join(folder, f"{token}.upload")
+
+def queue_uploads(uploaded : List[FileClass], IMMEDIATE_PROCESS : bool, session_id : str = None):
+    """Queue a batch of saved uploads for ingestion into a session, the active one by default."""
+    global process_new_file
+    session_id = session_id or llm_manager.session_id
+    files_memory.clear()
+    pending_jobs.clear()
+    if not uploaded:
+        return None
+    job = ingestion_queue.submit(
+        session_id=session_id,
+        file_paths=[file.path for file in uploaded],
+        file_ids=[file.id for file in uploaded]
+    )
+    # Only uploads to the active session can be part of its next answer
+    if not IMMEDIATE_PROCESS and session_id == llm_manager.session_id:
+        # Remember the upload so the next /generate waits for it and prioritizes these files
+        files_memory.extend(uploaded)
+        pending_jobs.append(job)
+        process_new_file=True
+    return job
+
+@app.post("/upload/raw")
+async def upload_raw(request : Request, id : str, name : str, session_id : str):
+    """
+    Streams one file, sent as the raw request body, straight to the upload folder of the session.
+    The file is kept under a unique name until /upload/commit queues it for ingestion using the
+    returned token, so several files can be sent as one batch, and neither a session switch nor
+    another upload of the same name in the meantime can overwrite or misplace it.
+    """
+    folder = session_upload_folder(session_id)
+    os.makedirs(folder,exist_ok=True)
+    token = uuid.uuid4().hex
+    file_path = raw_upload_path(folder, token)
+    partial_path = file_path + ".part"
+    size = 0
+    start = time.perf_counter()
+    try:
+        with open(partial_path, "wb") as buffer:
+            async for chunk in request.stream():
+                buffer.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    os.replace(partial_path, file_path)
+    seconds = time.perf_counter() - start
+    mb_per_s = size / (1024 * 1024) / seconds if seconds > 0 else 0.0
+    print(f"Received {name} : {size} bytes in {seconds:.2f}s ({mb_per_s:.1f} MB/s)")
+    return {"id": id, "name": name, "token": token, "bytes": size, "seconds": seconds, "mb_per_s": mb_per_s}
+
+@app.post("/upload/commit")
+async def commit_uploads(request : UploadCommitRequest):
+    """Queues files previously sent to /upload/raw for ingestion, as one batch, under their own names."""
+    await await_manager()
+    folder = session_upload_folder(request.session_id)
+    raw_paths = [raw_upload_path(folder, file.token) for file in request.files]
+    for file, raw_path in zip(request.files, raw_paths):
+        if not os.path.exists(raw_path):
+            raise HTTPException(status_code=400, detail=f"File was not uploaded: {file.name}")
+    uploaded = []
+    for file, raw_path in zip(request.files, raw_paths):
+        file_path = upload_path(file.name, folder)
+        os.replace(raw_path, file_path)
+        uploaded.append(FileClass(id=file.id,path=file_path))
+    job = queue_uploads(uploaded, request.IMMEDIATE_PROCESS, request.session_id)
+    if job is None:
+        return {"message": "0 files uploaded successfully"}
+    return {"message": f"{len(uploaded)} files uploaded successfully","job_id": job.id}
+
 @app.post("/upload/")
 async def upload_files(request :FileUploadRequest):
-    """Handles multiple file uploads and saves them."""
-    global process_new_file,files_memory
+    """
+    Handles multiple file uploads, saves them and queues them for ingestion.
+    Files are sent inside the JSON body. Kept for older clients, /upload/raw avoids the JSON encoding.
+    """
     files = request.files
-    IMMEDIATE_PROCESS = request.IMMEDIATE_PROCESS
+    await await_manager()
     os.makedirs(UPLOAD_FOLDER,exist_ok=True)
-    files_memory.clear()
+    uploaded = []
     for file in files:
-        file_path = os.path.join(UPLOAD_FOLDER, file.name)
+        file_path = upload_path(file.name)
         if isinstance(file.arrayBuffer, str):
            # If it's a base64 string
            try:
@@ -149,48 +314,56 @@ async def upload_files(request :FileUploadRequest):
             
         with open(file_path, "wb") as buffer:
             buffer.write(file_content)
-        files_memory.append(FileClass(id=file.id,path=file_path))
-        if not IMMEDIATE_PROCESS:
-            process_new_file=True
-    if len(files) > 0:
-        if IMMEDIATE_PROCESS:
-            paths=[]
-            paths = [file.path for file in files_memory]
-            ids = [file.id for file in files_memory]
-            llm_manager.process_file(file_paths=paths,file_ids=ids)
-            files_memory=[]
-            if os.path.isdir(UPLOAD_FOLDER):
-                shutil.rmtree(UPLOAD_FOLDER)
-            process_new_file=False
-    return {"message": f"{len(files)} files uploaded successfully"}
+        uploaded.append(FileClass(id=file.id,path=file_path))
+    job = queue_uploads(uploaded, request.IMMEDIATE_PROCESS)
+    if job is None:
+        return {"message": "0 files uploaded successfully"}
+    return {"message": f"{len(files)} files uploaded successfully","job_id": job.id}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return job.to_dict()
+
+@app.get("/jobs")
+def list_jobs():
+    return ingestion_queue.stats()
 
 @app.post("/generate")
 async def generate(prompt: dict):
     global process_new_file,files_memory
-    if not llm_manager:
-        print('Session not loaded')
-        return {"error": "Session not loaded"}
+    await await_manager()
     user_prompt = prompt["prompt"]
     mode = prompt["mode"]
     print(mode)
     paths = []
     if process_new_file:
         paths = [file.path for file in files_memory]
-        ids = [file.id for file in files_memory]
-        llm_manager.process_file(file_paths=paths,file_ids=ids)
         process_new_file=False
-    formatted_prompt = llm_manager.format_prompt(user_prompt,paths,mode=mode)
+    # Only wait for ingestion that affects this answer: deferred uploads and jobs of the active session
+    unfinished = await ingestion_queue.wait_for(pending_jobs + ingestion_queue.pending(llm_manager.session_id))
+    if unfinished:
+        print(f"Answering before {len(unfinished)} ingestion job(s) finished, waited {config.INGESTION_WAIT_TIMEOUT}s")
+    pending_jobs.clear()
+    # Retrieval and context packing load and run the embedding model and tokenizer, keep them off the event loop
+    formatted_prompt = await asyncio.to_thread(llm_manager.format_prompt,user_prompt,paths,mode=mode)
     files_memory=[]
-    if os.path.isdir(UPLOAD_FOLDER):
-        shutil.rmtree(UPLOAD_FOLDER)
 
-    return StreamingResponse(llm_manager.stream_generator(formatted_prompt), media_type="text/event-stream")
+    # Generations run one at a time on the inference thread, cheapest prompt first
+    try:
+        request = inference_scheduler.submit(lambda: llm_manager.stream_generator(formatted_prompt),cost=llm_manager.token_counter.estimate_messages(formatted_prompt))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return StreamingResponse(inference_scheduler.stream(request), media_type="text/event-stream")
 
 @app.post("/loadSession")
 async def load_session(request : Request):
     global llm_manager,UPLOAD_FOLDER
     session_id = (await request.body()).decode("utf-8").strip()
     normalized_path = os.path.normpath(session_id)
+    await await_manager()
 
 
     print(f'session id : {normalized_path}')
@@ -199,13 +372,64 @@ async def load_session(request : Request):
         llm_manager._load_schedulemanager(user_id)
     else:
         llm_manager._update_session(session_id)
-        UPLOAD_FOLDER = os.path.join('index',session_id,'upload')
+        UPLOAD_FOLDER = session_upload_folder(session_id)
 
     return {"message": "Session loaded successfully"}
 
+@app.get("/stats/sessions")
+def session_stats():
+    return started_manager().sessions.stats()
+
+@app.get("/stats/search")
+def search_stats():
+    return started_manager().last_search_timings
+
+@app.get("/stats/embeddings")
+def embedding_stats():
+    if EMBEDDING_CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **EMBEDDING_CACHE.stats()}
+
+@app.get("/stats/inference")
+def inference_stats():
+    return inference_scheduler.stats()
+
+@app.get("/stats/images")
+def image_stats():
+    manager = started_manager()
+    return manager.imageManager.last_image_stats if manager.imageManager else {}
+
+@app.get("/stats/generation")
+def generation_stats():
+    return started_manager().generation_stats()
+
+@app.get("/stats/models")
+def model_stats():
+    return RESIDENCY.status()
+
+@app.get("/stats/models/events")
+def model_events(since: int = 0):
+    return {"events": RESIDENCY.recent_events(since)}
+
+@app.get("/stats/results")
+def result_cache_stats():
+    cache = get_result_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready_check():
+    status = readiness()
+    status["backend"] = "failed" if startup_error else "ready" if llm_manager else "starting"
+    status["ready"] = status["ready"] and llm_manager is not None
+    return status
+
 if __name__ == "__main__":
+    # PDF extraction workers are spawned processes on Windows, including in frozen builds
+    multiprocessing.freeze_support()
     uvicorn.run(app,host="0.0.0.0",port=8000)
\ No newline at end of file
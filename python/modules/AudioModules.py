@@ -0,0 +1,442 @@
+import os
+import shutil
+import zipfile
+import platform
+import tempfile
+import threading
+import subprocess
+import urllib.request
+import importlib.util
+from functools import lru_cache
+from itertools import chain
+from math import gcd
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple
+import numpy as np
+
+# Whisper works on 16kHz mono audio
+SAMPLE_RATE = 16000
+# Source rates whose resampling filters are designed when the decoder is created
+COMMON_SAMPLE_RATES = (44100, 48000)
+
+@lru_cache(maxsize=None)
+def polyphase_filter(sample_rate: int, target_rate: int = SAMPLE_RATE) -> Tuple[int, int, np.ndarray]:
+    """
+    Anti-aliasing filter of a rate conversion, designed once per pair of rates.
+
+    The filter is the Kaiser-windowed FIR scipy's `resample_poly` designs on every call,
+    in float32 so the filtering runs in single precision.
+
+    Args:
+        sample_rate (int): Rate of the input.
+        target_rate (int): Rate of the output.
+
+    Returns:
+        Tuple[int, int, np.ndarray]: Upsampling and downsampling factors, and the filter taps.
+    """
+    from scipy.signal import firwin
+    divisor = gcd(sample_rate, target_rate)
+    up, down = target_rate // divisor, sample_rate // divisor
+    max_rate = max(up, down)
+    taps = firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=("kaiser", 5.0)).astype(np.float32)
+    taps.setflags(write=False)
+    return up, down, taps
+
+def resample(audio: np.ndarray, sample_rate: int, target_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Resample mono audio with the cached polyphase filter of the rate pair.
+
+    Args:
+        audio (np.ndarray): float32 mono samples at `sample_rate`.
+        sample_rate (int): Rate of the input.
+        target_rate (int): Rate of the output.
+
+    Returns:
+        np.ndarray: float32 mono samples at `target_rate`.
+    """
+    if sample_rate == target_rate:
+        return audio
+    from scipy.signal import resample_poly
+    up, down, taps = polyphase_filter(sample_rate, target_rate)
+    return resample_poly(audio.astype(np.float32, copy=False), up, down, window=taps).astype(np.float32, copy=False)
+
+def resample_blocks(blocks: Iterable[np.ndarray], sample_rate: int, target_rate: int = SAMPLE_RATE) -> Iterator[np.ndarray]:
+    """
+    Resample a stream of mono blocks without clicks at the block boundaries.
+
+    Each block is filtered together with a margin of its neighbours, which is then cut
+    from the output, so the result matches resampling the whole signal at once. Blocks
+    should hold a multiple of `sample_rate // gcd(sample_rate, target_rate)` samples.
+
+    Args:
+        blocks (Iterable[np.ndarray]): float32 mono blocks at `sample_rate`.
+        sample_rate (int): Rate of the input.
+        target_rate (int): Rate of the output.
+
+    Yields:
+        np.ndarray: float32 mono blocks at `target_rate`.
+    """
+    if sample_rate == target_rate:
+        yield from blocks
+        return
+    up, down, _ = polyphase_filter(sample_rate, target_rate)
+    # About 10ms of context on each side, rounded to whole filter phases
+    margin = -(-sample_rate // 100 // down) * down
+    previous, current = np.zeros(0, dtype=np.float32), None
+    for block in chain(blocks, [None]):
+        if current is not None:
+            following = block[:margin] if block is not None else np.zeros(0, dtype=np.float32)
+            head = previous[len(previous) - margin:] if len(previous) > margin else previous
+            resampled = resample(np.concatenate([head, current, following]), sample_rate, target_rate)
+            start = len(head) * up // down
+            yield resampled[start:start + -(-len(current) * up // down)]
+            previous = current
+        current = block
+
+class AudioDecoder:
+    """
+    Decodes audio files to mono float32 at the rate Whisper expects.
+
+    The backends are chosen once, when the decoder is created: soundfile (libsndfile)
+    reads the formats it supports, and FFmpeg decodes everything else, piping raw PCM
+    over stdout. The FFmpeg executable is looked up once, and set up by FFmpegSetup the
+    first time it is needed if the system has none. Files soundfile fails to read are
+    handed to FFmpeg.
+    """
+    def __init__(self, target_rate: int = SAMPLE_RATE, verbose: bool = True):
+        """
+        Args:
+            target_rate (int): Rate of the decoded audio.
+            verbose (bool): Print when a file falls back to FFmpeg.
+        """
+        self.target_rate = target_rate
+        self.verbose = verbose
+        self.soundfile_formats = set()
+        if importlib.util.find_spec("soundfile") is not None:
+            import soundfile
+            self.soundfile_formats = {name.lower() for name in soundfile.available_formats()}
+        self.lock = threading.Lock()
+        self._ffmpeg_path = shutil.which("ffmpeg")
+        if importlib.util.find_spec("scipy") is not None:
+            for rate in COMMON_SAMPLE_RATES:
+                polyphase_filter(rate, target_rate)
+
+    def _log(self, message):
+        """Print message if verbose mode is enabled."""
+        if self.verbose:
+            print(message)
+
+    def backend(self, path: str) -> str:
+        """Backend used for a file, from its extension: "soundfile" or "ffmpeg"."""
+        extension = os.path.splitext(path)[1].lstrip(".").lower()
+        return "soundfile" if extension in self.soundfile_formats else "ffmpeg"
+
+    def ffmpeg_path(self) -> str:
+        """Path of the FFmpeg executable, set up on first call if the system has none."""
+        with self.lock:
+            if self._ffmpeg_path is None:
+                self._ffmpeg_path = FFmpegSetup(verbose=self.verbose).get_ffmpeg_path()
+                if not self._ffmpeg_path:
+                    raise RuntimeError("Could not find or set up FFmpeg")
+            return self._ffmpeg_path
+
+    def _ffmpeg_command(self, path: str) -> list:
+        return [self.ffmpeg_path(), "-nostdin", "-v", "error", "-i", path,
+                "-f", "s16le", "-ac", "1", "-ar", str(self.target_rate), "-"]
+
+    def load(self, path: str, backend: str = None) -> np.ndarray:
+        """
+        Decode a whole audio file.
+
+        Args:
+            path (str): Path of the audio file.
+            backend (str, optional): "soundfile" or "ffmpeg". Defaults to the backend of the file's format.
+
+        Returns:
+            np.ndarray: float32 mono samples at `target_rate`.
+        """
+        if (backend or self.backend(path)) == "soundfile":
+            try:
+                import soundfile as sf
+                audio, sample_rate = sf.read(path, dtype="float32", always_2d=True)
+                return resample(audio.mean(axis=1), sample_rate, self.target_rate)
+            except Exception as e:
+                if backend:
+                    raise
+                self._log(f"soundfile could not decode {path} ({str(e)}), using FFmpeg")
+        result = subprocess.run(self._ffmpeg_command(path), capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"FFmpeg could not decode {path}: {result.stderr.decode(errors='replace').strip()}")
+        return np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768.0
+
+    def iter_blocks(self, path: str, block_seconds: float = 10, backend: str = None) -> Iterator[np.ndarray]:
+        """
+        Decode an audio file block by block, so only one block is held in memory.
+
+        Args:
+            path (str): Path of the audio file.
+            block_seconds (float): Approximate length of each block.
+            backend (str, optional): "soundfile" or "ffmpeg". Defaults to the backend of the file's format.
+
+        Yields:
+            np.ndarray: float32 mono blocks at `target_rate`.
+        """
+        if (backend or self.backend(path)) == "soundfile":
+            try:
+                import soundfile as sf
+                source = sf.SoundFile(path)
+            except Exception as e:
+                if backend:
+                    raise
+                self._log(f"soundfile could not open {path} ({str(e)}), using FFmpeg")
+            else:
+                with source:
+                    sample_rate = source.samplerate
+                    # Whole resampling phases per block, see resample_blocks
+                    down = sample_rate // gcd(sample_rate, self.target_rate)
+                    block_size = max(1, int(block_seconds * sample_rate) // down) * down
+                    mono = (block.mean(axis=1) for block in source.blocks(blocksize=block_size, dtype="float32", always_2d=True))
+                    yield from resample_blocks(mono, sample_rate, self.target_rate)
+                return
+        process = subprocess.Popen(self._ffmpeg_command(path), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        block_bytes = int(block_seconds * self.target_rate) * 2
+        try:
+            while True:
+                data = process.stdout.read(block_bytes)
+                if not data:
+                    break
+                yield np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+            if process.wait() != 0:
+                raise RuntimeError(f"FFmpeg could not decode {path}: {process.stderr.read().decode(errors='replace').strip()}")
+        finally:
+            # Stop FFmpeg when the consumer stops early
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+class FFmpegSetup:
+    """Helper class to download and set up FFmpeg if needed."""
+    
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self.ffmpeg_dir = self._get_ffmpeg_dir()
+        self.ffmpeg_path = None
+        self._setup_ffmpeg()
+        
+    def _log(self, message):
+        """Print message if verbose mode is enabled."""
+        if self.verbose:
+            print(message)
+            
+    def _get_ffmpeg_dir(self):
+        """Create a directory for storing FFmpeg binaries."""
+        # Create directory in user's home folder
+        home_dir = Path.home()
+        ffmpeg_dir = home_dir / ".embedded_ffmpeg"
+        
+        if not ffmpeg_dir.exists():
+            self._log(f"Creating FFmpeg directory at {ffmpeg_dir}")
+            ffmpeg_dir.mkdir(parents=True, exist_ok=True)
+            
+        return ffmpeg_dir
+        
+    def _setup_ffmpeg(self):
+        """Download and set up FFmpeg if not already available."""
+        # Check if FFmpeg already exists in our directory
+        if self._check_existing_ffmpeg():
+            self._log(f"Found existing FFmpeg installation at {self.ffmpeg_path}")
+            return
+            
+        # Determine which FFmpeg to download based on the platform
+        system = platform.system().lower()
+        
+        self._log(f"No existing FFmpeg found. Downloading for {system}...")
+        
+        try:
+            if system == "windows":
+                self._setup_ffmpeg_windows()
+            elif system == "darwin":  # macOS
+                self._setup_ffmpeg_macos()
+            elif system == "linux":
+                self._setup_ffmpeg_linux()
+            else:
+                raise RuntimeError(f"Unsupported operating system: {system}")
+                
+            # Verify FFmpeg works
+            if not self._verify_ffmpeg():
+                raise RuntimeError("FFmpeg installation failed verification")
+                
+        except Exception as e:
+            self._log(f"Error setting up FFmpeg: {str(e)}")
+            raise
+            
+    def _check_existing_ffmpeg(self):
+        """Check if FFmpeg is already in our directory."""
+        system = platform.system().lower()
+        
+        if system == "windows":
+            ffmpeg_exe = self.ffmpeg_dir / "ffmpeg.exe"
+            if ffmpeg_exe.exists():
+                self.ffmpeg_path = str(ffmpeg_exe)
+                return True
+        else:
+            ffmpeg_exe = self.ffmpeg_dir / "ffmpeg"
+            if ffmpeg_exe.exists() and os.access(str(ffmpeg_exe), os.X_OK):
+                self.ffmpeg_path = str(ffmpeg_exe)
+                return True
+        return False
+        
+    def _verify_ffmpeg(self):
+        """Verify FFmpeg works by running a simple command."""
+        try:
+            result = subprocess.run([self.ffmpeg_path, "-version"], 
+                                   capture_output=True, 
+                                   text=True, 
+                                   check=False)
+            if result.returncode == 0:
+                self._log("FFmpeg verification successful")
+                return True
+            else:
+                self._log(f"FFmpeg verification failed: {result.stderr}")
+                return False
+        except Exception as e:
+            self._log(f"FFmpeg verification error: {str(e)}")
+            return False
+            
+    def _setup_ffmpeg_windows(self):
+        """Download and set up FFmpeg for Windows."""
+        # URL for the latest FFmpeg build for Windows (static build)
+        url = "https://github.com/GyanD/codexffmpeg/releases/download/6.1.1/ffmpeg-6.1.1-essentials_build.zip"
+        
+        # Create a temporary directory for downloading
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir_path = Path(temp_dir)
+            zip_path = temp_dir_path / "ffmpeg.zip"
+            
+            # Download FFmpeg
+            self._log("Downloading FFmpeg for Windows...")
+            try:
+                urllib.request.urlretrieve(url, zip_path)
+            except Exception as e:
+                raise RuntimeError(f"Failed to download FFmpeg: {str(e)}")
+            
+            # Extract FFmpeg
+            self._log("Extracting FFmpeg...")
+            try:
+                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                    zip_ref.extractall(temp_dir_path)
+            except Exception as e:
+                raise RuntimeError(f"Failed to extract FFmpeg: {str(e)}")
+            
+            # Find the extracted FFmpeg executable
+            ffmpeg_exes = list(temp_dir_path.glob("**/ffmpeg.exe"))
+            if not ffmpeg_exes:
+                raise RuntimeError("Failed to find FFmpeg executable after extraction")
+                
+            ffmpeg_exe = ffmpeg_exes[0]
+            
+            # Copy FFmpeg to our directory
+            dest_path = self.ffmpeg_dir / "ffmpeg.exe"
+            self._log(f"Copying FFmpeg to {dest_path}")
+            shutil.copy(ffmpeg_exe, dest_path)
+            self.ffmpeg_path = str(dest_path)
+            
+    def _setup_ffmpeg_macos(self):
+        """Download and set up FFmpeg for macOS."""
+        # URL for the latest FFmpeg build for macOS
+        url = "https://evermeet.cx/ffmpeg/getrelease/ffmpeg/zip"
+        
+        # Create a temporary directory for downloading
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir_path = Path(temp_dir)
+            zip_path = temp_dir_path / "ffmpeg.zip"
+            
+            # Download FFmpeg
+            self._log("Downloading FFmpeg for macOS...")
+            try:
+                urllib.request.urlretrieve(url, zip_path)
+            except Exception as e:
+                raise RuntimeError(f"Failed to download FFmpeg: {str(e)}")
+            
+            # Extract FFmpeg
+            self._log("Extracting FFmpeg...")
+            try:
+                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                    zip_ref.extractall(temp_dir_path)
+            except Exception as e:
+                raise RuntimeError(f"Failed to extract FFmpeg: {str(e)}")
+            
+            ffmpeg_exe = temp_dir_path / "ffmpeg"
+            
+            if not ffmpeg_exe.exists():
+                # Try to find ffmpeg directly
+                ffmpeg_exes = list(temp_dir_path.glob("**/ffmpeg"))
+                if not ffmpeg_exes:
+                    raise RuntimeError("Failed to find FFmpeg executable after extraction")
+                ffmpeg_exe = ffmpeg_exes[0]
+            
+            # Copy FFmpeg to our directory
+            dest_path = self.ffmpeg_dir / "ffmpeg"
+            self._log(f"Copying FFmpeg to {dest_path}")
+            shutil.copy(ffmpeg_exe, dest_path)
+            
+            # Make it executable
+            os.chmod(dest_path, 0o755)
+            self.ffmpeg_path = str(dest_path)
+            
+    def _setup_ffmpeg_linux(self):
+        """Download and set up FFmpeg for Linux."""
+        # For Linux, we'll use a static build
+        url = "https://johnvansickle.com/ffmpeg/releases/ffmpeg-release-amd64-static.tar.xz"
+        
+        # Create a temporary directory for downloading
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir_path = Path(temp_dir)
+            tar_path = temp_dir_path / "ffmpeg.tar.xz"
+            
+            # Download FFmpeg
+            self._log("Downloading FFmpeg for Linux...")
+            try:
+                urllib.request.urlretrieve(url, tar_path)
+            except Exception as e:
+                raise RuntimeError(f"Failed to download FFmpeg: {str(e)}")
+            
+            # Extract FFmpeg
+            self._log("Extracting FFmpeg...")
+            try:
+                # First try using Python's shutil
+                shutil.unpack_archive(str(tar_path), str(temp_dir_path))
+            except Exception:
+                # If that fails, try using the tar command
+                try:
+                    subprocess.run(["tar", "-xf", str(tar_path), "-C", str(temp_dir_path)], 
+                                  check=True, 
+                                  stdout=subprocess.PIPE, 
+                                  stderr=subprocess.PIPE)
+                except Exception as e:
+                    raise RuntimeError(f"Failed to extract FFmpeg: {str(e)}")
+            
+            # Find the extracted FFmpeg executable
+            ffmpeg_exes = list(temp_dir_path.glob("**/ffmpeg"))
+            if not ffmpeg_exes:
+                raise RuntimeError("Failed to find FFmpeg executable after extraction")
+                
+            ffmpeg_exe = ffmpeg_exes[0]
+            
+            # Copy FFmpeg to our directory
+            dest_path = self.ffmpeg_dir / "ffmpeg"
+            self._log(f"Copying FFmpeg to {dest_path}")
+            shutil.copy(ffmpeg_exe, dest_path)
+            
+            # Make it executable
+            os.chmod(dest_path, 0o755)
+            self.ffmpeg_path = str(dest_path)
+            
+    def get_ffmpeg_path(self):
+        """Return the path to the installed FFmpeg."""
+        return self.ffmpeg_path
+
+# Shared by every transcription in this process
+AUDIO_DECODER = AudioDecoder()
@@ -0,0 +1,153 @@
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+from modules import config
+
+# Tokens chatml adds around each message: "<|im_start|>role\n" ... "<|im_end|>\n"
+MESSAGE_OVERHEAD_TOKENS = 8
+# Rough characters per token, used when the model has no tokenizer (e.g. in benchmarks)
+CHARS_PER_TOKEN = 4
+
+class TokenCounter:
+    """
+    Counts tokens with the model's tokenizer, keeping the counts of recent texts.
+
+    Retrieved chunks come back turn after turn, so most counts are served from the cache
+    instead of tokenizing the chunk again.
+    """
+    def __init__(self, llm, max_entries: int = config.CONTEXT_TOKEN_CACHE_SIZE):
+        """
+        Args:
+            llm (Llama): Model whose `tokenize` is used. Without one, tokens are estimated from the text length.
+            max_entries (int): Number of token counts kept.
+        """
+        self.llm = llm
+        self.max_entries = max_entries
+        self.counts = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _tokenize_count(self, text: str) -> int:
+        tokenize = getattr(self.llm, "tokenize", None)
+        if tokenize is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(tokenize(text.encode("utf-8"), add_bos=False, special=True))
+
+    def count(self, text: str) -> int:
+        """
+        Args:
+            text (str): Text to count.
+
+        Returns:
+            int: Number of tokens in the text.
+        """
+        with self.lock:
+            if text in self.counts:
+                self.counts.move_to_end(text)
+                self.hits += 1
+                return self.counts[text]
+        tokens = self._tokenize_count(text)
+        with self.lock:
+            self.misses += 1
+            self.counts[text] = tokens
+            while len(self.counts) > self.max_entries:
+                self.counts.popitem(last=False)
+        return tokens
+
+    def estimate_messages(self, messages: List[Dict]) -> int:
+        """
+        Estimate the tokens of chat messages from their length, without the tokenizer.
+
+        Cheap enough for a request handler: it never loads or calls the model.
+        """
+        return sum(math.ceil(len(message["content"]) / CHARS_PER_TOKEN) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+    def count_messages(self, messages: List[Dict]) -> int:
+        """
+        Args:
+            messages (List[Dict]): Chat messages with a "content" field.
+
+        Returns:
+            int: Tokens the messages take in the prompt, including the chat template.
+        """
+        return sum(self.count(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+def entry_text_key(entry: Dict) -> str:
+    """Metadata field holding the text of a search result."""
+    return "transcription" if entry.get("type") == "audio" else "text"
+
+def overlap_length(first: str, second: str, max_overlap: int, min_overlap: int = 16) -> int:
+    """
+    Length of the longest end of `first` that is also the start of `second`.
+
+    Args:
+        first (str): Text that may end with the overlap.
+        second (str): Text that may start with it.
+        max_overlap (int): Longest overlap looked for, the splitter's chunk overlap.
+        min_overlap (int): Shorter matches are ignored as coincidences.
+
+    Returns:
+        int: Overlap length, 0 if none.
+    """
+    for length in range(min(max_overlap, len(first), len(second)), min_overlap - 1, -1):
+        if first.endswith(second[:length]):
+            return length
+    return 0
+
+def pack_context(entries: List[Dict], format_entry: Callable[[Dict], str], counter: TokenCounter, budget: int,
+                 max_overlap: int = config.CHUNK_OVERLAP) -> Tuple[str, Dict]:
+    """
+    Fill a token budget with search results, most relevant first.
+
+    Neighbouring chunks of a file share up to `max_overlap` characters, so text already
+    packed from the same file is trimmed from each result, and results fully contained
+    in packed text are dropped. Results that no longer fit are skipped, so smaller, less
+    relevant ones can still use the remaining budget.
+
+    Args:
+        entries (List[Dict]): Search results ordered by relevance, as returned by `search_all`.
+        format_entry (Callable[[Dict], str]): Formats one result for the prompt.
+        counter (TokenCounter): Counts the tokens of each formatted result.
+        budget (int): Maximum tokens of packed context.
+        max_overlap (int): Chunk overlap used when the files were split.
+
+    Returns:
+        Tuple[str, Dict]: The packed context and packing statistics.
+    """
+    packed = []
+    texts_by_source = {}
+    used = 0
+    stats = {"candidates": len(entries), "packed": 0, "duplicates": 0, "trimmed_chars": 0, "skipped": 0}
+    for entry in entries:
+        data = entry.get("metadata", {})
+        key = entry_text_key(entry)
+        text = data.get(key) or ""
+        source = data.get("path") or data.get("id")
+        selected = texts_by_source.setdefault(source, [])
+        if any(text in other for other in selected):
+            stats["duplicates"] += 1
+            continue
+        original_length = len(text)
+        for other in selected:
+            head = overlap_length(other, text, max_overlap)
+            if head:
+                text = text[head:]
+            tail = overlap_length(text, other, max_overlap)
+            if tail:
+                text = text[:-tail]
+        entry = {**entry, "metadata": {**data, key: text}}
+        formatted = format_entry(entry)
+        tokens = counter.count(formatted)
+        if used + tokens > budget:
+            stats["skipped"] += 1
+            continue
+        packed.append(formatted)
+        selected.append(text)
+        used += tokens
+        stats["packed"] += 1
+        stats["trimmed_chars"] += original_length - len(text)
+    stats["tokens"] = used
+    stats["budget"] = budget
+    return "".join(packed), stats
@@ -1,7 +1,36 @@
 from pypdf import PdfReader
 from docx import Document
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Tuple
+from modules import config
+from modules.PdfWorkerModules import extract_pdf_page_range
+import itertools
+import threading
 import os
 
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def _get_pdf_pool():
+    """
+    Returns the shared process pool used to extract PDF pages, creating it on first use.
+    The pool is reused across documents so worker start-up is only paid once.
+    """
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            workers = config.PDF_WORKERS or os.cpu_count() or 1
+            _pdf_pool = ProcessPoolExecutor(max_workers=workers)
+        return _pdf_pool
+
+def shutdown_pdf_pool():
+    """Stops the PDF extraction processes, if they were started. Called when the server shuts down."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
 def extract_title_from_pdf(pdf_path,fallback=None):
     """
     Extracts the title of a PDF file.
@@ -20,16 +49,19 @@ def extract_title_from_pdf(pdf_path,fallback=None):
         str: The extracted title.
     """
     reader = PdfReader(pdf_path)
-    
+    first_page_text = reader.pages[0].extract_text() if len(reader.pages) > 0 else ""
+    return _pdf_title(reader, first_page_text, pdf_path, fallback)
+
+def _pdf_title(reader, first_page_text, pdf_path, fallback=None):
+    """Infers a PDF title from its metadata, then its first page, then the fallback or filename."""
     # Try to get the title from metadata
     if reader.metadata and reader.metadata.title:
         return reader.metadata.title.strip()
     
     # If no metadata title, infer from the first page
-    if len(reader.pages) > 0:
-        first_page_text = reader.pages[0].extract_text().strip()
-        if first_page_text:
-            return first_page_text.split("\n")[0]  # Assume first line is the title
+    first_page_text = first_page_text.strip()
+    if first_page_text:
+        return first_page_text.split("\n")[0]  # Assume first line is the title
     if fallback:
         return fallback
     return os.path.basename(pdf_path)
@@ -50,8 +82,10 @@ def extract_title_from_docx(docx_path,fallback : str = None):
     Returns:
         str: The extracted title.
     """
-    doc = Document(docx_path)
-    
+    return _docx_title(Document(docx_path), docx_path, fallback)
+
+def _docx_title(doc, docx_path, fallback=None):
+    """Infers a DOCX title from its first heading or bold paragraph, then the fallback or filename."""
     # Try to find a bold or large font text as the title
     for para in doc.paragraphs:
         if para.style.name.startswith("Heading") or any(run.bold for run in para.runs):
@@ -72,12 +106,102 @@ def extract_text_from_pdf(pdf_path):
     Returns:
         str: Combined text content from all pages.
     """
-    text = ""
-    with open(pdf_path, "rb") as f:
-        reader = PdfReader(f)
+    return "".join(iter_pdf_pages(pdf_path))
+
+def iter_pdf_pages(pdf_path, reader=None) -> Iterator[str]:
+    """
+    Yields the text of each page of a PDF, in order.
+
+    PDFs with at least `PDF_PARALLEL_MIN_PAGES` pages are split into ranges of
+    `PDF_PAGES_PER_TASK` pages that are extracted in parallel by a process pool.
+    Pages are yielded as soon as their range is done, so consumers can start
+    chunking before the whole document is extracted.
+
+    Parameters:
+        pdf_path (str): Path to the PDF file.
+        reader (PdfReader, optional): An already opened reader for the file.
+
+    Yields:
+        str: Text content of one page, followed by a newline.
+    """
+    reader = reader or PdfReader(pdf_path)
+    page_count = len(reader.pages)
+    workers = config.PDF_WORKERS or os.cpu_count() or 1
+    if page_count < config.PDF_PARALLEL_MIN_PAGES or workers <= 1:
         for page in reader.pages:
-            text += page.extract_text() + "\n"
-    return text
+            yield page.extract_text() + "\n"
+        return
+
+    pool = _get_pdf_pool()
+    step = max(1, config.PDF_PAGES_PER_TASK)
+    futures = [pool.submit(extract_pdf_page_range, pdf_path, start, min(start + step, page_count))
+               for start in range(0, page_count, step)]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+def extract_pdf(pdf_path, fallback=None) -> Tuple[str, Iterator[str]]:
+    """
+    Opens a PDF once and returns its title together with an iterator over its pages.
+
+    Parameters:
+        pdf_path (str): Path to the PDF file.
+        fallback (str, optional): Fallback title if no metadata or content is found.
+
+    Returns:
+        Tuple[str, Iterator[str]]: The title and the text of each page.
+    """
+    reader = PdfReader(pdf_path)
+    pages = iter_pdf_pages(pdf_path, reader)
+    if reader.metadata and reader.metadata.title:
+        return reader.metadata.title.strip(), pages
+    first_page_text = next(pages, "")
+    return _pdf_title(reader, first_page_text, pdf_path, fallback), itertools.chain([first_page_text], pages)
+
+def extract_docx(docx_path, fallback=None) -> Tuple[str, Iterator[str]]:
+    """
+    Parses a DOCX once and returns its title together with an iterator over its paragraphs.
+
+    Parameters:
+        docx_path (str): Path to the DOCX file.
+        fallback (str, optional): Fallback title if no heading or bold text is found.
+
+    Returns:
+        Tuple[str, Iterator[str]]: The title and the text of each paragraph.
+    """
+    doc = Document(docx_path)
+    return _docx_title(doc, docx_path, fallback), (p.text + "\n" for p in doc.paragraphs)
+
+def extract_document(path) -> Tuple[str, Iterator[str]]:
+    """
+    Extracts the title and text segments (pages, paragraphs or blocks) of a document in a single pass.
+
+    Parameters:
+        path (str): Path to a .pdf, .docx, .notes or .txt file.
+
+    Returns:
+        Tuple[str, Iterator[str]]: The title and the document text as consecutive segments.
+
+    Raises:
+        ValueError: If the file extension is unsupported.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        return extract_pdf(path)
+    if ext == ".docx":
+        return extract_docx(path)
+    if ext == ".notes" or ext == ".txt":
+        return os.path.basename(path), _iter_text_file(path)
+    raise ValueError(f"Unsupported document type: {ext}")
+
+def _iter_text_file(path, block_size=1 << 16):
+    """Yields a plain text file in blocks."""
+    with open(path, 'r') as file:
+        for block in iter(lambda: file.read(block_size), ""):
+            yield block
 
 # Function to extract text from DOCX
 def extract_text_from_docx(docx_path):
@@ -0,0 +1,256 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+import unicodedata
+import numpy as np
+from typing import Dict, List
+from modules import config
+from modules.HashModules import hash_text
+
+# Lookups pending a last_used update that force a write even without an insert
+MAX_PENDING_TOUCHES = 4096
+
+def normalize_text(text: str) -> str:
+    """Normalize unicode and collapse whitespace, so trivially different copies of a text share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+class EmbeddingCache:
+    """
+    Persistent, size-bounded cache of embeddings for one model.
+
+    Vectors are stored in a memory-mapped file of fixed-size slots, and a SQLite table maps
+    the hash of each normalized text to its slot. When the cache is full, the least
+    recently used entries give up their slots. Hits only record their time in memory;
+    it is written with the next insert, so lookups never write to the database.
+    """
+    def __init__(self, folder: str, model_name: str, dimension: int, max_entries: int = config.EMBEDDING_CACHE_MAX_ENTRIES, dtype: str = config.EMBEDDING_CACHE_DTYPE):
+        """
+        Args:
+            folder (str): Folder holding the cache files.
+            model_name (str): Name of the embedding model. Each model gets its own files.
+            dimension (int): Embedding dimension.
+            max_entries (int): Maximum number of cached embeddings.
+            dtype (str): "float16" or "float32" storage type.
+        """
+        os.makedirs(folder, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_entries = max(1, max_entries)
+        self.dtype = np.dtype(dtype)
+        self.vectors_path = os.path.join(folder, f"{slug}-{dimension}-{self.dtype.name}.vectors")
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(os.path.join(folder, f"{slug}-{dimension}-{self.dtype.name}.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            slot INTEGER UNIQUE NOT NULL,
+            last_used REAL NOT NULL
+        )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used)")
+        self.conn.commit()
+        self.vectors = None
+        self.capacity = 0
+        self._open_vectors()
+        # key -> time of the last hit not written to the database yet
+        self._touched: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _open_vectors(self, capacity: int = 0):
+        """Map the vector file, growing it to at least `capacity` slots."""
+        row_bytes = self.dimension * self.dtype.itemsize
+        current = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        capacity = max(current, capacity)
+        if capacity == 0:
+            self.vectors, self.capacity = None, 0
+            return
+        if capacity > current:
+            if self.vectors is not None:
+                self.vectors.flush()
+            self.vectors = None
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self.vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dimension))
+        self.capacity = capacity
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached embeddings.
+
+        Args:
+            keys (List[str]): Cache keys, see `key`.
+
+        Returns:
+            Dict[str, np.ndarray]: float32 embedding per cached key. Missing keys are left out.
+        """
+        results = {}
+        unique = list(dict.fromkeys(keys))
+        with self.lock:
+            # Stay below SQLite's default limit on bound parameters
+            for start in range(0, len(unique), 900):
+                batch = unique[start:start + 900]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", batch).fetchall()
+                for key, slot in rows:
+                    results[key] = np.array(self.vectors[slot], dtype=np.float32)
+            if results:
+                now = time.time()
+                self._touched.update((key, now) for key in results)
+                if len(self._touched) >= MAX_PENDING_TOUCHES:
+                    self._write_touched()
+                    self.conn.commit()
+            self.hits += sum(1 for key in keys if key in results)
+            self.misses += sum(1 for key in keys if key not in results)
+        return results
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        """
+        Store embeddings, evicting the least recently used entries when the cache is full.
+
+        Args:
+            keys (List[str]): Cache keys, see `key`.
+            vectors (np.ndarray): One embedding per key.
+        """
+        items = dict(zip(keys, np.asarray(vectors)))
+        with self.lock:
+            existing = set()
+            keys = list(items)
+            for start in range(0, len(keys), 900):
+                batch = keys[start:start + 900]
+                placeholders = ",".join("?" * len(batch))
+                existing.update(row[0] for row in self.conn.execute(f"SELECT key FROM entries WHERE key IN ({placeholders})", batch))
+            new_keys = [key for key in keys if key not in existing][-self.max_entries:]
+            if not new_keys:
+                return
+            slots = self._allocate(len(new_keys))
+            for key, slot in zip(new_keys, slots):
+                self.vectors[slot] = items[key].astype(self.dtype)
+            self.vectors.flush()
+            now = time.time()
+            self.conn.executemany("INSERT INTO entries VALUES (?, ?, ?)", [(key, slot, now) for key, slot in zip(new_keys, slots)])
+            self._write_touched()
+            self.conn.commit()
+
+    def _write_touched(self):
+        """Write the pending last_used times, without committing. Called with the lock held."""
+        if self._touched:
+            self.conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key, now in self._touched.items()])
+            self._touched = {}
+
+    def _allocate(self, count: int) -> List[int]:
+        """Return `count` free slots, growing the vector file or evicting old entries as needed."""
+        used = len(self)
+        free = min(count, self.max_entries - used)
+        slots = []
+        if free > 0:
+            if used + free > self.capacity:
+                # Grow geometrically so the file is not resized on every insert
+                self._open_vectors(min(self.max_entries, max(used + free, self.capacity * 2, 1024)))
+            # Slots are only freed by eviction, which reuses them at once, so used slots are always 0..used-1
+            slots = list(range(used, used + free))
+        if len(slots) < count:
+            # Eviction order needs the recent hits
+            self._write_touched()
+            evicted = self.conn.execute("SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (count - len(slots),)).fetchall()
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted])
+            slots.extend(slot for _, slot in evicted)
+            self.evictions += len(evicted)
+        return slots
+
+    def key(self, text: str) -> str:
+        """Cache key of a text: hash of its normalized form."""
+        return hash_text(normalize_text(text))
+
+    def stats(self) -> dict:
+        """Return cache counters and size."""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "entries": len(self),
+                "max_entries": self.max_entries,
+                "dtype": self.dtype.name,
+                "disk_bytes": os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def flush(self):
+        """Write the recent hits, so the eviction order survives a restart."""
+        with self.lock:
+            self._write_touched()
+            self.conn.commit()
+
+    def close(self):
+        """Write the vectors and recent hits and close the index."""
+        with self.lock:
+            if self.vectors is not None:
+                self.vectors.flush()
+            self._write_touched()
+            self.conn.commit()
+            self.conn.close()
+
+class CachedEmbeddingModel:
+    """
+    Wraps a SentenceTransformer so `encode` only runs the model on texts missing from an EmbeddingCache.
+
+    Every other attribute is forwarded to the wrapped model.
+    """
+    # encode() options that do not change the returned vectors
+    PASSTHROUGH_OPTIONS = {"show_progress_bar", "device"}
+
+    def __init__(self, model, cache: EmbeddingCache):
+        """
+        Args:
+            model (SentenceTransformer): The embedding model.
+            cache (EmbeddingCache): Cache for the model's embeddings.
+        """
+        self.model = model
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def encode(self, texts, batch_size: int = 32, **kwargs):
+        """
+        Encode texts like SentenceTransformer.encode, serving cached embeddings where possible.
+
+        Args:
+            texts (Union[str, List[str]]): Text or texts to encode.
+            batch_size (int): Batch size for the texts that are not cached.
+            **kwargs: Other encode options. Options that change the output bypass the cache.
+
+        Returns:
+            np.ndarray: float32 embeddings, one row per text (a single vector for a str input).
+        """
+        if set(kwargs) - self.PASSTHROUGH_OPTIONS:
+            return self.model.encode(texts, batch_size=batch_size, **kwargs)
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        keys = [self.cache.key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = {}
+        for text, key in zip(texts, keys):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            encoded = np.asarray(self.model.encode(list(missing.values()), batch_size=batch_size, **kwargs), dtype=np.float32)
+            # Round-trip through the storage type so hits and misses return identical vectors
+            encoded = encoded.astype(self.cache.dtype).astype(np.float32)
+            self.cache.put_many(list(missing), encoded)
+            cached.update(zip(missing, encoded))
+        vectors = np.stack([cached[key] for key in keys]) if keys else np.empty((0, self.cache.dimension), dtype=np.float32)
+        return vectors[0] if single else vectors
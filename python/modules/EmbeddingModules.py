@@ -1,9 +1,40 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
+from typing import Dict, Iterable, Iterator, List
 from modules import config
+from modules.EmbeddingCacheModules import CachedEmbeddingModel,EmbeddingCache
+from modules.ModelModules import register_model
+import functools
+import threading
+import queue
 
-# Load the SentenceTransformer model once globally
-EMBEDDING_MODEL = SentenceTransformer(model_name_or_path="all-MiniLM-L6-v2")
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+def _load_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name_or_path=EMBEDDING_MODEL_NAME)
+
+# One SentenceTransformer shared globally, loaded on first use (see ModelModules)
+BASE_EMBEDDING_MODEL = register_model("embedding", _load_embedding_model)
+EMBEDDING_CACHE = None
+EMBEDDING_MODEL = BASE_EMBEDDING_MODEL
+if config.EMBEDDING_CACHE:
+    # The FAISS dimension must match the model anyway, and reading it from the model would load it
+    EMBEDDING_CACHE = EmbeddingCache(config.EMBEDDING_CACHE_FOLDER, EMBEDDING_MODEL_NAME, config.FAISS_DIM)
+    EMBEDDING_MODEL = CachedEmbeddingModel(BASE_EMBEDDING_MODEL, EMBEDDING_CACHE)
+
+@functools.lru_cache(maxsize=None)
+def get_text_splitter(chunk_size: int = config.CHUNK_SIZE, chunk_overlap: int = config.CHUNK_OVERLAP) -> RecursiveCharacterTextSplitter:
+    """
+    Returns a shared RecursiveCharacterTextSplitter for the given chunk size and overlap.
+
+    Parameters:
+        chunk_size (int): Maximum number of characters per chunk.
+        chunk_overlap (int): Number of characters shared by consecutive chunks.
+
+    Returns:
+        RecursiveCharacterTextSplitter: The cached splitter.
+    """
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size,chunk_overlap=chunk_overlap)
 
 def split_text(text):
     """
@@ -18,5 +49,158 @@ def split_text(text):
     Returns:
         List[str]: A list of text chunks with defined size and overlap.
     """
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=config.CHUNK_SIZE,chunk_overlap=200)
-    return text_splitter.split_text(text)
\ No newline at end of file
+    return get_text_splitter().split_text(text)
+
+def iter_chunks(segments: Iterable[str], chunk_size: int = config.CHUNK_SIZE, chunk_overlap: int = config.CHUNK_OVERLAP) -> Iterator[str]:
+    """
+    Splits a stream of text segments (pages, paragraphs, transcript windows) into overlapping chunks.
+
+    Segments are buffered until a few chunks worth of text is available. The buffer is then split,
+    every chunk but the last is yielded, and the text of the last chunk is carried over so it can
+    grow with the next segments. Only a few chunks of text are held in memory at a time, and the
+    chunks follow the same size and overlap rules as `split_text`.
+
+    Parameters:
+        segments (Iterable[str]): Consecutive pieces of the text.
+        chunk_size (int): Maximum number of characters per chunk.
+        chunk_overlap (int): Number of characters shared by consecutive chunks.
+
+    Yields:
+        str: Text chunks in document order.
+    """
+    splitter = get_text_splitter(chunk_size, chunk_overlap)
+    threshold = chunk_size * 4
+    buffer = ""
+    for segment in segments:
+        buffer += segment
+        if len(buffer) < threshold:
+            continue
+        chunks = splitter.split_text(buffer)
+        if len(chunks) < 2:
+            continue
+        yield from chunks[:-1]
+        # Carry the raw text of the last chunk so separators are kept for the next split
+        start = buffer.rfind(chunks[-1])
+        buffer = buffer[start:] if start >= 0 else chunks[-1]
+    if buffer.strip():
+        yield from splitter.split_text(buffer)
+
+def iter_segment_chunks(segment_batches: Iterable[List[Dict]], chunk_size: int = config.CHUNK_SIZE, chunk_overlap: int = config.CHUNK_OVERLAP) -> Iterator[List[Dict]]:
+    """
+    Groups timed transcript segments into overlapping chunks that start and end on segment boundaries.
+
+    Segments are added to a chunk until the next one would make it longer than `chunk_size`
+    characters, and the next chunk starts with the last segments of the previous one, up to
+    `chunk_overlap` characters. A segment longer than `chunk_size` is a chunk of its own.
+    The text is never split again, so each chunk keeps the time range of its segments.
+
+    Parameters:
+        segment_batches (Iterable[List[Dict]]): Batches of consecutive segments with "start", "end" and "text",
+            e.g. the windows of `WhisperNoFFmpeg.transcribe_stream`.
+        chunk_size (int): Maximum number of characters per chunk.
+        chunk_overlap (int): Maximum number of characters shared by consecutive chunks.
+
+    Yields:
+        List[Dict]: Chunks with "text", "start" and "end", the ones completed by each batch,
+            then a last list with the rest of the transcript.
+    """
+    current = []
+    length = 0
+
+    def close():
+        chunk = {"text": " ".join(segment["text"] for segment in current), "start": current[0]["start"], "end": current[-1]["end"]}
+        overlap, overlap_length = [], 0
+        for segment in reversed(current[1:]):
+            if overlap_length + len(segment["text"]) + 1 > chunk_overlap:
+                break
+            overlap.insert(0, segment)
+            overlap_length += len(segment["text"]) + 1
+        return chunk, overlap, overlap_length
+
+    for batch in segment_batches:
+        chunks = []
+        for segment in batch:
+            text = segment["text"].strip()
+            if not text:
+                continue
+            if current and length + len(text) + 1 > chunk_size:
+                chunk, current, length = close()
+                chunks.append(chunk)
+                if length + len(text) + 1 > chunk_size:
+                    current, length = [], 0
+            current.append({"start": segment["start"], "end": segment["end"], "text": text})
+            length += len(text) + (1 if len(current) > 1 else 0)
+        yield chunks
+    if current:
+        yield [close()[0]]
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    """
+    Groups an iterable into lists of at most `batch_size` items.
+
+    Parameters:
+        items (Iterable): Items to group.
+        batch_size (int): Maximum size of each batch.
+
+    Yields:
+        List: The next batch.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def prefetch(items: Iterable, depth: int = 2) -> Iterator:
+    """
+    Pulls items from an iterable on a background thread, keeping up to `depth` items ready.
+
+    This lets extraction and chunking of the next batch run while the current batch is embedded.
+    Exceptions raised by the producer are re-raised in the consumer.
+
+    Parameters:
+        items (Iterable): Items to produce in the background.
+        depth (int): Maximum number of items buffered ahead of the consumer.
+
+    Yields:
+        The items of `items`, in order.
+    """
+    buffer = queue.Queue(maxsize=max(1, depth))
+    stopped = threading.Event()
+    done = object()
+
+    def put(entry):
+        # Give up once the consumer has stopped, so the thread never blocks forever
+        while not stopped.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((done, e))
+            return
+        put((done, None))
+
+    producer = threading.Thread(target=produce, name="prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
@@ -3,14 +3,23 @@ import json
 import os
 import numpy as np
 import gc
+import threading
+import time
+import functools
 from abc import abstractmethod
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Union
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterable, List, Dict, Union
 from modules import config
-from modules.EmbeddingModules import split_text
-from modules.DocumentModules import extract_text_from_docx,extract_text_from_pdf,extract_title_from_docx,extract_title_from_pdf
-from modules.ImageModules import extract_object_from_image,extract_text_from_image
+from modules.EmbeddingModules import iter_chunks,iter_segment_chunks,iter_batches,prefetch
+from modules.HashModules import hash_key,hash_file
+from modules.MetadataModules import BaseMetadataStore,open_metadata_store
+from modules.IndexModules import INDEX_TYPES,IndexSpec,build_index,configured_spec,create_index,legacy_spec,next_promotion_count,search_parameters
+from modules.DocumentModules import extract_document
+from modules.ImageModules import ImageBatchProcessor
+from modules.ResultCacheModules import get_result_cache
 from pydantic import BaseModel
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 class FileData(BaseModel):
     id:str
     name: str
@@ -20,13 +29,100 @@ class FileClass(BaseModel):
     id:str
     path:str
 
+def synchronized(method):
+    """Run a manager method while holding the manager's lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class VectorStore:
+    """
+    Append-only on-disk store of raw embeddings and their internal IDs.
+
+    Vectors are kept as float32 rows in `<path>.f32` and their IDs as int64 in
+    `<path>.ids`, so a FAISS index can be rebuilt by re-inserting stored vectors
+    instead of re-encoding the original text. IDs are stored in increasing order.
+    """
+    def __init__(self, path: str, dimension: int):
+        """
+        Args:
+            path (str): Base path of the store files.
+            dimension (int): Dimensionality of the stored vectors.
+        """
+        self.vectors_path = f"{path}.f32"
+        self.ids_path = f"{path}.ids"
+        self.dimension = dimension
+
+    def exists(self):
+        """Check if the store files exist on disk."""
+        return os.path.exists(self.vectors_path) and os.path.exists(self.ids_path)
+
+    def __len__(self):
+        if not os.path.exists(self.ids_path):
+            return 0
+        return os.path.getsize(self.ids_path) // np.dtype(np.int64).itemsize
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray):
+        """Append vectors and their IDs to the end of the store."""
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(self.ids_path, "ab") as f:
+            f.write(np.ascontiguousarray(ids, dtype=np.int64).tobytes())
+
+    def load(self):
+        """
+        Load all stored IDs and vectors. Vectors are memory-mapped, not read into memory.
+
+        Returns:
+            tuple: (ids as int64 array, vectors as float32 array of shape (n, dimension))
+        """
+        count = len(self)
+        if count == 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dimension), dtype=np.float32)
+        ids = np.fromfile(self.ids_path, dtype=np.int64, count=count)
+        vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dimension))
+        return ids, vectors
+
+    def read(self, ids: np.ndarray):
+        """
+        Read the vectors of the given IDs. Only their rows are read from disk.
+
+        Returns:
+            tuple: (IDs found, in increasing order; their vectors as a float32 array)
+        """
+        count = len(self)
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        if count == 0 or len(ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dimension), dtype=np.float32)
+        stored_ids = np.memmap(self.ids_path, dtype=np.int64, mode="r", shape=(count,))
+        rows = np.searchsorted(stored_ids, ids)
+        inside = rows < count
+        rows, ids = rows[inside], ids[inside]
+        found = stored_ids[rows] == ids
+        rows, ids = rows[found], ids[found]
+        vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dimension))
+        return ids, np.array(vectors[rows], dtype=np.float32)
+
+    def rewrite(self, ids: np.ndarray, vectors: np.ndarray):
+        """Replace the store content, e.g. after deleting entries."""
+        vectors = np.array(vectors, dtype=np.float32)
+        for path, data in ((self.vectors_path, vectors), (self.ids_path, np.asarray(ids, dtype=np.int64))):
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(np.ascontiguousarray(data).tobytes())
+            os.replace(temp_path, path)
+
 class BaseFaissManager:
     """
     Abstract base class for managing FAISS indexes with metadata support.
     This class handles embedding storage, searching, deduplication, deletion,
     and persistence of both the index and associated metadata.
+    Index and metadata access is guarded by `lock`, so a manager can be shared
+    between request handlers and background ingestion workers.
     """
-    def __init__(self, embedding_model: SentenceTransformer,session_id = "General", index_path="faiss.index", dimension = config.FAISS_DIM):
+    def __init__(self, embedding_model: "SentenceTransformer",session_id = "General", index_path="faiss.index", dimension = config.FAISS_DIM):
         """
         Initialize FAISS manager with a session-specific folder, embedding model, and FAISS configuration.
         
@@ -36,61 +132,258 @@ class BaseFaissManager:
             index_path (str): Name of the FAISS index file.
             dimension (int): Dimensionality of embeddings.
         """
+        self.lock = threading.RLock()
         self.session_folder = os.path.join('userdata',session_id,config.INDEX_BASE_FOLDER)
         os.makedirs(self.session_folder, exist_ok=True)
+        self.index_name = index_path
         self.index_path = os.path.join(self.session_folder,index_path)
-        self.metadata_path = os.path.join(self.session_folder, f"{index_path}-metadata.json")
         self.id_tracker_path = os.path.join(self.session_folder, f"{index_path}-id.json")
-        self.last_id = self._load_last_id() 
+        self.hashes_path = os.path.join(self.session_folder, f"{index_path}-hashes.json")
+        self.last_id = self._load_last_id()
         self.embedding_model = embedding_model
         self.dimension = dimension
         self.index = self._load_or_create_index()
         self.metadata = self._load_metadata()
+        self.content_hashes, self.file_hashes = self._load_hashes()
+        self.vectors = VectorStore(os.path.join(self.session_folder, f"{index_path}-vectors"), dimension)
+        self._pending_vectors = []
+        self._transaction_depth = 0
+        self._dirty = False
+        self._promote_at = 0
+        self._load_vectors()
+        self._maybe_promote()
 
     def _load_last_id(self):
-        """Load the last used integer ID from disk."""
+        """Load the last used integer ID, and the recorded index engine, from disk."""
+        self.index_spec = None
         if os.path.exists(self.id_tracker_path):
             with open(self.id_tracker_path, "r") as f:
-                return json.load(f).get("last_id", 0)
+                data = json.load(f)
+            if "index" in data:
+                self.index_spec = IndexSpec.from_dict(data["index"])
+            return data.get("last_id", 0)
         return -1
 
     def _save_last_id(self):
-        """Save the current last used ID to disk."""
+        """Save the current last used ID and the index engine to disk."""
         with open(self.id_tracker_path, "w") as f:
-            json.dump({"last_id": self.last_id}, f)
+            json.dump({"last_id": self.last_id, "index": self.index_spec.to_dict()}, f)
 
     def _load_or_create_index(self):
         if os.path.exists(self.index_path):
             try:
-                return faiss.read_index(self.index_path)
+                index = faiss.read_index(self.index_path)
+                if self.index_spec is None:
+                    # Indexes written before the engine was recorded are all HNSW
+                    self.index_spec = legacy_spec(self.dimension)
+                return index
             except Exception as e:
                 print(f"Failed to load FAISS index ({self.index_path}): {e}. Creating a new one.")
+        return self._create_index()
+
+    def _create_index(self):
+        """Create a new, empty FAISS index with the configured engine."""
+        self.index_spec = configured_spec(0, self.dimension, self.index_name)
+        return create_index(self.index_spec)
+
+    def _target_spec(self, count: int) -> IndexSpec:
+        """
+        Engine the index should use for `count` vectors. With automatic selection,
+        an index is never moved back to a smaller engine, e.g. after deletes, and an
+        IVF index keeps its cluster count until the ideal one has doubled.
+        """
+        target = configured_spec(count, self.dimension, self.index_name)
+        current = self.index_spec
+        auto = config.FAISS_INDEX_OVERRIDES.get(self.index_name, {}).get("kind", config.FAISS_INDEX_TYPE) == "auto"
+        if auto and current is not None and INDEX_TYPES.index(current.kind) > INDEX_TYPES.index(target.kind) and count >= current.train_size():
+            return current
+        if auto and current is not None and current.kind == target.kind == "ivf" and target.nlist < 2 * current.nlist:
+            target.nlist = current.nlist
+        return target
+
+    def _maybe_promote(self):
+        """
+        Rebuild the index from the vector store when the configured engine for its size has changed.
 
-        index = faiss.IndexHNSWFlat(self.dimension, 32)
-        return faiss.IndexIDMap(index)
+        The engine can only change at a few index sizes, so flushes skip the check until
+        the index has grown to the next of them.
+        """
+        if self.index.ntotal < self._promote_at:
+            return
+        target = self._target_spec(self.index.ntotal)
+        if target.build_key() != self.index_spec.build_key():
+            print(f"Switching {self.index_path} from {self.index_spec.describe()} to {target.describe()}")
+            self._rebuild_index()
+        elif target is not self.index_spec:
+            # Search-time parameters apply without a rebuild
+            self.index_spec.ef_search = target.ef_search
+            self.index_spec.nprobe = target.nprobe
+        self._promote_at = next_promotion_count(self.index.ntotal, self.index_spec, self.index_name)
 
-    def _load_metadata(self):
-        """Load metadata associated with indexed vectors from disk."""
-        if os.path.exists(self.metadata_path):
-            with open(self.metadata_path, "r") as f:
-                return json.load(f)
-        return {}
+    def _load_vectors(self):
+        """
+        Make sure the raw vector store matches the index.
+
+        Indexes created before the vector store existed are migrated by reconstructing
+        their vectors from the FAISS index, falling back to re-encoding the metadata text.
+        """
+        if self.vectors.exists() and len(self.vectors) == self.index.ntotal:
+            return
+        if self.index.ntotal == 0:
+            self.vectors.rewrite(np.empty(0, dtype=np.int64), np.empty((0, self.dimension), dtype=np.float32))
+            return
+        print(f"Building vector store for {self.index_path}...")
+        try:
+            ids = faiss.vector_to_array(self.index.id_map).astype(np.int64)
+            vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        except Exception as e:
+            print(f"Could not reconstruct vectors from index: {e}. Re-encoding metadata.")
+            entries = sorted(self.metadata.items(), key=lambda entry: entry[0])
+            ids = np.array([internal_id for internal_id, _ in entries], dtype=np.int64)
+            texts = [self.get_embedding_text(metadata) for _, metadata in entries]
+            vectors = self.embedding_model.encode(texts, batch_size=config.EMBEDDING_BATCH_SIZE) if texts else np.empty((0, self.dimension))
+        self.vectors.rewrite(ids, vectors)
+
+    def _save_vectors(self):
+        """Append vectors added since the last flush to the vector store."""
+        for ids, vectors in self._pending_vectors:
+            self.vectors.append(ids, vectors)
+        self._pending_vectors = []
+
+    def _load_metadata(self) -> BaseMetadataStore:
+        """Open the metadata store of this index, migrating legacy JSON metadata if needed."""
+        return open_metadata_store(self.index_path)
 
     def _save_metadata(self):
-        """Save metadata to disk."""
-        with open(self.metadata_path, "w") as f:
-            json.dump(self.metadata, f, indent=4)
+        """Make pending metadata writes durable."""
+        self.metadata.flush()
+
+    def _load_hashes(self):
+        """
+        Load the content-hash index from disk, rebuilding it from metadata when it
+        is missing or out of date.
+
+        Returns:
+            tuple: (set of chunk content hashes, dict of file content hash -> metadata ids)
+        """
+        data = {}
+        if os.path.exists(self.hashes_path):
+            try:
+                with open(self.hashes_path, "r") as f:
+                    data = json.load(f)
+                if data.get("count") == len(self.metadata):
+                    return set(data.get("chunks", [])), self._file_hash_lists(data.get("files", {}))
+            except Exception as e:
+                print(f"Failed to load hash index ({self.hashes_path}): {e}. Rebuilding it.")
+                data = {}
+        file_hashes = data.get("files", {})
+        content_hashes = set()
+        for metadata in self.metadata.values():
+            content_hash = self.content_hash(metadata)
+            if content_hash is not None:
+                content_hashes.add(content_hash)
+        metadata_ids = self.get_metadata_ids()
+        file_hashes = {h: [mid for mid in mids if mid in metadata_ids] for h, mids in self._file_hash_lists(file_hashes).items()}
+        return content_hashes, {h: mids for h, mids in file_hashes.items() if mids}
+
+    @staticmethod
+    def _file_hash_lists(file_hashes: Dict) -> Dict[str, List[str]]:
+        """Hash files store a list of metadata ids per file hash, older ones a single id."""
+        return {h: [mids] if isinstance(mids, str) else list(mids) for h, mids in file_hashes.items()}
+
+    def _save_hashes(self):
+        """Save the content-hash index to disk."""
+        with open(self.hashes_path, "w") as f:
+            json.dump({
+                "count": len(self.metadata),
+                "chunks": list(self.content_hashes),
+                "files": self.file_hashes
+            }, f)
 
     def data_exists(self):
         """Check if metadata exists for this session."""
-        return os.path.exists(self.metadata_path)
-    
-    @abstractmethod
+        return self.metadata.exists()
+
+    def get_content_key(self, metadata: Dict) -> tuple:
+        """
+        Return the fields that identify a duplicate entry, or None to disable deduplication.
+        Subclasses override this to describe their own metadata format.
+        """
+        return None
+
+    def content_hash(self, metadata: Dict) -> Union[str, None]:
+        """Return the content hash of a metadata entry, or None if it is not deduplicated."""
+        key = self.get_content_key(metadata)
+        if key is None:
+            return None
+        return hash_key(*key)
+
     def check_duplicate_metadata(self, metadata: Dict[str, Union[str, List[str]]]) -> bool:
-        """Abstract method to check for duplicate metadata. 
-        Each subclass should implement this method to check for duplicates based on its own metadata format."""
-        pass
-    
+        """
+        Check whether an entry with the same content key is already indexed.
+
+        Args:
+            metadata (Dict): Metadata to check.
+
+        Returns:
+            bool: True if duplicate is found, False otherwise.
+        """
+        content_hash = self.content_hash(metadata)
+        return content_hash is not None and content_hash in self.content_hashes
+
+    def is_file_indexed(self, file_hash: str, metadata_id: str = None) -> bool:
+        """Check whether a file with the given content hash has already been indexed, under `metadata_id` if given."""
+        metadata_ids = self.file_hashes.get(file_hash, [])
+        return bool(metadata_ids) if metadata_id is None else metadata_id in metadata_ids
+
+    @synchronized
+    def mark_file_indexed(self, file_hash: str, metadata_id: str):
+        """Record that a file's content has been indexed under the given metadata id."""
+        metadata_ids = self.file_hashes.setdefault(file_hash, [])
+        if metadata_id not in metadata_ids:
+            metadata_ids.append(metadata_id)
+        self._persist()
+
+    @synchronized
+    def reuse_indexed_file(self, file_hash: str, metadata_id: str, path: str) -> bool:
+        """
+        Index a file from entries already indexed for the same content, without processing it again.
+
+        When the content is indexed under another metadata id (the same bytes uploaded again
+        under a new id or path), its entries and stored vectors are copied under the new id
+        and path, so each id can be searched, filtered and deleted on its own.
+
+        Args:
+            file_hash (str): Content hash of the file.
+            metadata_id (str): Metadata id of the new file.
+            path (str): Path of the new file.
+
+        Returns:
+            bool: True if the file needs no processing, False if its content is not indexed yet.
+        """
+        if self.is_file_indexed(file_hash, metadata_id):
+            print(f"File content already indexed, skipping : {path}")
+            return True
+        for source_id in self.file_hashes.get(file_hash, []):
+            source_ids = self.metadata.ids_by_metadata_id(source_id)
+            if not source_ids:
+                continue
+            entries = self.metadata.get_many(source_ids)
+            self._save_vectors()
+            stored_ids, stored_vectors = self.vectors.load()
+            mask = np.isin(stored_ids, source_ids)
+            copied_ids = stored_ids[mask]
+            new_ids = list(range(self.last_id + 1, self.last_id + 1 + len(copied_ids)))
+            metadatas = [(new_id, {**entries[int(internal_id)], "id": metadata_id, "path": path}) for new_id, internal_id in zip(new_ids, copied_ids)]
+            with self.transaction():
+                if new_ids:
+                    self.content_hashes.update(filter(None, (self.content_hash(metadata) for _, metadata in metadatas)))
+                    self._insert(new_ids, np.array(stored_vectors[mask], dtype=np.float32), metadatas)
+                self.mark_file_indexed(file_hash, metadata_id)
+            print(f"File content already indexed as {source_id}, copied {len(new_ids)} entries : {path}")
+            return True
+        return False
+
     @abstractmethod
     def get_embedding_text(self, metadata: Dict) -> str:
         """Abstract method to extract the text that should be used for embedding from metadata.
@@ -99,17 +392,123 @@ class BaseFaissManager:
 
     def add(self, text: str, metadata: Dict[str, Union[str, List[str]]]):
         """Add an embedding and metadata to the FAISS index."""
-        duplicate_data = self.check_duplicate_metadata(metadata)
-        if duplicate_data:
-            print("Duplicate Data, skipping")
-            return duplicate_data
-        self.last_id+=1
-        item_id=self.last_id
-        vector = self.embedding_model.encode([text])[0]
-        self.index.add_with_ids(np.array([vector], dtype=np.float32), np.array([item_id], dtype=np.int64))
-        self.metadata[str(item_id)] = metadata
+        if not self.add_many([text], [metadata]):
+            return True
+
+    @synchronized
+    def add_many(self, texts: List[str], metadatas: List[Dict[str, Union[str, List[str]]]], batch_size: int = None):
+        """
+        Add several embeddings and their metadata to the FAISS index in one pass.
+
+        Texts are encoded in batches, inserted with a single `add_with_ids` call over a
+        contiguous ID range, and the index, metadata and ID tracker are written once
+        (or once at the end of the enclosing `transaction`).
+
+        Args:
+            texts (List[str]): Texts to embed.
+            metadatas (List[Dict]): Metadata for each text.
+            batch_size (int, optional): Encoding batch size. Defaults to config.EMBEDDING_BATCH_SIZE.
+
+        Returns:
+            List[int]: Internal IDs of the added entries. Duplicates are skipped.
+        """
+        if len(texts) != len(metadatas):
+            raise ValueError("texts and metadatas must have the same length")
+        new_texts = []
+        new_ids = []
+        new_metadatas = []
+        new_hashes = []
+        for text, metadata in zip(texts, metadatas):
+            content_hash = self.content_hash(metadata)
+            if content_hash is not None and content_hash in self.content_hashes:
+                print("Duplicate Data, skipping")
+                continue
+            item_id = self.last_id + 1 + len(new_ids)
+            new_metadatas.append((item_id, metadata))
+            if content_hash is not None:
+                self.content_hashes.add(content_hash)
+                new_hashes.append(content_hash)
+            new_texts.append(text)
+            new_ids.append(item_id)
+        if not new_ids:
+            return []
+
+        try:
+            vectors = self.embedding_model.encode(new_texts, batch_size=batch_size or config.EMBEDDING_BATCH_SIZE)
+        except Exception:
+            # Keep hashes consistent with the index if encoding fails
+            self.content_hashes.difference_update(new_hashes)
+            raise
+        self._insert(new_ids, vectors, new_metadatas)
+        return new_ids
+
+    def _insert(self, new_ids: List[int], vectors: np.ndarray, new_metadatas: List[tuple]):
+        """Add vectors under a contiguous range of new internal IDs, with their (id, metadata) pairs. Called with the lock held."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = np.arange(new_ids[0], new_ids[-1] + 1, dtype=np.int64)
+        self.index.add_with_ids(vectors, ids)
+        self.metadata.add_many(new_metadatas)
+        self._pending_vectors.append((ids, vectors))
+        self.last_id = new_ids[-1]
+        self._persist()
+
+    def add_stream(self, texts: Iterable[str], make_metadata: Callable[[str], Dict], batch_size: int = None) -> int:
+        """
+        Embed and add a stream of texts in batches as they are produced.
+
+        The next batch is pulled from `texts` on a background thread while the current one
+        is embedded, so extraction, chunking and embedding overlap and only a few batches of
+        text are held in memory. The whole stream is written to disk once, as one transaction.
+
+        Args:
+            texts (Iterable[str]): Texts to embed, typically from `iter_chunks`.
+            make_metadata (Callable[[str], Dict]): Builds the metadata of a text.
+            batch_size (int, optional): Texts per batch. Defaults to config.EMBEDDING_BATCH_SIZE.
+
+        Returns:
+            int: Number of entries added. Duplicates are skipped.
+        """
+        batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+        added = 0
+        with self.transaction():
+            for batch in prefetch(iter_batches(texts, batch_size)):
+                added += len(self.add_many(batch, [make_metadata(text) for text in batch], batch_size))
+        return added
+
+    @contextmanager
+    def transaction(self):
+        """
+        Defer writing the index, metadata and ID tracker until the block exits.
+
+        Nested transactions are flushed once, when the outermost one exits.
+        The manager's lock is held for the whole block.
+        """
+        with self.lock:
+            self._transaction_depth += 1
+            try:
+                yield self
+            finally:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0 and self._dirty:
+                    self.flush()
+
+    def _persist(self):
+        """Write pending changes now, or mark them dirty inside a transaction."""
+        if self._transaction_depth:
+            self._dirty = True
+        else:
+            self.flush()
+
+    @synchronized
+    def flush(self):
+        """Write the index, metadata and ID tracker to disk."""
+        self._save_vectors()
+        self._maybe_promote()
         self._save_metadata()
         self._save_index()
+        self._save_last_id()
+        self._save_hashes()
+        self._dirty = False
 
     def search(self, query: str, file_paths = None,file_type="", top_k: int = 5):
         """
@@ -117,7 +516,8 @@ class BaseFaissManager:
         
         Args:
             query (str): Search query.
-            file_paths (list[str]): Prioritize results from these file paths.
+            file_paths (list[str]): Prioritize results from these file paths. Their best
+                matches come first, even when they are not in the global top-k.
             file_type (str): Type of the file (document, image, etc).
             top_k (int): Number of top results to return.
         
@@ -125,27 +525,143 @@ class BaseFaissManager:
             List of matched metadata and distances.
         """
         vector = self.embedding_model.encode([query])[0]
-        distances, indices = self.index.search(np.array([vector], dtype=np.float32), top_k)
-        results = []
-        for i, idx in enumerate(indices[0]):
-            matches_path = False
-            if idx == -1:
-                continue
-            item_id_str = str(idx)
-            metadata = self.metadata.get(item_id_str, {})
-            if file_paths:
-                for path in file_paths:
-                    print(f"DEBUG : {metadata.get("path")}")
-                    if metadata.get("path") == path:
-                        matches_path=True
-                        break
-            if file_paths and matches_path:
-                results.insert(0, {"metadata": metadata, "distance": distances[0][i],"type":file_type})
-            else:
-                results.append({"metadata": metadata, "distance": distances[0][i],"type":file_type})
-        
-        return results
+        return self.search_vector(vector, file_paths, file_type, top_k)
+
+    def search_vector(self, vector: np.ndarray, file_paths = None,file_type="", top_k: int = 5):
+        """
+        Search for top-k closest embeddings given an already encoded query.
 
+        Lets callers encode a query once and search several managers with it.
+
+        Args:
+            vector (np.ndarray): Query embedding.
+            file_paths (list[str]): Prioritize results from these file paths.
+            file_type (str): Type of the file (document, image, etc).
+            top_k (int): Number of top results to return.
+
+        Returns:
+            List of matched metadata and distances.
+        """
+        return self._search_vectors(np.array([vector], dtype=np.float32), {"file_paths": file_paths, "mode": "bias"}, file_type, top_k)[0]
+
+    def search_batch(self, queries: List[str], top_k: int = 5, filters: Dict = None, file_type=""):
+        """
+        Search for the top-k closest embeddings of many queries at once.
+
+        All queries are encoded in one model call and searched with one FAISS call,
+        and their metadata is fetched in one lookup.
+
+        Args:
+            queries (List[str]): Search queries.
+            top_k (int): Number of top results per query.
+            filters (Dict, optional): Filters applied to every query:
+                "file_paths" (list[str]): select entries from these file paths.
+                "metadata_ids" (list[str]): select entries with these metadata IDs.
+                "mode" (str): "restrict" (default) only returns selected entries,
+                    "bias" returns the best selected entries first, then global results.
+            file_type (str): Type of the file (document, image, etc).
+
+        Returns:
+            List of result lists, one per query, in query order.
+        """
+        if not queries:
+            return []
+        vectors = self.embedding_model.encode(list(queries), batch_size=config.EMBEDDING_BATCH_SIZE)
+        return self._search_vectors(np.asarray(vectors, dtype=np.float32), filters, file_type, top_k)
+
+    def _filter_ids(self, filters: Dict = None):
+        """
+        Resolve search filters to the internal IDs they select, using the metadata store's path and ID indexes.
+
+        Returns:
+            np.ndarray: Sorted int64 internal IDs, or None when no filter is set.
+        """
+        filters = filters or {}
+        file_paths = filters.get("file_paths")
+        metadata_ids = filters.get("metadata_ids")
+        if not file_paths and not metadata_ids:
+            return None
+        ids = set()
+        if file_paths:
+            ids.update(self.metadata.ids_by_path(file_paths))
+        for metadata_id in metadata_ids or []:
+            ids.update(self.metadata.ids_by_metadata_id(metadata_id))
+        return np.array(sorted(ids), dtype=np.int64)
+
+    def _search_selected(self, vectors: np.ndarray, ids: np.ndarray, top_k: int):
+        """
+        Search only among the given internal IDs.
+
+        Small selections are searched exactly against their stored vectors, reading only
+        their rows. Larger ones use an ID selector inside the FAISS search, so nothing
+        outside the selection is visited.
+
+        Returns:
+            tuple: (distances, indices) shaped like `index.search` output, padded with -1.
+        """
+        distances = np.full((len(vectors), top_k), np.finfo(np.float32).max, dtype=np.float32)
+        indices = np.full((len(vectors), top_k), -1, dtype=np.int64)
+        if len(ids) == 0:
+            return distances, indices
+        if len(ids) > config.SEARCH_EXACT_MAX_IDS:
+            selector = faiss.IDSelectorBatch(ids)
+            params = search_parameters(self.index_spec, top_k, selector, len(ids) / max(1, self.index.ntotal))
+            return self.index.search(vectors, top_k, params=params)
+        candidate_ids, candidates = self.vectors.read(ids)
+        # Vectors added in an open transaction are not in the store yet
+        for pending_ids, pending_vectors in self._pending_vectors:
+            mask = np.isin(pending_ids, ids)
+            if mask.any():
+                candidate_ids = np.concatenate([candidate_ids, pending_ids[mask]])
+                candidates = np.concatenate([candidates, pending_vectors[mask]])
+        # Squared L2, the metric of the FAISS index
+        candidate_distances = (
+            (vectors ** 2).sum(axis=1, keepdims=True)
+            - 2 * vectors @ candidates.T
+            + (candidates ** 2).sum(axis=1)
+        )
+        count = min(top_k, len(candidate_ids))
+        order = np.argsort(candidate_distances, axis=1)[:, :count]
+        distances[:, :count] = np.take_along_axis(candidate_distances, order, axis=1)
+        indices[:, :count] = candidate_ids[order]
+        return distances, indices
+
+    @synchronized
+    def _search_vectors(self, vectors: np.ndarray, filters: Dict = None, file_type="", top_k: int = 5):
+        """
+        Search the index with a matrix of query embeddings.
+
+        Args:
+            vectors (np.ndarray): Query embeddings, one per row.
+            filters (Dict, optional): See `search_batch`.
+            file_type (str): Type of the file (document, image, etc).
+            top_k (int): Number of top results per query.
+
+        Returns:
+            List of result lists, one per query row.
+        """
+        selected = self._filter_ids(filters)
+        mode = (filters or {}).get("mode", "restrict")
+        hits = [[] for _ in range(len(vectors))]
+        if selected is not None:
+            distances, indices = self._search_selected(vectors, selected, top_k)
+            for row in range(len(vectors)):
+                hits[row].extend((int(idx), distance) for idx, distance in zip(indices[row], distances[row]) if idx != -1)
+        if selected is None or mode == "bias":
+            distances, indices = self.index.search(vectors, top_k, params=search_parameters(self.index_spec, top_k))
+            for row in range(len(vectors)):
+                seen = {idx for idx, _ in hits[row]}
+                hits[row].extend((int(idx), distance) for idx, distance in zip(indices[row], distances[row]) if idx != -1 and idx not in seen)
+                del hits[row][top_k:]
+
+        found = self.metadata.get_many({idx for row in hits for idx, _ in row})
+        return [[self.make_result(found.get(idx, {}), distance, file_type) for idx, distance in row] for row in hits]
+
+    def make_result(self, metadata: Dict, distance: float, file_type: str) -> Dict:
+        """Build the search result of one matched entry."""
+        return {"metadata": metadata, "distance": distance, "type": file_type}
+
+    @synchronized
     def delete_by_metadata_id(self, target_id: str):
         """
         Delete all entries with the specified metadata 'id' and rebuild the FAISS index.
@@ -154,10 +670,7 @@ class BaseFaissManager:
         :return: Number of entries deleted
         """
         # Find all internal IDs that match the target metadata ID
-        ids_to_delete = []
-        for internal_id, metadata in self.metadata.items():
-            if metadata.get("id") == target_id:
-                ids_to_delete.append(int(internal_id))
+        ids_to_delete = self.metadata.ids_by_metadata_id(target_id)
         
         if not ids_to_delete:
             print(f"No entries found with metadata id: {target_id}")
@@ -165,70 +678,50 @@ class BaseFaissManager:
         
         print(f"Found {len(ids_to_delete)} entries to delete for metadata id: {target_id}")
         
-        # Remove metadata entries
-        for internal_id in ids_to_delete:
-            del self.metadata[str(internal_id)]
+        # Remove metadata entries and their content hashes
+        for metadata in self.metadata.get_many(ids_to_delete).values():
+            self.content_hashes.discard(self.content_hash(metadata))
+        self.metadata.delete_many(ids_to_delete)
+        self.file_hashes = {h: [mid for mid in mids if mid != target_id] for h, mids in self.file_hashes.items()}
+        self.file_hashes = {h: mids for h, mids in self.file_hashes.items() if mids}
         
-        # Rebuild the FAISS index
-        self._rebuild_index()
+        # Drop the deleted rows from the vector store and rebuild the FAISS index from it
+        self._save_vectors()
+        ids, vectors = self.vectors.load()
+        keep = ~np.isin(ids, np.array(ids_to_delete, dtype=np.int64))
+        ids, vectors = ids[keep], np.array(vectors[keep], dtype=np.float32)
+        self.vectors.rewrite(ids, vectors)
+        self._rebuild_index(ids, vectors)
         
         # Save updated metadata
         self._save_metadata()
+        self._save_hashes()
         
         print(f"Successfully deleted {len(ids_to_delete)} entries and rebuilt index")
         return len(ids_to_delete)
     
-    def _rebuild_index(self):
+    def _rebuild_index(self, ids: np.ndarray = None, vectors: np.ndarray = None):
         """
-        Rebuild the FAISS index from scratch using remaining metadata.
-        This is necessary because FAISS doesn't support efficient deletion.
-        Resets internal IDs to start from 0 again.
+        Rebuild the FAISS index from scratch by re-inserting stored vectors.
+        This is necessary because FAISS doesn't support efficient deletion from HNSW,
+        and is how the index moves to another engine as it grows.
+        Internal IDs are kept, so metadata does not need to be renumbered.
+
+        Args:
+            ids (np.ndarray, optional): Internal IDs to insert. Defaults to the vector store content.
+            vectors (np.ndarray, optional): Vectors matching `ids`.
         """
         print("Rebuilding FAISS index...")
-        
-        # Create new index
-        base_index = faiss.IndexHNSWFlat(self.dimension, 32)
-        self.index = faiss.IndexIDMap(base_index)
-        
-        # Re-add all remaining entries with new sequential IDs
-        if self.metadata:
-            texts = []
-            old_metadata = self.metadata.copy()  # Keep copy of old metadata
-            new_metadata = {}  # Create new metadata with sequential IDs
-            new_id = 0
-            
-            for old_internal_id, metadata in old_metadata.items():
-                # Use the subclass-specific method to extract embeddable text
-                text = self.get_embedding_text(metadata)
-                if text:
-                    texts.append(text)
-                    new_metadata[str(new_id)] = metadata  # Assign new sequential ID
-                    new_id += 1
-            
-            if texts:
-                # Generate embeddings for all texts
-                vectors = self.embedding_model.encode(texts)
-                
-                # Create sequential internal IDs starting from 0
-                sequential_ids = np.arange(len(texts), dtype=np.int64)
-                
-                # Add to index with sequential IDs
-                self.index.add_with_ids(
-                    np.array(vectors, dtype=np.float32),
-                    sequential_ids
-                )
-                
-                # Update metadata with new sequential IDs
-                self.metadata = new_metadata
-                
-                # Update last_id to the highest used ID
-                self.last_id = len(texts) - 1
-            else:
-                # No entries left, reset everything
-                self.metadata = {}
-                self.last_id = -1
-        else:
-            # No metadata, reset everything
+        if ids is None:
+            self._save_vectors()
+            ids, vectors = self.vectors.load()
+
+        spec = self._target_spec(len(ids))
+        self.index = build_index(spec, ids, vectors)
+        self.index_spec = spec
+        self._promote_at = next_promotion_count(len(ids), spec, self.index_name)
+        if not self.metadata:
+            # No entries left, reset everything
             self.last_id = -1
         
         # Save updated last_id
@@ -236,22 +729,33 @@ class BaseFaissManager:
         
         # Save the rebuilt index
         self._save_index()
-        print(f"Index rebuild complete. New last_id: {self.last_id}")
+        print(f"Index rebuild complete ({spec.describe()}). New last_id: {self.last_id}")
     
     def _save_index(self):
         faiss.write_index(self.index, self.index_path)
 
+    def estimated_bytes(self) -> int:
+        """
+        Estimate the resident memory used by this manager: the FAISS index (codes,
+        graph or inverted lists and ID map), the in-memory hash index and the metadata store.
+        """
+        index_bytes = self.index.ntotal * self.index_spec.bytes_per_vector()
+        hash_bytes = (len(self.content_hashes) + len(self.file_hashes)) * 100
+        return index_bytes + hash_bytes + self.metadata.estimated_bytes()
+
+    @synchronized
+    def close(self):
+        """Flush pending changes and release the metadata store."""
+        self.flush()
+        self.metadata.close()
+
     def get_metadata_ids(self):
         """
         Get all unique metadata 'id' values in the index.
         
         :return: Set of metadata IDs
         """
-        metadata_ids = set()
-        for metadata in self.metadata.values():
-            if "id" in metadata:
-                metadata_ids.add(metadata["id"])
-        return metadata_ids
+        return self.metadata.metadata_ids()
 
     def get_entries_by_metadata_id(self, target_id: str):
         """
@@ -260,11 +764,7 @@ class BaseFaissManager:
         :param target_id: The metadata 'id' to search for
         :return: List of metadata entries
         """
-        entries = []
-        for metadata in self.metadata.values():
-            if metadata.get("id") == target_id:
-                entries.append(metadata)
-        return entries
+        return self.metadata.entries_by_metadata_id(target_id)
 
 class DocumentFaissManager(BaseFaissManager):
     """
@@ -281,6 +781,18 @@ class DocumentFaissManager(BaseFaissManager):
             str: The text to be embedded.
         """
         return metadata.get("text", "")
+
+    def get_content_key(self, metadata: Dict) -> tuple:
+        """
+        Documents are duplicates when path, text and title all match.
+
+        Args:
+            metadata (Dict): The metadata dictionary.
+
+        Returns:
+            tuple: The fields used for deduplication.
+        """
+        return (metadata.get("path"), metadata.get("text"), metadata.get("title"))
     
     def add_document(self,id:str, path: str, text: str, title: str = None):
         """
@@ -311,50 +823,24 @@ class DocumentFaissManager(BaseFaissManager):
         """
         if not os.path.exists(path):
             raise FileNotFoundError(f"File not found : {path}")
-        
-        ext = os.path.splitext(path)[1].lower()
-        if ext == ".pdf":
-            text = extract_text_from_pdf(path)
-            inferred_title = extract_title_from_pdf(path)
-        elif ext == ".docx":
-            text = extract_text_from_docx(path)
-            inferred_title = extract_title_from_docx(path)
-        elif ext == ".notes" or ext =='.txt':
-            with open(path,'r') as file:
-                text = file.read()
-            inferred_title = os.path.basename(path)
-        else:
-            raise ValueError(f"Unsupported document type: {ext}")
-        if not text:
+        file_hash = hash_file(path)
+        if self.reuse_indexed_file(file_hash, id, path):
             return
         
-        text_chunks = split_text(text)
-        
-        for chunk in text_chunks:
-            self.add_document(id=id,path=path,text=chunk,title=inferred_title)
-            self._save_last_id()
-
-    def check_duplicate_metadata(self, metadata: Dict[str, Union[str, List[str]]]) -> bool:
-        """
-        Check if the given metadata already exists in the index.
-
-        Args:
-            metadata (Dict): Metadata to check.
-
-        Returns:
-            bool: True if duplicate is found, False otherwise.
-        """
-        for existing_metadata in self.metadata.values():
-            if (existing_metadata.get("path") == metadata.get("path") and
-                existing_metadata.get("text") == metadata.get("text") and
-                existing_metadata.get("title") == metadata.get("title")):
-                return True
-        return False
+        inferred_title, segments = extract_document(path)
+        with self.transaction():
+            self.add_stream(iter_chunks(segments), lambda chunk: {"id":id,"path": path, "text": chunk, "title": inferred_title})
+            self.mark_file_indexed(file_hash, id)
 
 class ImageFaissManager(BaseFaissManager):
     """
     Manages the processing and indexing of images using extracted text and object recognition.
+
+    Attributes:
+        last_image_stats (dict): Per-stage throughput of the latest `process_images` run.
     """
+    last_image_stats: Dict = {}
+
     def get_embedding_text(self, metadata: Dict) -> str:
         """
         Extract the text to embed from image metadata.
@@ -366,6 +852,18 @@ class ImageFaissManager(BaseFaissManager):
             str: The extracted text to embed.
         """
         return metadata.get("text", "")
+
+    def get_content_key(self, metadata: Dict) -> tuple:
+        """
+        Images are duplicates when path, text and the set of detected objects match.
+
+        Args:
+            metadata (Dict): The metadata dictionary.
+
+        Returns:
+            tuple: The fields used for deduplication.
+        """
+        return (metadata.get("path"), metadata.get("text"), sorted(set(metadata.get("objects", []))))
     
     def add_image(self,id:str, path: str, text: str, objects: List[str]):
         """
@@ -393,39 +891,53 @@ class ImageFaissManager(BaseFaissManager):
         """
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"File not found: {image_path}")
-        
-        text = extract_text_from_image(image_path)
-        objects = extract_object_from_image(image_path)
+        errors = self.process_images([image_path], [id])
+        if image_path in errors:
+            raise errors[image_path]
 
-        text_chunks = split_text(text)
-
-        for chunk in text_chunks:
-            self.add_image(id=id,path=image_path,text=chunk,objects=objects)
-            self._save_last_id()
-
-    def check_duplicate_metadata(self, metadata: Dict[str, Union[str, List[str]]]) -> bool:
+    def process_images(self, image_paths: List[str], ids: List[str]) -> Dict[str, Exception]:
         """
-        Check for duplicate image metadata in the index.
+        Process several images at once: each is decoded once, OCR and object detection run
+        concurrently in batches (see ImageBatchProcessor), and the results are indexed.
 
         Args:
-            metadata (Dict): Metadata to check.
+            image_paths (List[str]): Paths to the image files.
+            ids (List[str]): Unique identifier of each image.
 
         Returns:
-            bool: True if duplicate exists, False otherwise.
+            Dict[str, Exception]: Error per image path that could not be processed.
         """
-        for existing_metadata in self.metadata.values():
-            if (existing_metadata.get("path") == metadata.get("path") and
-                existing_metadata.get("text") == metadata.get("text") and
-                set(existing_metadata.get("objects", [])) == set(metadata.get("objects", []))):
-                return True
-        return False
+        errors = {}
+        pending = {}
+        for image_path, id in zip(image_paths, ids):
+            if not os.path.exists(image_path):
+                errors[image_path] = FileNotFoundError(f"File not found: {image_path}")
+                continue
+            file_hash = hash_file(image_path)
+            if self.reuse_indexed_file(file_hash, id, image_path):
+                continue
+            pending[image_path] = (id, file_hash)
+        if not pending:
+            return errors
+        processor = ImageBatchProcessor(cache=get_result_cache())
+        with self.transaction():
+            for image_path, text, objects, error in processor.process(list(pending), {path: file_hash for path, (_, file_hash) in pending.items()}):
+                if error is not None:
+                    print(f"Image processing failed for {image_path} : {error}")
+                    errors[image_path] = error
+                    continue
+                id, file_hash = pending[image_path]
+                self.add_stream(iter_chunks([text]), lambda chunk: {"id":id,"path": image_path, "text": chunk, "objects": objects})
+                self.mark_file_indexed(file_hash, id)
+        self.last_image_stats = processor.stats
+        return errors
 
 
 class AudioFaissManager(BaseFaissManager):
     """
     Handles audio processing by transcribing speech and indexing the transcription.
     """
-    def __init__(self,STT_MODEL, embedding_model: SentenceTransformer,session_id = "General", index_path="faiss.index", dimension = config.FAISS_DIM):
+    def __init__(self,STT_MODEL, embedding_model: "SentenceTransformer",session_id = "General", index_path="faiss.index", dimension = config.FAISS_DIM):
         """
         Initialize the audio FAISS manager.
 
@@ -450,6 +962,34 @@ class AudioFaissManager(BaseFaissManager):
             str: Transcribed text.
         """
         return metadata.get("transcription", "")
+
+    def get_content_key(self, metadata: Dict) -> tuple:
+        """
+        Audio chunks are duplicates when path and transcription match.
+
+        Args:
+            metadata (Dict): Metadata dictionary.
+
+        Returns:
+            tuple: The fields used for deduplication.
+        """
+        return (metadata.get("path"), metadata.get("transcription"))
+
+    def make_result(self, metadata: Dict, distance: float, file_type: str) -> Dict:
+        """
+        Build the search result of one matched entry, with the time range of the chunk in the recording.
+
+        Args:
+            metadata (Dict): Metadata of the entry.
+            distance (float): Distance to the query.
+            file_type (str): Type of the file.
+
+        Returns:
+            Dict: The result. "time_range" is [start, end] in seconds, or None for entries indexed without times.
+        """
+        result = super(AudioFaissManager,self).make_result(metadata, distance, file_type)
+        result["time_range"] = [metadata["start"], metadata["end"]] if "start" in metadata else None
+        return result
     
     def add_audio(self,id:str, path: str, text: str, lang: str = None):
         """
@@ -482,26 +1022,48 @@ class AudioFaissManager(BaseFaissManager):
         """
         Process and transcribe an audio file, then add it to the FAISS index.
 
+        The audio is transcribed in windows, and the chunks transcribed so far are indexed
+        every AUDIO_INDEX_INTERVAL_S seconds, so the start of a long recording is searchable
+        before the rest is done while the index is written to disk only once per interval.
+        Chunks are built from Whisper's segments and store the time range they cover, in
+        seconds rounded to centiseconds.
+
         Args:
             audio_path (str): Path to the audio file.
             id (str): Audio ID.
 
         Raises:
             FileNotFoundError: If the file is not found.
+            Exception: Decoding and transcription errors, so the ingestion job reports them.
+                Chunks indexed before the error are kept.
         """
         if not os.path.exists(audio_path):
             raise FileNotFoundError(f"File not found: {audio_path}")
-        try:
-            result = self.model.transcribe(audio_path)
-            transcription = result["text"]
-            lang = result['language']
-            transcription_chunk = split_text(transcription)
-
-            for chunk in transcription_chunk:
-                self.add_audio(id,audio_path,chunk,lang)
-                self._save_last_id()
-        except Exception as e:
-            print("error during audio transcription :\n",e)
+        file_hash = hash_file(audio_path)
+        if self.reuse_indexed_file(file_hash, id, audio_path):
+            return
+        lang = 'en'
+
+        def segment_batches():
+            nonlocal lang
+            for window in self.model.transcribe_stream(audio_path, file_hash=file_hash):
+                lang = window['language'] or lang
+                # A window without segments is one segment
+                yield window["segments"] or [window]
+
+        pending = []
+        last_commit = time.monotonic()
+        for chunks in iter_segment_chunks(segment_batches()):
+            pending.extend({"id":id,"path": audio_path, "transcription": chunk["text"], "language": lang,
+                            "start": round(chunk["start"], 2), "end": round(chunk["end"], 2)} for chunk in chunks)
+            if pending and time.monotonic() - last_commit >= config.AUDIO_INDEX_INTERVAL_S:
+                self.add_many([metadata["transcription"] for metadata in pending], pending)
+                pending = []
+                last_commit = time.monotonic()
+        with self.transaction():
+            if pending:
+                self.add_many([metadata["transcription"] for metadata in pending], pending)
+            self.mark_file_indexed(file_hash, id)
 
 
 
@@ -0,0 +1,46 @@
+import hashlib
+import json
+
+def hash_text(text: str) -> str:
+    """
+    Returns a stable hex digest of a text string.
+
+    Parameters:
+        text (str): The text to hash.
+
+    Returns:
+        str: SHA-1 hex digest of the UTF-8 encoded text.
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def hash_key(*parts) -> str:
+    """
+    Returns a stable hex digest of a tuple of JSON-serializable values.
+
+    Useful for hashing composite keys such as (path, text, title) without
+    ambiguity between the boundaries of the parts.
+
+    Parameters:
+        *parts: Values that make up the key.
+
+    Returns:
+        str: SHA-1 hex digest of the canonical JSON encoding of the parts.
+    """
+    return hash_text(json.dumps(parts, ensure_ascii=False, sort_keys=True))
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Returns the SHA-256 hex digest of a file's content, read in blocks.
+
+    Parameters:
+        path (str): Path to the file.
+        block_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: SHA-256 hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
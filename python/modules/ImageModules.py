@@ -1,34 +1,215 @@
-from paddleocr import PaddleOCR
-from ultralytics import YOLO
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Union
+from PIL import Image, ImageOps
+from modules import config
+from modules.ModelModules import register_model
+from modules.ResultCacheModules import ResultCache,package_version
 
-OCR = PaddleOCR(use_angle_cls=True, lang="en")
-Yolo = YOLO("yolov8n.pt")
+IMAGE_EXTENSIONS = (".jpg", ".png", ".jpeg", ".webp", ".bmp")
 
-def extract_text_from_image(path : str):
+def _load_ocr():
+    from paddleocr import PaddleOCR
+    return PaddleOCR(use_angle_cls=True, lang="en")
+
+def _load_yolo():
+    from ultralytics import YOLO
+    return YOLO("yolov8n.pt")
+
+# Loaded on first use, see ModelModules
+OCR = register_model("ocr", _load_ocr)
+Yolo = register_model("yolo", _load_yolo)
+
+def load_image(path: str, max_side: int = config.IMAGE_MAX_SIDE) -> np.ndarray:
     """
-    Extracts visible text from an image using PaddleOCR.
+    Decodes an image once into the array both PaddleOCR and YOLO accept.
 
     Args:
         path (str): Path to the image file.
+        max_side (int): Images with a longer side are downsampled to it, keeping the aspect ratio. 0 disables it.
+
+    Returns:
+        np.ndarray: uint8 array of shape (height, width, 3) in BGR order, like cv2.imread.
+    """
+    with Image.open(path) as image:
+        # Honour the camera orientation, then drop alpha and palettes
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        if max_side and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        return np.ascontiguousarray(np.asarray(image)[:, :, ::-1])
+
+def extract_text_from_image(image : Union[str, np.ndarray]):
+    """
+    Extracts visible text from an image using PaddleOCR.
+
+    Args:
+        image (str | np.ndarray): Path to the image file, or an image decoded by `load_image`.
 
     Returns:
         str: Concatenated string of all recognized text in the image.
     """
-    # img = cv2.imread(path)
-    results = OCR.ocr(img=path)
-    extracted_text=" ".join([line[1][0] for result in results for line in result])
+    with OCR.use() as ocr:
+        results = ocr.ocr(img=image)
+    # PaddleOCR returns None for a page without text
+    extracted_text=" ".join([line[1][0] for result in results if result for line in result])
     return extracted_text.strip()
 
-def extract_object_from_image(path : str):
+def extract_object_from_image(image : Union[str, np.ndarray]):
     """
     Detects objects in an image using the YOLOv8 model.
 
     Args:
-        path (str): Path to the image file.
+        image (str | np.ndarray): Path to the image file, or an image decoded by `load_image`.
 
     Returns:
         list: Unique list of detected object class names.
     """
-    results = Yolo(path)
-    objects = [r.names[int(d.cls)] for r in results for d in r.boxes]
-    return list(set(objects))  
\ No newline at end of file
+    return extract_objects_from_images([image])[0]
+
+def extract_objects_from_images(images : List[Union[str, np.ndarray]]) -> List[list]:
+    """
+    Detects objects in several images with one batched YOLOv8 call.
+
+    Args:
+        images (List[str | np.ndarray]): Paths or images decoded by `load_image`.
+
+    Returns:
+        List[list]: Unique detected object class names per image.
+    """
+    if not images:
+        return []
+    results = Yolo(images, verbose=False)
+    return [list(set(r.names[int(d.cls)] for d in r.boxes)) for r in results]
+
+class ImageBatchProcessor:
+    """
+    Analyses many images with OCR and object detection.
+
+    Each image is decoded once by a pool of decoder threads and shared by both models.
+    OCR and YOLO each run on their own thread, so they work on a batch at the same time
+    while the next batch is being decoded. YOLO receives each batch in a single call.
+    PaddleOCR instances are not safe to share between threads, so OCR runs one image at
+    a time on its thread.
+
+    Given the content hash of each file, results are looked up in and stored to a
+    ResultCache, and only the missing ones are computed.
+
+    Attributes:
+        stats (dict): Images processed and busy seconds per stage ("decode", "ocr", "detect") of the last run.
+        ocr_model (str): Result cache identifier of the OCR model and settings.
+        detect_model (str): Result cache identifier of the detection model and settings.
+    """
+    def __init__(self, batch_size: int = config.IMAGE_BATCH_SIZE, decode_workers: int = config.IMAGE_DECODE_WORKERS, max_side: int = config.IMAGE_MAX_SIDE,
+                 cache: ResultCache = None):
+        """
+        Args:
+            batch_size (int): Images per batch.
+            decode_workers (int): Threads decoding images.
+            max_side (int): Longest image side passed to the models, see `load_image`.
+            cache (ResultCache, optional): Cache of OCR and detection results, e.g. `get_result_cache()`. None disables it.
+        """
+        self.batch_size = max(1, batch_size)
+        self.decode_workers = max(1, decode_workers)
+        self.max_side = max_side
+        self.cache = cache
+        self.stats = {}
+        # Downsampling changes what the models see, so it is part of the identifiers
+        self.ocr_model = f"paddleocr-{package_version('paddleocr')}:en:angle_cls:max{max_side}"
+        self.detect_model = f"yolov8n:ultralytics-{package_version('ultralytics')}:max{max_side}"
+
+    def _decode(self, path: str):
+        start = time.perf_counter()
+        try:
+            return path, load_image(path, self.max_side), None, time.perf_counter() - start
+        except Exception as e:
+            return path, None, e, time.perf_counter() - start
+
+    def _timed(self, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args), None, time.perf_counter() - start
+        except Exception as e:
+            return None, e, time.perf_counter() - start
+
+    def process(self, paths: List[str], hashes: Dict[str, str] = None) -> Iterator[Tuple[str, str, list, Exception]]:
+        """
+        Extract the text and objects of images, in batches.
+
+        Args:
+            paths (List[str]): Paths of the image files.
+            hashes (Dict[str, str], optional): Content hash per path, enables the result cache.
+
+        Yields:
+            Tuple[str, str, list, Exception]: (path, text, objects, error) per image. Fully cached
+                images come first, then the others in input order. `error` is None on success,
+                otherwise text and objects are None.
+        """
+        stats = {stage: {"images": 0, "seconds": 0.0} for stage in ("decode", "ocr", "detect")}
+        stats["cache"] = {"ocr_hits": 0, "detect_hits": 0}
+        self.stats = stats
+        start = time.perf_counter()
+        cache = self.cache if hashes else None
+        known = {}
+        for path in paths:
+            text = cache.get(hashes[path], "ocr", self.ocr_model) if cache else None
+            objects = cache.get(hashes[path], "detect", self.detect_model) if cache else None
+            stats["cache"]["ocr_hits"] += text is not None
+            stats["cache"]["detect_hits"] += objects is not None
+            known[path] = [text, objects]
+            if text is not None and objects is not None:
+                yield path, text, objects, None
+        work = [path for path in paths if None in known[path]]
+        batches = [work[i:i + self.batch_size] for i in range(0, len(work), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.decode_workers, thread_name_prefix="image-decode") as decode_pool, \
+             ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-ocr") as ocr_pool, \
+             ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-detect") as detect_pool:
+            decoding = [decode_pool.submit(self._decode, path) for path in batches[0]] if batches else []
+            for index in range(len(batches)):
+                decoded = [future.result() for future in decoding]
+                # Start decoding the next batch while the models work on this one
+                if index + 1 < len(batches):
+                    decoding = [decode_pool.submit(self._decode, path) for path in batches[index + 1]]
+                for _, _, _, seconds in decoded:
+                    stats["decode"]["seconds"] += seconds
+                stats["decode"]["images"] += len(decoded)
+                ocr_items = [(path, image) for path, image, error, _ in decoded if error is None and known[path][0] is None]
+                detect_items = [(path, image) for path, image, error, _ in decoded if error is None and known[path][1] is None]
+                ocr_future = ocr_pool.submit(self._timed, lambda batch: [extract_text_from_image(image) for _, image in batch], ocr_items)
+                detect_future = detect_pool.submit(self._timed, lambda batch: extract_objects_from_images([image for _, image in batch]), detect_items)
+                texts, ocr_error, ocr_seconds = ocr_future.result()
+                objects, detect_error, detect_seconds = detect_future.result()
+                stats["ocr"]["seconds"] += ocr_seconds
+                stats["detect"]["seconds"] += detect_seconds
+                stats["ocr"]["images"] += len(ocr_items)
+                stats["detect"]["images"] += len(detect_items)
+                if ocr_error is None:
+                    for (path, _), text in zip(ocr_items, texts):
+                        known[path][0] = text
+                        if cache:
+                            cache.put(hashes[path], "ocr", self.ocr_model, text)
+                if detect_error is None:
+                    for (path, _), found in zip(detect_items, objects):
+                        known[path][1] = found
+                        if cache:
+                            cache.put(hashes[path], "detect", self.detect_model, found)
+                # A model failure fails the images of the batch it did not get to
+                batch_error = ocr_error or detect_error
+                for path, _, error, _ in decoded:
+                    if error is None and None in known[path]:
+                        error = batch_error
+                    if error is not None:
+                        yield path, None, None, error
+                    else:
+                        yield path, known[path][0], known[path][1], None
+        for stage in ("decode", "ocr", "detect"):
+            stage = stats[stage]
+            stage["images_per_s"] = stage["images"] / stage["seconds"] if stage["seconds"] else None
+        stats["total"] = {"images": len(paths), "seconds": time.perf_counter() - start}
+        stats["total"]["images_per_s"] = len(paths) / stats["total"]["seconds"] if stats["total"]["seconds"] else None
+        print(f"Image pipeline : {self.format_stats()}")
+
+    def format_stats(self) -> str:
+        """One line summary of the stage throughput of the last run."""
+        summary = ", ".join(f"{stage} {values['images']} images in {values['seconds']:.2f}s" for stage, values in self.stats.items() if "seconds" in values)
+        return f"{summary}, cache hits {self.stats['cache']}"
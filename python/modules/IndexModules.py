@@ -0,0 +1,259 @@
+import math
+import faiss
+import numpy as np
+from typing import Dict
+from modules import config
+
+# Engines in promotion order: a session only moves up this list as it grows
+INDEX_TYPES = ["flat", "hnsw", "ivf", "ivfpq"]
+STORAGE_TYPES = {
+    "flat": None,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+}
+# Vectors needed to train a scalar quantizer with reasonable value ranges
+MIN_SQ_TRAIN = 1000
+# FAISS wants at least this many training vectors per cluster
+MIN_POINTS_PER_CENTROID = 39
+
+class IndexSpec:
+    """
+    Description of a FAISS index engine and its parameters.
+
+    Attributes:
+        kind (str): "flat", "hnsw", "ivf" or "ivfpq".
+        dimension (int): Embedding dimension.
+        storage (str): Vector encoding for flat, hnsw and ivf: "flat" (float32), "sq8" or "fp16".
+        m (int): HNSW neighbours per node.
+        ef_construction (int): HNSW build-time search width.
+        ef_search (int): HNSW query-time search width.
+        nlist (int): Number of IVF clusters.
+        nprobe (int): IVF clusters visited per query.
+        pq_m (int): IVF-PQ sub-quantizers. Must divide the dimension.
+        pq_bits (int): Bits per IVF-PQ code.
+    """
+    def __init__(self, kind: str, dimension: int, storage: str = "flat", m: int = 32, ef_construction: int = 40, ef_search: int = 16,
+                 nlist: int = 100, nprobe: int = 8, pq_m: int = 16, pq_bits: int = 8):
+        if kind not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {kind}")
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unsupported index storage: {storage}")
+        self.kind = kind
+        self.dimension = dimension
+        self.storage = storage
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_bits = pq_bits
+
+    def to_dict(self) -> Dict:
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "IndexSpec":
+        return cls(**data)
+
+    def __eq__(self, other):
+        return isinstance(other, IndexSpec) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"IndexSpec({self.describe()})"
+
+    def describe(self) -> str:
+        """Short human readable name, e.g. "hnsw32,sq8" or "ivf256,pq16x8"."""
+        if self.kind == "flat":
+            name = "flat"
+        elif self.kind == "hnsw":
+            name = f"hnsw{self.m}"
+        elif self.kind == "ivf":
+            name = f"ivf{self.nlist}"
+        else:
+            return f"ivf{self.nlist},pq{self.pq_m}x{self.pq_bits}"
+        return name if self.storage == "flat" else f"{name},{self.storage}"
+
+    def build_key(self) -> tuple:
+        """Parameters fixed when the index is built. Search-time parameters are left out."""
+        key = (self.kind, self.storage, self.m, self.pq_m, self.pq_bits)
+        return key + (self.nlist,) if self.kind in ("ivf", "ivfpq") else key
+
+    def train_size(self) -> int:
+        """Number of vectors needed before this index can be trained, 0 if it needs no training."""
+        if self.kind == "ivfpq":
+            return MIN_POINTS_PER_CENTROID * max(self.nlist, 2 ** self.pq_bits)
+        if self.kind == "ivf":
+            return MIN_POINTS_PER_CENTROID * self.nlist
+        return MIN_SQ_TRAIN if self.storage != "flat" else 0
+
+    def bytes_per_vector(self) -> int:
+        """Approximate resident bytes per stored vector, including the ID map."""
+        if self.kind == "ivfpq":
+            return self.pq_m * self.pq_bits // 8 + 16
+        code = {"flat": self.dimension * 4, "sq8": self.dimension, "fp16": self.dimension * 2}[self.storage]
+        if self.kind == "hnsw":
+            code += 2 * self.m * 4
+        elif self.kind == "ivf":
+            code += 8
+        return code + 8
+
+def legacy_spec(dimension: int) -> IndexSpec:
+    """Spec of indexes created before engines were configurable: HNSW with M=32."""
+    return IndexSpec("hnsw", dimension, m=32, ef_construction=40, ef_search=config.FAISS_HNSW_EF_SEARCH)
+
+def configured_spec(count: int, dimension: int, index_name: str = None, trained: bool = True) -> IndexSpec:
+    """
+    Choose the index engine for a number of vectors from the configuration.
+
+    With FAISS_INDEX_TYPE "auto", small indexes are flat (exact search), mid-sized ones HNSW and
+    large ones IVF. Engines that need training fall back to flat until enough vectors exist.
+    FAISS_INDEX_OVERRIDES can set any spec field per index file name, e.g. {"doc.index": {"kind": "hnsw"}}.
+
+    Args:
+        count (int): Number of vectors the index will hold.
+        dimension (int): Embedding dimension.
+        index_name (str, optional): Index file name, used to look up overrides.
+        trained (bool): Fall back to flat when there are too few vectors to train the engine.
+
+    Returns:
+        IndexSpec: The engine to use.
+    """
+    options = {
+        "kind": config.FAISS_INDEX_TYPE,
+        "storage": config.FAISS_INDEX_STORAGE,
+        "m": config.FAISS_HNSW_M,
+        "ef_construction": config.FAISS_HNSW_EF_CONSTRUCTION,
+        "ef_search": config.FAISS_HNSW_EF_SEARCH,
+        "nlist": config.FAISS_NLIST,
+        "nprobe": config.FAISS_NPROBE,
+        "pq_m": config.FAISS_PQ_M,
+        "pq_bits": config.FAISS_PQ_BITS,
+    }
+    options.update(config.FAISS_INDEX_OVERRIDES.get(index_name, {}))
+    if options["kind"] == "auto":
+        if count < config.FAISS_AUTO_FLAT_MAX:
+            options["kind"] = "flat"
+        elif count < config.FAISS_AUTO_IVF_MIN:
+            options["kind"] = "hnsw"
+        else:
+            options["kind"] = "ivf"
+            # Common rule of thumb: about 4 * sqrt(n) clusters
+            options["nlist"] = max(options["nlist"], int(4 * math.sqrt(count)))
+    spec = IndexSpec(dimension=dimension, **options)
+    if trained and count < spec.train_size():
+        return IndexSpec(dimension=dimension, **{**options, "kind": "flat", "storage": "flat"})
+    return spec
+
+def next_promotion_count(count: int, spec: IndexSpec, index_name: str = None) -> float:
+    """
+    Smallest index size above `count` at which the configured engine may differ from `spec`.
+
+    The engine only changes at the automatic size limits, once the configured engine has
+    enough vectors to be trained, and when the automatic IVF cluster count has doubled.
+
+    Args:
+        count (int): Current number of vectors.
+        spec (IndexSpec): Engine the index uses now.
+        index_name (str, optional): Index file name, used to look up overrides.
+
+    Returns:
+        float: The next size to re-check the engine at, or infinity if it cannot change.
+    """
+    thresholds = [
+        config.FAISS_AUTO_FLAT_MAX,
+        config.FAISS_AUTO_IVF_MIN,
+        configured_spec(count, spec.dimension, index_name, trained=False).train_size(),
+    ]
+    if spec.kind == "ivf":
+        # Size at which 4 * sqrt(n) clusters is twice the current count
+        thresholds.append(math.ceil((spec.nlist / 2) ** 2))
+    return min((threshold for threshold in thresholds if threshold > count), default=math.inf)
+
+def create_index(spec: IndexSpec) -> faiss.Index:
+    """
+    Create an empty index for a spec, wrapped in an IndexIDMap so entries keep their internal IDs.
+
+    Args:
+        spec (IndexSpec): Engine and parameters.
+
+    Returns:
+        faiss.IndexIDMap: The new index. Use `build_index` when the spec needs training.
+    """
+    d = spec.dimension
+    qtype = STORAGE_TYPES[spec.storage]
+    if spec.kind == "flat":
+        index = faiss.IndexFlatL2(d) if qtype is None else faiss.IndexScalarQuantizer(d, qtype, faiss.METRIC_L2)
+    elif spec.kind == "hnsw":
+        index = faiss.IndexHNSWFlat(d, spec.m) if qtype is None else faiss.IndexHNSWSQ(d, qtype, spec.m)
+        index.hnsw.efConstruction = spec.ef_construction
+        index.hnsw.efSearch = spec.ef_search
+    elif spec.kind == "ivf":
+        quantizer = faiss.IndexFlatL2(d)
+        if qtype is None:
+            index = faiss.IndexIVFFlat(quantizer, d, spec.nlist, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, d, spec.nlist, qtype, faiss.METRIC_L2)
+        index.nprobe = spec.nprobe
+    else:
+        quantizer = faiss.IndexFlatL2(d)
+        index = faiss.IndexIVFPQ(quantizer, d, spec.nlist, spec.pq_m, spec.pq_bits)
+        index.nprobe = spec.nprobe
+    return faiss.IndexIDMap(index)
+
+def build_index(spec: IndexSpec, ids: np.ndarray, vectors: np.ndarray, max_train: int = 100000) -> faiss.Index:
+    """
+    Create, train if needed and fill an index.
+
+    Args:
+        spec (IndexSpec): Engine and parameters.
+        ids (np.ndarray): Internal IDs.
+        vectors (np.ndarray): Vectors matching `ids`.
+        max_train (int): Maximum number of vectors sampled for training.
+
+    Returns:
+        faiss.IndexIDMap: The filled index.
+    """
+    index = create_index(spec)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > max_train:
+            rows = np.sort(np.random.default_rng(0).choice(len(vectors), max_train, replace=False))
+            sample = vectors[rows]
+        index.train(np.ascontiguousarray(sample))
+    if len(ids):
+        index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    return index
+
+def search_parameters(spec: IndexSpec, top_k: int, selector: faiss.IDSelector = None, selectivity: float = 1.0):
+    """
+    Search parameters for a spec, optionally limited to the IDs accepted by `selector`.
+
+    Args:
+        spec (IndexSpec): Engine of the searched index.
+        top_k (int): Number of neighbours requested.
+        selector (faiss.IDSelector, optional): Restricts the search to some IDs.
+        selectivity (float): Fraction of the index accepted by the selector. Sparse
+            selections widen the HNSW search so enough accepted entries are reached.
+
+    Returns:
+        faiss.SearchParameters: Parameters for `index.search`, or None when defaults apply.
+    """
+    if spec.kind == "hnsw":
+        ef_search = max(spec.ef_search, top_k)
+        if selector is not None and selectivity > 0:
+            ef_search = max(ef_search, min(1024, int(top_k / selectivity)))
+        params = faiss.SearchParametersHNSW(efSearch=ef_search)
+    elif spec.kind in ("ivf", "ivfpq"):
+        params = faiss.SearchParametersIVF(nprobe=spec.nprobe)
+        if selector is not None and selectivity > 0:
+            # Selected entries may sit in few clusters, so probe more of them
+            params.nprobe = min(spec.nlist, max(spec.nprobe, int(spec.nprobe / selectivity)))
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+    return params
@@ -0,0 +1,199 @@
+import os
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+from modules import config
+from modules.ImageModules import IMAGE_EXTENSIONS
+
+class IngestionJob:
+    """
+    A batch of uploaded files to be processed and indexed into one session.
+
+    Attributes:
+        id (str): Unique job identifier.
+        session_id (str): Session whose FAISS managers receive the results.
+        file_paths (list): Paths of the files to process.
+        file_ids (list): Metadata IDs of the files.
+        status (str): "queued", "running", "done" or "failed".
+        files_done (int): Number of files processed so far.
+        current_file (str): File being processed, if any.
+        errors (dict): Error message per failed file path.
+    """
+    def __init__(self, session_id: str, file_paths: List[str], file_ids: List[str], cleanup: bool = True):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.file_paths = list(file_paths)
+        self.file_ids = list(file_ids)
+        self.cleanup = cleanup
+        self.status = "queued"
+        self.files_done = 0
+        self.current_file = None
+        self.errors = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._finished = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    @property
+    def progress(self) -> float:
+        """Fraction of files processed, between 0 and 1."""
+        return self.files_done / len(self.file_paths) if self.file_paths else 1.0
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until the job has finished. Returns False on timeout."""
+        return self._finished.wait(timeout)
+
+    def to_dict(self) -> dict:
+        """Return the job status as a JSON-serializable dict."""
+        return {
+            "job_id": self.id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "progress": self.progress,
+            "files_total": len(self.file_paths),
+            "files_done": self.files_done,
+            "current_file": self.current_file,
+            "errors": self.errors,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class IngestionQueue:
+    """
+    Runs file ingestion jobs on a pool of worker threads so request handlers stay responsive
+    while documents are parsed, images are analysed, audio is transcribed and chunks are embedded.
+    """
+    def __init__(self, process_file: Callable, workers: int = config.INGESTION_WORKERS, history: int = config.INGESTION_JOB_HISTORY):
+        """
+        Args:
+            process_file (Callable): Called as process_file(file_paths=paths, file_ids=ids, session_id=session_id),
+                with one path, or all the images of a job so they are analysed in batches. Returns a dict of
+                errors per path, or raises to fail every given file.
+            workers (int): Number of worker threads.
+            history (int): Number of finished jobs kept for status queries.
+        """
+        self.process_file = process_file
+        self.history = history
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingestion")
+        self.lock = threading.Lock()
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+
+    def submit(self, session_id: str, file_paths: List[str], file_ids: List[str], cleanup: bool = True) -> IngestionJob:
+        """
+        Queue files for ingestion into a session.
+
+        Args:
+            session_id (str): Session whose managers receive the results.
+            file_paths (list): Paths of the files to process.
+            file_ids (list): Metadata IDs of the files.
+            cleanup (bool): Remove each file once it has been processed.
+
+        Returns:
+            IngestionJob: The queued job.
+        """
+        job = IngestionJob(session_id, file_paths, file_ids, cleanup)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._trim()
+        self.executor.submit(self._run, job)
+        return job
+
+    def _cleanup(self, job: IngestionJob, paths: List[str]):
+        """Remove processed files. A file still held open by a model (e.g. on Windows) is left in place."""
+        if not job.cleanup:
+            return
+        for file_path in paths:
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            except OSError as e:
+                print(f"Could not remove {file_path} after ingestion : {e}")
+
+    def _run(self, job: IngestionJob):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            files = list(zip(job.file_paths, job.file_ids))
+            images = [(file_path, file_id) for file_path, file_id in files if file_path.endswith(IMAGE_EXTENSIONS)]
+            # Images go first, in one call, so the image pipeline can batch them
+            groups = ([images] if images else []) + [[item] for item in files if item not in images]
+            for group in groups:
+                paths = [file_path for file_path, _ in group]
+                job.current_file = paths[0] if len(paths) == 1 else f"{len(paths)} images"
+                try:
+                    errors = self.process_file(file_paths=paths, file_ids=[file_id for _, file_id in group], session_id=job.session_id) or {}
+                    for file_path, error in errors.items():
+                        print(f"Ingestion of {file_path} failed : {error}")
+                        job.errors[file_path] = str(error)
+                except Exception as e:
+                    for file_path in paths:
+                        print(f"Ingestion of {file_path} failed : {e}")
+                        job.errors[file_path] = str(e)
+                finally:
+                    self._cleanup(job, paths)
+                job.files_done += len(group)
+        except Exception as e:
+            # Never leave a job "running": waiters would hang on it
+            print(f"Ingestion job {job.id} crashed : {e}")
+            for file_path in job.file_paths:
+                job.errors.setdefault(file_path, str(e))
+        finally:
+            job.current_file = None
+            job.status = "failed" if job.errors and len(job.errors) == len(job.file_paths) else "done"
+            job.finished_at = time.time()
+            print(f"Ingestion job {job.id} {job.status} in {job.finished_at - job.started_at:.2f}s")
+            job._finished.set()
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond the history limit."""
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> IngestionJob:
+        """Return a job by ID, or None if unknown."""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def pending(self, session_id: str = None) -> List[IngestionJob]:
+        """Return unfinished jobs, optionally only those of one session."""
+        with self.lock:
+            return [job for job in self.jobs.values() if not job.finished and (session_id is None or job.session_id == session_id)]
+
+    async def wait_for(self, jobs: List[IngestionJob], timeout: float = config.INGESTION_WAIT_TIMEOUT) -> List[IngestionJob]:
+        """
+        Wait, without blocking the event loop, until all given jobs have finished.
+
+        Args:
+            jobs (List[IngestionJob]): Jobs to wait for.
+            timeout (float): Maximum seconds to wait for all of them. None waits indefinitely.
+
+        Returns:
+            List[IngestionJob]: Jobs still unfinished when the timeout expired.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for job in jobs:
+            if job.finished:
+                continue
+            remaining = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            if not await asyncio.to_thread(job.wait, remaining):
+                break
+        return [job for job in jobs if not job.finished]
+
+    def stats(self) -> dict:
+        """Return the status of every tracked job."""
+        with self.lock:
+            return {"jobs": [job.to_dict() for job in self.jobs.values()]}
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs and optionally wait for running ones."""
+        self.executor.shutdown(wait=wait)
@@ -1,11 +1,24 @@
-from llama_cpp import Llama
 from modules import config
 import json
 import os
+import time
+import heapq
+import statistics
+from collections import deque
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from modules.FAISSModules import ImageFaissManager,DocumentFaissManager,HistoryFaissManager,AudioFaissManager
-from modules.WhisperModules import WhisperNoFFmpeg
+from modules.WhisperModules import WhisperNoFFmpeg,format_timestamp
 from modules.ScheduleModule import ScheduleDBManager
+from modules.SessionModules import SessionCache,SessionManagers,is_nested_session
+from modules.ModelModules import register_model,using
+from modules.ContextModules import TokenCounter,pack_context
+from modules.ImageModules import IMAGE_EXTENSIONS
+
+def load_llm():
+    """Load the chat model from config.MODEL_PATH."""
+    from llama_cpp import Llama
+    return Llama(model_path=config.MODEL_PATH,n_gpu_layers=config.N_GPU_LAYERS,n_ctx=config.CONTEXT_LIMIT,chat_format="chatml",verbose=True)
 
 class LLMManager:
     """
@@ -23,13 +36,25 @@ class LLMManager:
         current_prompt (str): Stores the most recent prompt for reference.
         latest_file (list): List of recently uploaded files.
         scheduleManager: Manages user's calendar/schedule.
-        imageManager, docManager, histManager, audioManager: FAISS index managers.
+        sessions (SessionCache): LRU cache of loaded per-session FAISS managers.
+        last_search_timings (dict): Per-stage latency of the latest search_all, in milliseconds.
+        prompt_caches (dict): llama.cpp prompt caches, one shared RAM cache or one disk cache per session.
+        generation_history (deque): Timings of recent generations, see `stream_generator`.
+        token_counter (TokenCounter): Cached token counts with the model's tokenizer.
+        last_context (dict): Packing statistics of the latest retrieved context.
+        imageManager, docManager, histManager, audioManager: FAISS index managers. None after the active
+            session was deleted, until another session is loaded.
     """
-    def __init__(self,embedding_model,stt_model : WhisperNoFFmpeg ,session_id="General",temperature=0.5,top_k=40,top_p=0.9):
+    def __init__(self,embedding_model,stt_model : WhisperNoFFmpeg ,session_id="General",temperature=0.5,top_k=40,top_p=0.9,llm=None):
         """
         Initialize the LLMManager with configuration and FAISS managers.
+
+        Args:
+            llm (Llama, optional): An already loaded model. Defaults to config.MODEL_PATH, loaded on first use.
         """
-        self.llm = Llama(model_path=config.MODEL_PATH,n_gpu_layers=config.N_GPU_LAYERS,n_ctx=config.TOKEN_LIMIT,chat_format="chatml",verbose=True)
+        # A GGUF model is memory-mapped whole, so its file size is a fair estimate of its footprint
+        model_size = os.path.getsize(config.MODEL_PATH) if os.path.exists(config.MODEL_PATH) else None
+        self.llm = llm if llm is not None else register_model("llm", load_llm, size_bytes=model_size)
         self.temperature=temperature
         self.top_k=top_k
         self.embedding_model=embedding_model
@@ -43,23 +68,61 @@ class LLMManager:
         self.docManager : DocumentFaissManager = None
         self.histManager : HistoryFaissManager = None
         self.audioManager : AudioFaissManager = None
+        self.sessions = SessionCache(self._load_session_managers)
+        # Session whose managers are pinned as the active ones
+        self._active_session = None
+        self.search_pool = ThreadPoolExecutor(max_workers=3,thread_name_prefix="search")
+        self.last_search_timings = {}
+        self.prompt_caches = {}
+        self.generation_history = deque(maxlen=100)
+        self.token_counter = TokenCounter(self.llm)
+        self.last_context = {}
         self._load_faiss()
 
+    def _load_session_managers(self,session_id):
+        """
+        Load the FAISS managers of a session from disk.
+        """
+        return SessionManagers(session_id,embedding_model=self.embedding_model,stt_model=self.stt_model)
+
     def _load_faiss(self):
         """
-        Load or reinitialize FAISS managers for the current session.
+        Load FAISS managers for the current session, reusing cached ones when available.
         """
-        self.imageManager=ImageFaissManager(embedding_model=self.embedding_model,session_id=self.session_id,index_path="image.index")
-        self.docManager=DocumentFaissManager(embedding_model=self.embedding_model,session_id=self.session_id,index_path="doc.index")
-        self.audioManager=AudioFaissManager(STT_MODEL=self.stt_model,embedding_model=self.embedding_model,session_id=self.session_id,index_path="audio.index")
+        managers = self.sessions.acquire(self.session_id)
+        if self._active_session is not None:
+            self.sessions.release(self._active_session)
+        self._active_session = self.session_id
+        self.imageManager=managers.imageManager
+        self.docManager=managers.docManager
+        self.audioManager=managers.audioManager
 
     def _update_session(self,session_id):
         """
-        Change active session and reload FAISS managers accordingly.
+        Change active session and load its FAISS managers, from the session cache if possible.
         """
         self.session_id=session_id
         self._load_faiss()
 
+    def discard_session(self,session_id):
+        """
+        Drop a deleted session (and the sessions nested under it) from the session cache.
+        If the active session is deleted, no session is active until the next `_update_session`.
+        """
+        if self._active_session is not None and is_nested_session(self._active_session,session_id):
+            # Unpin and let go of its managers so its files are closed before the folder is deleted
+            self.sessions.release(self._active_session)
+            self._active_session = None
+            self.imageManager = None
+            self.docManager = None
+            self.audioManager = None
+        self.sessions.discard(session_id)
+        for cached_session in [key for key in self.prompt_caches if key is not None and is_nested_session(key,session_id)]:
+            # Close the disk cache so its folder can be deleted
+            cache = self.prompt_caches.pop(cached_session)
+            if hasattr(cache, "cache"):
+                cache.cache.close()
+
     def _load_schedulemanager(self,userId):
         """
         Initialize the schedule manager using a user ID.
@@ -77,43 +140,71 @@ class LLMManager:
         """
         Check if any FAISS manager has a trained index.
         """
+        if self.docManager is None:
+            return False
         return (
             self.docManager.index.is_trained or
             self.docManager.index.ntotal > 0 or
             self.imageManager.index.is_trained or
-            self.imageManager.index.ntotal > 0
+            self.imageManager.index.ntotal > 0 or
+            self.audioManager.index.is_trained or
+            self.audioManager.index.ntotal > 0
         )
 
     def search_all(self, query: str, latest_upload=None, top_k: int = 5):
         """
         Perform a semantic search across all managers and rank by custom relevancy.
 
+        The query is encoded once, the document, image and audio indexes are searched
+        concurrently, and the results are merged into a single top-k. Per-stage latency
+        is stored in `last_search_timings`.
+
         Args:
             query (str): The query to search for.
             latest_upload (list): Paths of recently uploaded files.
             top_k (int): Number of top results to return.
         """
+        timings = {}
+        start = time.perf_counter()
+        vector = self.embedding_model.encode([query])[0]
+        timings["encode_ms"] = (time.perf_counter() - start) * 1000
+
+        def search_manager(file_type, manager):
+            manager_start = time.perf_counter()
+            found = manager.search_vector(vector, latest_upload, file_type=file_type, top_k=top_k)
+            return file_type, found, (time.perf_counter() - manager_start) * 1000
+
+        managers = {"document": self.docManager, "image": self.imageManager, "audio": self.audioManager}
+        search_start = time.perf_counter()
+        futures = [self.search_pool.submit(search_manager, file_type, manager) for file_type, manager in managers.items() if manager.index.ntotal > 0]
         results = []
-        results.extend(self.docManager.search(query, latest_upload,file_type="document", top_k=top_k))
-        results.extend(self.imageManager.search(query, latest_upload,file_type="image", top_k=top_k))
+        for future in futures:
+            file_type, found, elapsed = future.result()
+            timings[f"{file_type}_search_ms"] = elapsed
+            results.extend(found)
+        timings["search_ms"] = (time.perf_counter() - search_start) * 1000
 
         # Relevancy Score
+        merge_start = time.perf_counter()
         for result in results:
             if latest_upload and any(upload_path in result["metadata"]["path"] for upload_path in latest_upload):
                 result["Relevancy Score"] = result["distance"]*0.75
             else:
                 result["Relevancy Score"] = result["distance"]*2
 
-        # Sort by custom relevance and distance
-        results.sort(key=lambda x: (x["Relevancy Score"], x["distance"]))
-        print(results)
-        return results[:top_k]
+        # Keep the best results by custom relevance and distance
+        results = heapq.nsmallest(top_k, results, key=lambda x: (x["Relevancy Score"], x["distance"]))
+        timings["merge_ms"] = (time.perf_counter() - merge_start) * 1000
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        self.last_search_timings = timings
+        print(f"Search timings : {timings}")
+        return results
     
     def delete_files(self,file_ids:list,types:list):
         """
         Delete indexed files by ID and type (document, image, audio).
         """
-        if not file_ids:
+        if not file_ids or self.docManager is None:
             return
         for id,type in zip(file_ids,types):
             if type in ['pdf','docx','notes','txt']:
@@ -123,22 +214,38 @@ class LLMManager:
             elif type in ['jpg','png','jpeg','webp','bmp']:
                 self.imageManager.delete_by_metadata_id(id)
 
-    def process_file(self,file_paths : list,file_ids:list):
+    def process_file(self,file_paths : list,file_ids:list,session_id=None):
         """
         Process and index uploaded files based on extension.
+
+        Args:
+            file_paths (list): Paths of the files to index.
+            file_ids (list): Metadata IDs of the files.
+            session_id (str, optional): Session to index into. Defaults to the active session.
+
+        Returns:
+            dict: Error per image path that failed. Images are processed together in batches,
+                so their failures are reported here instead of raised.
         """
         if not file_paths:
-            return
-        for file_path,file_id in zip(file_paths,file_ids):
-            if file_path.endswith((".pdf",".docx",'.notes','.txt')):
-                self.docManager.process_document(file_path,file_id)
-            elif file_path.endswith((".jpg", ".png", ".jpeg",'.webp','.bmp')):
-                self.imageManager.process_image(file_path,file_id)
-            elif file_path.endswith((".mp3",".wav")):
-                self.audioManager.process_audio(file_path,file_id)
-            else:
-                print("Invalid file extension")
-                continue
+            return {}
+        # Pinned so the session is not evicted and reloaded while its files are indexed
+        with self.sessions.pinned(session_id or self.session_id) as managers:
+            images = [(file_path,file_id) for file_path,file_id in zip(file_paths,file_ids) if file_path.endswith(IMAGE_EXTENSIONS)]
+            errors = {}
+            if images:
+                errors = managers.imageManager.process_images([path for path,_ in images],[id for _,id in images])
+            for file_path,file_id in zip(file_paths,file_ids):
+                if file_path.endswith((".pdf",".docx",'.notes','.txt')):
+                    managers.docManager.process_document(file_path,file_id)
+                elif file_path.endswith(IMAGE_EXTENSIONS):
+                    continue
+                elif file_path.endswith((".mp3",".wav")):
+                    managers.audioManager.process_audio(file_path,file_id)
+                else:
+                    print("Invalid file extension")
+                    continue
+        return errors
     
     # def stream_generator(self,user_prompt):
     #     final_response=""
@@ -158,12 +265,73 @@ class LLMManager:
     #     print(f'\nFinal Response : \n{final_response}')
     #     return final_response
 
-    def stream_generator(self, user_prompt):
+    def _prompt_cache(self):
+        """
+        Return the llama.cpp prompt cache for the current session, or None when LLM_PROMPT_CACHE is "none".
+
+        The cache stores the model state after each prompt, so a later prompt sharing a prefix
+        with it only evaluates the tokens after that prefix. "ram" keeps one in-memory LRU cache,
+        "disk" keeps one cache per session under the session folder, which survives restarts.
+        """
+        mode = config.LLM_PROMPT_CACHE
+        if mode not in ("ram", "disk"):
+            return None
+        key = self.session_id if mode == "disk" else None
+        cache = self.prompt_caches.get(key)
+        if cache is None:
+            from llama_cpp import LlamaDiskCache, LlamaRAMCache
+            capacity = int(config.LLM_PROMPT_CACHE_MB * 1024 * 1024)
+            if mode == "disk":
+                cache = LlamaDiskCache(cache_dir=os.path.join('userdata', self.session_id, config.LLM_PROMPT_CACHE_FOLDER), capacity_bytes=capacity)
+            else:
+                cache = LlamaRAMCache(capacity_bytes=capacity)
+            self.prompt_caches[key] = cache
+        return cache
+
+    def generation_stats(self):
+        """
+        Summarize the timings of recent generations.
+
+        Returns:
+            dict: Prompt cache mode, the latest generation and time-to-first-token statistics in milliseconds.
+        """
+        ttfts = [entry["ttft_ms"] for entry in self.generation_history if entry["ttft_ms"] is not None]
+        return {
+            "prompt_cache": config.LLM_PROMPT_CACHE,
+            "generations": len(self.generation_history),
+            "last": self.generation_history[-1] if self.generation_history else None,
+            "last_context": self.last_context,
+            "ttft_ms": {
+                "min": min(ttfts),
+                "median": statistics.median(ttfts),
+                "mean": statistics.fmean(ttfts),
+                "max": max(ttfts),
+            } if ttfts else None,
+        }
+
+    def generation_budget(self, messages):
+        """
+        Tokens left for the answer once the prompt is in the context window.
+
+        Args:
+            messages (list): Chat messages of the prompt.
+
+        Returns:
+            int: Maximum tokens to generate, between 1 and config.TOKEN_LIMIT.
+        """
+        room = config.CONTEXT_LIMIT - self.token_counter.count_messages(messages)
+        return max(1, min(config.TOKEN_LIMIT, room))
+
+    def stream_generator(self, user_prompt, max_tokens=None):
         """
         Generate streaming LLM response with reasoning phase.
 
+        Time to first token, total time and chunk count are appended to `generation_history`.
+
         Args:
             user_prompt (list): List of message dicts for chat completion.
+            max_tokens (int, optional): Maximum tokens to generate. Defaults to the room the prompt leaves
+                in config.CONTEXT_LIMIT, at most config.TOKEN_LIMIT.
 
         Yields:
             str: JSON-encoded string with generated text chunks.
@@ -173,34 +341,49 @@ class LLMManager:
             "role": "assistant", 
             "content": "<think>\nLet me think through this step by step:\n"
         })
-        
-        response = self.llm.create_chat_completion(
-            messages=prompt_with_reasoning,
-            stream=True,
-            max_tokens=config.TOKEN_LIMIT,
-            stop=["<|im_end|>", "<|user|>", "<|system|>"],
-            temperature=self.temperature,
-            top_k=self.top_k,
-            top_p=self.top_p,
-            repeat_penalty=1.1
-        )
-        print("<think>\nLet me think through this step by step:\n")
-        in_thinking = True
-        for chunk in response:
-            if "choices" in chunk and chunk["choices"]:
-                text = chunk["choices"][0].get("delta", {}).get("content", "")
-                print(text,end='')
-                # Check if we're leaving thinking mode
-                if "</think>" in text:
-                    in_thinking = False
-                    # Only yield content after </think>
-                    after_thinking = text.split("</think>", 1)
-                    if len(after_thinking) > 1:
-                        yield json.dumps({'text': after_thinking[1]}) + '\n'
-                    continue
+        if max_tokens is None:
+            max_tokens = self.generation_budget(prompt_with_reasoning)
+
+        # Keep the model resident while the response streams
+        with using(self.llm) as llm:
+            cache = self._prompt_cache()
+            if cache is not None and getattr(llm, "cache", None) is not cache:
+                llm.set_cache(cache)
+            timing = {"session_id": self.session_id, "prompt_cache": config.LLM_PROMPT_CACHE, "max_tokens": max_tokens, "ttft_ms": None, "chunks": 0}
+            start = time.perf_counter()
+            response = llm.create_chat_completion(
+                messages=prompt_with_reasoning,
+                stream=True,
+                max_tokens=max_tokens,
+                stop=["<|im_end|>", "<|user|>", "<|system|>"],
+                temperature=self.temperature,
+                top_k=self.top_k,
+                top_p=self.top_p,
+                repeat_penalty=1.1
+            )
+            print("<think>\nLet me think through this step by step:\n")
+            in_thinking = True
+            for chunk in response:
+                if "choices" in chunk and chunk["choices"]:
+                    text = chunk["choices"][0].get("delta", {}).get("content", "")
+                    if text and timing["ttft_ms"] is None:
+                        # Mostly prompt evaluation, which the prompt cache shortens
+                        timing["ttft_ms"] = (time.perf_counter() - start) * 1000
+                    timing["chunks"] += 1
+                    print(text,end='')
+                    # Check if we're leaving thinking mode
+                    if "</think>" in text:
+                        in_thinking = False
+                        # Only yield content after </think>
+                        after_thinking = text.split("</think>", 1)
+                        if len(after_thinking) > 1:
+                            yield json.dumps({'text': after_thinking[1]}) + '\n'
+                        continue
                 
-                if not in_thinking:
-                    yield json.dumps({'text': text}) + '\n'
+                    if not in_thinking:
+                        yield json.dumps({'text': text}) + '\n'
+            timing["total_ms"] = (time.perf_counter() - start) * 1000
+            self.generation_history.append(timing)
         print("================== EOF Prompt ===================")
 
     
@@ -222,10 +405,12 @@ class LLMManager:
             formatted += f"Extracted Text: {data['text']}\n"
         
         elif "audio" == metadata["type"]:
-            formatted = f"Path: {data['title']}\n"
-            formatted = f"Type: {metadata["type"]}\n"
-            formatted += f"Title: {data['distance']}\n"
-            formatted += f"Transcribed Text: {data['text']}\n"
+            formatted = f"Path: {data['path']}\n"
+            formatted += f"Type: {metadata["type"]}\n"
+            formatted += f"Title: {os.path.basename(data['path'])}\n"
+            if "start" in data:
+                formatted += f"Time: {format_timestamp(data['start'])} - {format_timestamp(data['end'])}\n"
+            formatted += f"Transcribed Text: {data['transcription']}\n"
         else:
             return str(metadata)
 
@@ -250,6 +435,7 @@ class LLMManager:
             return "\n".join(lines)
         events = self.scheduleManager.get_upcoming_events(3)
         events_md = format_events_markdown(events)
+        # Date and schedule go last so the instructions before them stay a reusable cached prefix
         prompt = [
             {"role": "system", "content": 
 f"""You are {model_name}, a time management assistant helping users optimize their schedules.
@@ -259,12 +445,12 @@ Use markdown for formatting:
 - Use headings and bullet points
 - Use math and tables if needed
 
+Your job: Analyze the schedule below and respond to the user's time management request clearly and efficiently. Focus only on what the user needs.
+
 Today's date: {today_str}
 
 Here is the user's current schedule:
 {events_md}
-
-Your job: Analyze this schedule and respond to the user's time management request clearly and efficiently. Focus only on what the user needs.
 """
 }
 ,{"role": "user", "content": user_prompt}
@@ -288,22 +474,44 @@ Your job: Analyze this schedule and respond to the user's time management reques
         if mode == 'schedule':
             return self.format_prompt_schedule(user_prompt)
         relevant_entries = []
-        model_path = os.path.basename(config.MODEL_PATH)
-        model_name = os.path.splitext(model_path)[0]
         relevant_section=""
         priority_section=[]
         self.current_prompt=user_prompt
-        if self.faiss_trained():
-            relevant_entries = self.search_all(user_prompt,latest_upload,max(len(latest_upload),1)*5)
-            relevant_section="Added Information : \n"
-            for entry in relevant_entries:
-                relevant_section+=self.format_metadata(entry)
         if latest_upload:
                 upload_info = "\n".join([f"- \"{file}\"" for file in latest_upload])
                 priority_section = (
                     "Item recently uploaded by user :\n"
                     f"{upload_info}"
                 )
+        if self.faiss_trained():
+            relevant_entries = self.search_all(user_prompt,latest_upload,max(len(latest_upload),1)*5)
+            relevant_section="Added Information : \n"
+            # Fill what the prompt without context leaves, keeping room for the answer
+            base_tokens = self.token_counter.count_messages(self.build_chat_prompt(user_prompt,relevant_section,priority_section))
+            budget = min(config.CONTEXT_RETRIEVAL_TOKENS, config.CONTEXT_LIMIT - base_tokens - config.CONTEXT_MIN_GENERATION_TOKENS)
+            context, self.last_context = pack_context(relevant_entries, self.format_metadata, self.token_counter, max(0, budget))
+            relevant_section+=context
+        prompt = self.build_chat_prompt(user_prompt,relevant_section,priority_section)
+        print(prompt)
+        return prompt
+
+    def build_chat_prompt(self,user_prompt,relevant_section="",priority_section=""):
+        """
+        Build the chat messages from the user's message and the retrieved context.
+
+        The static instructions come first and everything that changes between turns comes
+        last, so the llama.cpp prompt cache can reuse the evaluation of the instructions.
+
+        Args:
+            user_prompt (str): The user's message.
+            relevant_section (str): Retrieved file context.
+            priority_section (str): Recently uploaded files to focus on.
+
+        Returns:
+            list: Prompt formatted for LLM chat completion.
+        """
+        model_path = os.path.basename(config.MODEL_PATH)
+        model_name = os.path.splitext(model_path)[0]
         prompt = [
             {"role": "system", "content": 
 f"""You are {model_name}, a helpful AI assistant. You help users study and work on projects by analyzing their materials and providing clear explanations.
@@ -332,18 +540,16 @@ Use markdown formatting with the following structure:
 - $$block math$$ for complex equations
 - Always explain variables and symbols after formulas
 
+Provide your response directly based on the user's question and the available materials.
+
 ## Priority Focus Areas
 {priority_section}
 
 ## Session Files
 {relevant_section}
-
-Provide your response directly based on the user's question and the available materials.
 """
             },{"role": "user", "content": user_prompt}
         ]
-        print(prompt)
-            
         return prompt
 
     
@@ -0,0 +1,325 @@
+import os
+import json
+import sqlite3
+import threading
+from abc import abstractmethod
+from typing import Dict, Iterable, Iterator, List, Tuple
+from modules import config
+
+class BaseMetadataStore:
+    """
+    Abstract storage backend for the metadata attached to FAISS vectors.
+
+    Entries are keyed by the integer internal ID used in the FAISS index. Writes are
+    append-only from the caller's point of view and become durable on `flush`.
+    """
+    path: str
+
+    def exists(self) -> bool:
+        """Check if the store holds any entry. Stores such as SQLite create their file when opened."""
+        return len(self) > 0
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def get_many(self, internal_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Return the metadata of the given internal IDs. Missing IDs are left out."""
+        pass
+
+    @abstractmethod
+    def add_many(self, items: List[Tuple[int, Dict]]):
+        """Add (internal ID, metadata) pairs."""
+        pass
+
+    @abstractmethod
+    def delete_many(self, internal_ids: Iterable[int]):
+        """Delete the entries with the given internal IDs."""
+        pass
+
+    @abstractmethod
+    def ids_by_metadata_id(self, metadata_id: str) -> List[int]:
+        """Return the internal IDs of all entries whose metadata 'id' matches."""
+        pass
+
+    @abstractmethod
+    def ids_by_path(self, paths: Iterable[str]) -> List[int]:
+        """Return the internal IDs of all entries whose metadata 'path' is one of `paths`."""
+        pass
+
+    @abstractmethod
+    def metadata_ids(self) -> set:
+        """Return all unique metadata 'id' values."""
+        pass
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[int, Dict]]:
+        """Iterate over (internal ID, metadata) pairs in internal ID order."""
+        pass
+
+    @abstractmethod
+    def flush(self):
+        """Make pending writes durable."""
+        pass
+
+    def close(self):
+        """Flush and release any resources held by the store."""
+        self.flush()
+
+    def estimated_bytes(self) -> int:
+        """Estimate the memory held by the store."""
+        return 0
+
+    def get(self, internal_id: int, default=None):
+        """Return the metadata of one internal ID."""
+        return self.get_many([internal_id]).get(int(internal_id), default)
+
+    def entries_by_metadata_id(self, metadata_id: str) -> List[Dict]:
+        """Return the metadata of all entries whose metadata 'id' matches."""
+        return list(self.get_many(self.ids_by_metadata_id(metadata_id)).values())
+
+    def values(self) -> Iterator[Dict]:
+        """Iterate over all metadata entries."""
+        for _, metadata in self.items():
+            yield metadata
+
+    def __contains__(self, internal_id) -> bool:
+        return self.get(internal_id) is not None
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+class JsonMetadataStore(BaseMetadataStore):
+    """
+    Legacy backend keeping every entry in one JSON dict that is rewritten on flush.
+    """
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Path of the JSON metadata file.
+        """
+        self.path = path
+        self.data: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.data = json.load(f)
+        self._by_metadata_id: Dict[str, List[int]] = {}
+        for internal_id, metadata in self.data.items():
+            self._by_metadata_id.setdefault(metadata.get("id"), []).append(int(internal_id))
+
+    def __len__(self):
+        return len(self.data)
+
+    def estimated_bytes(self):
+        # Parsed JSON takes a few times its serialized size
+        return os.path.getsize(self.path) * 4 if os.path.exists(self.path) else 0
+
+    def get_many(self, internal_ids):
+        results = {}
+        for internal_id in internal_ids:
+            metadata = self.data.get(str(internal_id))
+            if metadata is not None:
+                results[int(internal_id)] = metadata
+        return results
+
+    def add_many(self, items):
+        for internal_id, metadata in items:
+            self.data[str(internal_id)] = metadata
+            self._by_metadata_id.setdefault(metadata.get("id"), []).append(int(internal_id))
+
+    def delete_many(self, internal_ids):
+        for internal_id in internal_ids:
+            metadata = self.data.pop(str(internal_id), None)
+            if metadata is not None:
+                self._by_metadata_id.get(metadata.get("id"), []).remove(int(internal_id))
+
+    def ids_by_metadata_id(self, metadata_id):
+        return list(self._by_metadata_id.get(metadata_id, []))
+
+    def ids_by_path(self, paths):
+        paths = set(paths)
+        return [int(internal_id) for internal_id, metadata in self.data.items() if metadata.get("path") in paths]
+
+    def metadata_ids(self):
+        return {metadata_id for metadata_id, ids in self._by_metadata_id.items() if ids and metadata_id is not None}
+
+    def items(self):
+        for internal_id in sorted(self.data, key=int):
+            yield int(internal_id), self.data[internal_id]
+
+    def flush(self):
+        with open(self.path, "w") as f:
+            json.dump(self.data, f, indent=4)
+
+class SQLiteMetadataStore(BaseMetadataStore):
+    """
+    SQLite backend with the internal ID as primary key and indexes on the
+    metadata 'id' and 'path', so lookups do not load the whole store.
+    """
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Path of the SQLite database file.
+        """
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS metadata (
+            internal_id INTEGER PRIMARY KEY,
+            metadata_id TEXT,
+            path TEXT,
+            data TEXT NOT NULL
+        )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_metadata_id ON metadata(metadata_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_metadata_path ON metadata(path)")
+        self.conn.commit()
+
+    def _query(self, sql: str, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM metadata")[0][0]
+
+    def estimated_bytes(self):
+        # Only SQLite's page cache stays resident
+        page_size = self._query("PRAGMA page_size")[0][0]
+        cache_size = self._query("PRAGMA cache_size")[0][0]
+        return -cache_size * 1024 if cache_size < 0 else cache_size * page_size
+
+    def get_many(self, internal_ids):
+        internal_ids = [int(internal_id) for internal_id in internal_ids]
+        results = {}
+        # Stay below SQLite's default limit on bound parameters
+        for start in range(0, len(internal_ids), 900):
+            batch = internal_ids[start:start + 900]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._query(f"SELECT internal_id, data FROM metadata WHERE internal_id IN ({placeholders})", batch)
+            for internal_id, data in rows:
+                results[internal_id] = json.loads(data)
+        return results
+
+    def add_many(self, items):
+        rows = [(int(internal_id), metadata.get("id"), metadata.get("path"), json.dumps(metadata)) for internal_id, metadata in items]
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)", rows)
+
+    def delete_many(self, internal_ids):
+        with self.lock:
+            self.conn.executemany("DELETE FROM metadata WHERE internal_id = ?", [(int(internal_id),) for internal_id in internal_ids])
+
+    def ids_by_metadata_id(self, metadata_id):
+        return [row[0] for row in self._query("SELECT internal_id FROM metadata WHERE metadata_id = ? ORDER BY internal_id", (metadata_id,))]
+
+    def entries_by_metadata_id(self, metadata_id):
+        rows = self._query("SELECT data FROM metadata WHERE metadata_id = ? ORDER BY internal_id", (metadata_id,))
+        return [json.loads(row[0]) for row in rows]
+
+    def ids_by_path(self, paths):
+        paths = list(paths)
+        if not paths:
+            return []
+        placeholders = ",".join("?" * len(paths))
+        return [row[0] for row in self._query(f"SELECT internal_id FROM metadata WHERE path IN ({placeholders}) ORDER BY internal_id", paths)]
+
+    def metadata_ids(self):
+        return {row[0] for row in self._query("SELECT DISTINCT metadata_id FROM metadata WHERE metadata_id IS NOT NULL")}
+
+    def items(self):
+        with self.lock:
+            cursor = self.conn.cursor()
+            rows = cursor.execute("SELECT internal_id, data FROM metadata ORDER BY internal_id").fetchall()
+        for internal_id, data in rows:
+            yield internal_id, json.loads(data)
+
+    def flush(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+METADATA_BACKENDS = {
+    "json": (JsonMetadataStore, "metadata.json"),
+    "sqlite": (SQLiteMetadataStore, "metadata.db"),
+}
+
+def migrate_json_metadata(json_path: str, store: BaseMetadataStore, keep_backup: bool = True) -> int:
+    """
+    Copy every entry of a legacy JSON metadata file into another store.
+
+    The entries are committed together and the JSON file is only moved away afterwards, so an
+    interrupted migration leaves the JSON file in place and is run again on the next open.
+    Entries are written by internal ID, so running it again is harmless.
+
+    Args:
+        json_path (str): Path of the `*-metadata.json` file.
+        store (BaseMetadataStore): Destination store.
+        keep_backup (bool): Rename the JSON file to `*.migrated` instead of deleting it.
+
+    Returns:
+        int: Number of migrated entries.
+    """
+    source = JsonMetadataStore(json_path)
+    items = list(source.items())
+    store.add_many(items)
+    store.flush()
+    if keep_backup:
+        os.replace(json_path, f"{json_path}.migrated")
+    else:
+        os.remove(json_path)
+    print(f"Migrated {len(items)} metadata entries from {json_path} to {store.path}")
+    return len(items)
+
+def open_metadata_store(base_path: str, backend: str = None) -> BaseMetadataStore:
+    """
+    Open the metadata store for an index, migrating a legacy JSON file if needed.
+
+    Args:
+        base_path (str): Path of the FAISS index file the metadata belongs to.
+        backend (str, optional): "sqlite" or "json". Defaults to config.METADATA_BACKEND.
+
+    Returns:
+        BaseMetadataStore: The opened store.
+    """
+    backend = backend or config.METADATA_BACKEND
+    if backend not in METADATA_BACKENDS:
+        raise ValueError(f"Unsupported metadata backend: {backend}")
+    store_class, suffix = METADATA_BACKENDS[backend]
+    path = f"{base_path}-{suffix}"
+    json_path = f"{base_path}-metadata.json"
+    # The JSON file is only moved away once the migration is committed
+    needs_migration = store_class is not JsonMetadataStore and os.path.exists(json_path)
+    store = store_class(path)
+    if needs_migration:
+        migrate_json_metadata(json_path, store)
+    return store
+
+def migrate_all(root: str = "userdata", backend: str = None) -> int:
+    """
+    Migrate every legacy JSON metadata file below `root` to the configured backend.
+
+    Returns:
+        int: Number of migrated files.
+    """
+    migrated = 0
+    for folder, _, files in os.walk(root):
+        for name in files:
+            if name.endswith("-metadata.json"):
+                json_path = os.path.join(folder, name)
+                open_metadata_store(json_path[:-len("-metadata.json")], backend).close()
+                if not os.path.exists(json_path):
+                    migrated += 1
+    return migrated
+
+if __name__ == "__main__":
+    import sys
+    root = sys.argv[1] if len(sys.argv) > 1 else "userdata"
+    print(f"Migrated {migrate_all(root)} metadata files under {root}")
@@ -0,0 +1,380 @@
+import functools
+import gc
+import os
+import sys
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List
+from modules import config
+
+MB = 1024 * 1024
+
+def current_rss() -> int:
+    """Resident memory of this process in bytes, or None if it cannot be measured."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class LazyModel:
+    """
+    Loads a model on first use and then behaves like it.
+
+    Attribute access and calls are forwarded to the loaded model, so a LazyModel can be
+    used wherever the model itself was used. Methods reached through the wrapper run
+    inside `use()`, so the model cannot be unloaded while they run. Loading is thread-safe: concurrent callers
+    wait for a single load. A failed load is recorded and retried on the next use.
+    Under a ResidencyManager the model can be unloaded again and is then reloaded on
+    its next use.
+
+    Attributes:
+        name (str): Name shown in the readiness report.
+        state (str): "unloaded", "loading", "loaded" or "failed".
+        load_seconds (float): Time the last successful load took.
+        error (str): Message of the last failed load.
+        size_bytes (int): Estimated memory footprint. Starts from the configured estimate
+            and is replaced by the measured growth of the process during a load.
+        last_used (float): Time of the last use.
+        users (int): Number of callers currently inside `use()`.
+    """
+    def __init__(self, name: str, loader: Callable, size_bytes: int = 0, residency: "ResidencyManager" = None):
+        """
+        Args:
+            name (str): Model name.
+            loader (Callable[[], Any]): Loads and returns the model.
+            size_bytes (int): Estimated memory footprint, used before the first load.
+            residency (ResidencyManager, optional): Manager enforcing the memory budget.
+        """
+        self.name = name
+        self.loader = loader
+        self.state = "unloaded"
+        self.load_seconds = None
+        self.loaded_at = None
+        self.error = None
+        self.size_bytes = size_bytes
+        self.last_used = None
+        self.users = 0
+        self.loads = 0
+        self.residency = residency
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.state == "loaded"
+
+    def get(self):
+        """Return the model, loading it first if needed."""
+        self.last_used = time.time()
+        # Read once: a concurrent unload may clear the attribute after any check
+        model = self._model
+        if model is not None:
+            return model
+        with self._lock:
+            if self.state != "loaded":
+                self._load()
+            return self._model
+
+    def _load(self):
+        """Load the model. Called with the lock held."""
+        if self.residency is not None:
+            self.residency.make_room(self)
+        self.state = "loading"
+        print(f"Loading model : {self.name}")
+        rss_before = current_rss()
+        start = time.perf_counter()
+        try:
+            model = self.loader()
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            print(f"Failed loading model {self.name} : {e}")
+            if self.residency is not None:
+                self.residency.record("load_failed", self, error=self.error)
+            raise
+        self.load_seconds = time.perf_counter() - start
+        rss_after = current_rss()
+        if rss_before is not None and rss_after is not None and rss_after > rss_before:
+            self.size_bytes = rss_after - rss_before
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.error = None
+        self.loads += 1
+        self._model = model
+        self.state = "loaded"
+        print(f"Loaded model {self.name} in {self.load_seconds:.2f}s")
+        if self.residency is not None:
+            self.residency.record("load", self, seconds=round(self.load_seconds, 3))
+
+    def unload(self, reason: str = "manual", blocking: bool = True) -> bool:
+        """
+        Drop the model so its memory can be reclaimed. It is reloaded on its next use.
+
+        Args:
+            reason (str): Why the model is unloaded, recorded in the residency events.
+            blocking (bool): Wait for a load in progress instead of giving up.
+
+        Returns:
+            bool: True if the model was unloaded, False if it was not loaded or is in use.
+        """
+        if not self._lock.acquire(blocking=blocking):
+            return False
+        try:
+            if self.state != "loaded" or self.users > 0:
+                return False
+            self._model = None
+            self.state = "unloaded"
+        finally:
+            self._lock.release()
+        gc.collect()
+        # Return cached GPU memory too when torch is already in use
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        print(f"Unloaded model {self.name} ({reason})")
+        if self.residency is not None:
+            self.residency.record("unload", self, reason=reason)
+        return True
+
+    @contextmanager
+    def use(self):
+        """
+        Keep the model loaded while the block runs.
+
+        Yields:
+            Any: The loaded model.
+        """
+        with self._lock:
+            self.users += 1
+        try:
+            yield self.get()
+        finally:
+            with self._lock:
+                self.users -= 1
+            self.last_used = time.time()
+
+    def __getattr__(self, name):
+        # Only reached for attributes the wrapper itself does not have
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attribute = getattr(self.get(), name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def call(*args, **kwargs):
+            # Look the method up again on the model in use, which may have been reloaded
+            with self.use() as model:
+                return getattr(model, name)(*args, **kwargs)
+        return call
+
+    def __call__(self, *args, **kwargs):
+        with self.use() as model:
+            return model(*args, **kwargs)
+
+    def status(self) -> dict:
+        """Return the load state, timing and footprint of the model."""
+        return {
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+            "size_mb": round(self.size_bytes / MB, 1),
+            "users": self.users,
+            "loads": self.loads,
+            "error": self.error,
+        }
+
+def using(model):
+    """`model.use()` for a LazyModel, a no-op context for an already loaded model."""
+    return model.use() if isinstance(model, LazyModel) else nullcontext(model)
+
+class ResidencyManager:
+    """
+    Keeps the models that are loaded within a memory budget.
+
+    Before a model loads, idle models are unloaded, least recently used first, until the
+    estimated footprint of everything resident fits in the budget. Models with an idle
+    TTL are also unloaded by a background reaper once unused for that long. Models that
+    are in use are never unloaded. Loads and unloads are kept as events for monitoring.
+    """
+    def __init__(self, models: Dict[str, LazyModel], budget_bytes: int = 0, idle_ttl: Dict[str, float] = None,
+                 interval: float = 30, max_events: int = 200):
+        """
+        Args:
+            models (Dict[str, LazyModel]): Registered models by name.
+            budget_bytes (int): Memory allowed for resident models. 0 means no budget.
+            idle_ttl (Dict[str, float], optional): Seconds of disuse after which a model is unloaded.
+                Models without an entry stay loaded.
+            interval (float): Seconds between reaper passes.
+            max_events (int): Number of recent events kept.
+        """
+        self.models = models
+        self.budget_bytes = budget_bytes
+        self.idle_ttl = idle_ttl or {}
+        self.interval = interval
+        self.events = deque(maxlen=max_events)
+        self.event_count = 0
+        self._events_lock = threading.Lock()
+        self._room_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def resident_bytes(self) -> int:
+        return sum(model.size_bytes for model in self.models.values() if model.loaded)
+
+    def record(self, event: str, model: LazyModel, **info):
+        """Append a load or unload event."""
+        with self._events_lock:
+            self.event_count += 1
+            self.events.append({
+                "id": self.event_count,
+                "time": time.time(),
+                "event": event,
+                "model": model.name,
+                "size_mb": round(model.size_bytes / MB, 1),
+                "resident_mb": round(self.resident_bytes() / MB, 1),
+                **info,
+            })
+
+    def make_room(self, model: LazyModel):
+        """Unload idle models, least recently used first, until `model` fits in the budget."""
+        if not self.budget_bytes:
+            return
+        with self._room_lock:
+            candidates = sorted((other for other in self.models.values() if other is not model and other.loaded and other.users == 0),
+                                key=lambda other: other.last_used or 0)
+            for other in candidates:
+                if self.resident_bytes() + model.size_bytes <= self.budget_bytes:
+                    break
+                other.unload(reason=f"budget, loading {model.name}", blocking=False)
+            if self.resident_bytes() + model.size_bytes > self.budget_bytes:
+                print(f"Model budget of {self.budget_bytes / MB:.0f} MB exceeded loading {model.name}, other models are in use")
+
+    def reap(self) -> List[str]:
+        """
+        Unload models that have been idle longer than their TTL.
+
+        Returns:
+            List[str]: Names of the unloaded models.
+        """
+        now = time.time()
+        unloaded = []
+        for name, model in list(self.models.items()):
+            ttl = self.idle_ttl.get(name)
+            if ttl is None or not model.loaded or model.users > 0:
+                continue
+            if now - (model.last_used or 0) >= ttl and model.unload(reason=f"idle {ttl:.0f}s", blocking=False):
+                unloaded.append(name)
+        return unloaded
+
+    def start(self):
+        """Start the background reaper if any model has an idle TTL."""
+        if self._thread is not None or not self.idle_ttl:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                self.reap()
+
+        self._thread = threading.Thread(target=run, name="model-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background reaper."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def status(self) -> dict:
+        """Return the budget, the resident footprint and the state of each model."""
+        return {
+            "budget_mb": round(self.budget_bytes / MB, 1),
+            "resident_mb": round(self.resident_bytes() / MB, 1),
+            "idle_ttl": dict(self.idle_ttl),
+            "models": {name: model.status() for name, model in self.models.items()},
+        }
+
+    def recent_events(self, since: int = 0) -> List[dict]:
+        """Return the kept events with an id greater than `since`."""
+        with self._events_lock:
+            return [event for event in self.events if event["id"] > since]
+
+MODELS: Dict[str, LazyModel] = {}
+RESIDENCY = ResidencyManager(
+    MODELS,
+    budget_bytes=int(config.MODEL_MEMORY_BUDGET_MB * MB),
+    idle_ttl=config.MODEL_IDLE_TTL,
+    interval=config.MODEL_REAPER_INTERVAL,
+)
+_warmup_names: List[str] = []
+
+def register_model(name: str, loader: Callable, size_bytes: int = None, idle_ttl: float = None) -> LazyModel:
+    """
+    Register a lazily loaded model under a name, replacing any model with the same name.
+
+    Args:
+        name (str): Model name, e.g. "embedding", "ocr", "yolo", "whisper" or "llm".
+        loader (Callable[[], Any]): Loads and returns the model.
+        size_bytes (int, optional): Estimated memory footprint. Defaults to MODEL_MEMORY_MB.
+        idle_ttl (float, optional): Seconds of disuse after which the model is unloaded. Defaults to MODEL_IDLE_TTL.
+
+    Returns:
+        LazyModel: The lazy model.
+    """
+    if size_bytes is None:
+        size_bytes = int(config.MODEL_MEMORY_MB.get(name, 0) * MB)
+    if idle_ttl is not None:
+        RESIDENCY.idle_ttl[name] = idle_ttl
+    model = LazyModel(name, loader, size_bytes=size_bytes, residency=RESIDENCY)
+    MODELS[name] = model
+    return model
+
+def warm_up(names: List[str] = None) -> threading.Thread:
+    """
+    Load models in the background so the first request that needs them does not wait.
+
+    Args:
+        names (List[str], optional): Models to load, in order. Defaults to all registered models.
+
+    Returns:
+        threading.Thread: The warm-up thread.
+    """
+    global _warmup_names
+    _warmup_names = [name for name in (names if names is not None else list(MODELS)) if name in MODELS]
+
+    def load_all():
+        for name in _warmup_names:
+            try:
+                MODELS[name].get()
+            except Exception:
+                # Already recorded on the model, it will be retried on first use
+                pass
+
+    thread = threading.Thread(target=load_all, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def readiness() -> dict:
+    """
+    Report which models are loaded and how long each took.
+
+    Returns:
+        dict: "ready" is True once every warm-up model has been loaded, "models" has the status of each model.
+    """
+    return {
+        # A warm-up model unloaded for being idle still counts, it reloads on demand
+        "ready": all(MODELS[name].loads > 0 for name in _warmup_names),
+        "warmup": list(_warmup_names),
+        "models": {name: model.status() for name, model in MODELS.items()},
+    }
@@ -0,0 +1,14 @@
+from pypdf import PdfReader
+
+# Runs in the PDF extraction processes. On Windows they are spawned and import the modules
+# of the functions they run, so this module imports nothing besides pypdf.
+
+def extract_pdf_page_range(pdf_path, start, end):
+    """
+    Extracts the text of pages [start, end) of a PDF. Runs inside the PDF process pool.
+
+    Returns:
+        List[str]: Text of each page, followed by a newline.
+    """
+    reader = PdfReader(pdf_path)
+    return [reader.pages[i].extract_text() + "\n" for i in range(start, end)]
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from importlib import metadata
+from typing import Any
+from modules import config
+
+def package_version(package: str) -> str:
+    """Installed version of a package without importing it, "unknown" if it is not installed."""
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+def _to_json(value):
+    # numpy scalars and arrays in model outputs
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class ResultCache:
+    """
+    Persistent, size-bounded cache of model outputs keyed by file content.
+
+    Entries are keyed by the SHA-256 of the file, the kind of result ("ocr", "detect",
+    "transcribe") and a model identifier that includes the model version and any setting
+    that changes the output. The cache is a single SQLite file, by default in the user's
+    home folder, so every session and user on the machine shares it. When it grows past
+    its size limit, the least recently used entries are removed.
+    """
+    def __init__(self, path: str = config.RESULT_CACHE_PATH, max_bytes: int = int(config.RESULT_CACHE_MAX_MB * 1024 * 1024)):
+        """
+        Args:
+            path (str): SQLite file of the cache. "~" is expanded.
+            max_bytes (int): Maximum total size of the stored results.
+        """
+        self.path = os.path.expanduser(path)
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Several server processes may share the file, so wait for their writes
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS results (
+            file_hash TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            model TEXT NOT NULL,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (file_hash, kind, model)
+        )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results(last_used)")
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, file_hash: str, kind: str, model: str) -> Any:
+        """
+        Args:
+            file_hash (str): SHA-256 of the file content.
+            kind (str): Kind of result.
+            model (str): Model identifier.
+
+        Returns:
+            Any: The cached result, or None if it is not cached.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM results WHERE file_hash = ? AND kind = ? AND model = ?", (file_hash, kind, model)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE results SET last_used = ? WHERE file_hash = ? AND kind = ? AND model = ?", (time.time(), file_hash, kind, model))
+            self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, file_hash: str, kind: str, model: str, value: Any):
+        """
+        Store a result, evicting the least recently used ones if the cache is over its size limit.
+
+        Args:
+            file_hash (str): SHA-256 of the file content.
+            kind (str): Kind of result.
+            model (str): Model identifier.
+            value (Any): JSON-serializable result.
+        """
+        text = json.dumps(value, ensure_ascii=False, default=_to_json)
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", (file_hash, kind, model, text, size, time.time()))
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Remove the least recently used entries until the cache fits its size limit. Called with the lock held."""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        removed = []
+        for file_hash, kind, model, size in self.conn.execute("SELECT file_hash, kind, model, size FROM results ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            removed.append((file_hash, kind, model))
+            total -= size
+        self.conn.executemany("DELETE FROM results WHERE file_hash = ? AND kind = ? AND model = ?", removed)
+        self.evictions += len(removed)
+
+    def stats(self) -> dict:
+        """Return cache counters and size."""
+        with self.lock:
+            entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            kinds = dict(self.conn.execute("SELECT kind, COUNT(*) FROM results GROUP BY kind").fetchall())
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "entries_by_kind": kinds,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+_result_cache: ResultCache = None
+_result_cache_lock = threading.Lock()
+
+def get_result_cache() -> ResultCache:
+    """
+    Return the cache shared by every manager in this process, None when disabled.
+
+    The SQLite file is opened on first use rather than at import, so importing a module
+    that uses the cache does not create it.
+    """
+    global _result_cache
+    if not config.RESULT_CACHE:
+        return None
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache()
+        return _result_cache
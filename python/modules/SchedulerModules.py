@@ -0,0 +1,233 @@
+import time
+import uuid
+import asyncio
+import threading
+from collections import deque
+from typing import Callable, Iterator, List
+from modules import config
+
+class QueueFullError(Exception):
+    """Raised when the inference queue already holds the maximum number of waiting requests."""
+
+class InferenceRequest:
+    """
+    A generation waiting for or running on the inference thread.
+
+    Attributes:
+        id (str): Unique request identifier.
+        cost (int): Estimated cost in tokens, used to run cheap requests first.
+        status (str): "queued", "running", "done", "cancelled" or "failed".
+        chunks (int): Number of chunks produced so far.
+    """
+    def __init__(self, run: Callable[[], Iterator[str]], cost: int, loop: asyncio.AbstractEventLoop = None):
+        """
+        Args:
+            run (Callable[[], Iterator[str]]): Starts the generation and returns its chunks.
+            cost (int): Estimated cost in tokens.
+            loop (asyncio.AbstractEventLoop, optional): Loop of the request handler that receives the chunks.
+        """
+        self.id = uuid.uuid4().hex
+        self.run = run
+        self.cost = cost
+        self.status = "queued"
+        self.chunks = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.loop = loop
+        self.output = asyncio.Queue() if loop is not None else None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Stop the request. A queued request is dropped, a running one stops at its next chunk."""
+        self._cancelled.set()
+
+    def wait_seconds(self, now: float = None) -> float:
+        """Time spent waiting in the queue."""
+        return (self.started_at or now or time.time()) - self.created_at
+
+    def _emit(self, item):
+        """Hand an item to the request handler's loop. The sentinel None ends the stream."""
+        if self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.output.put_nowait, item)
+        except RuntimeError:
+            # The handler's loop is closed, nobody is listening any more
+            self.cancel()
+
+    def to_dict(self) -> dict:
+        """Return the request status as a JSON-serializable dict."""
+        return {
+            "request_id": self.id,
+            "status": self.status,
+            "cost": self.cost,
+            "chunks": self.chunks,
+            "wait_ms": self.wait_seconds() * 1000 if self.started_at else None,
+            "run_ms": (self.finished_at - self.started_at) * 1000 if self.finished_at and self.started_at else None,
+            "error": self.error,
+            "created_at": self.created_at,
+        }
+
+class InferenceScheduler:
+    """
+    Runs generations one at a time on a dedicated thread, so concurrent requests never share
+    the llama.cpp context.
+
+    Waiting requests are ordered shortest job first by estimated cost, with aging: each second
+    of waiting lowers a request's cost by `aging_tokens_per_s`, so expensive requests are not
+    starved by a stream of cheap ones. Scheduling is non-preemptive: a running generation
+    keeps the model until it finishes or its client disconnects.
+    """
+    def __init__(self, max_queue: int = config.INFERENCE_QUEUE_SIZE, aging_tokens_per_s: float = config.INFERENCE_AGING_TOKENS_PER_S,
+                 history: int = 200):
+        """
+        Args:
+            max_queue (int): Maximum number of waiting requests. Further submissions raise QueueFullError.
+            aging_tokens_per_s (float): Cost discount per second of waiting.
+            history (int): Number of finished requests kept for metrics.
+        """
+        self.max_queue = max_queue
+        self.aging_tokens_per_s = aging_tokens_per_s
+        self.queue: List[InferenceRequest] = []
+        self.current: InferenceRequest = None
+        self.finished = deque(maxlen=history)
+        self.counts = {"submitted": 0, "rejected": 0, "done": 0, "cancelled": 0, "failed": 0}
+        self.condition = threading.Condition()
+        self._stop = False
+        self.thread = threading.Thread(target=self._worker, name="inference", daemon=True)
+        self.thread.start()
+
+    def submit(self, run: Callable[[], Iterator[str]], cost: int = 0) -> InferenceRequest:
+        """
+        Queue a generation. Must be called from the request handler's event loop.
+
+        Args:
+            run (Callable[[], Iterator[str]]): Starts the generation and returns its chunks.
+            cost (int): Estimated cost in tokens, e.g. the prompt length.
+
+        Returns:
+            InferenceRequest: The queued request. Stream it with `stream`.
+
+        Raises:
+            QueueFullError: If `max_queue` requests are already waiting.
+        """
+        request = InferenceRequest(run, cost, asyncio.get_running_loop())
+        with self.condition:
+            if len(self.queue) >= self.max_queue:
+                self.counts["rejected"] += 1
+                raise QueueFullError(f"{len(self.queue)} generations are already waiting")
+            self.queue.append(request)
+            self.counts["submitted"] += 1
+            self.condition.notify()
+        return request
+
+    async def stream(self, request: InferenceRequest):
+        """
+        Yield the chunks of a request as they are generated. The request is cancelled if the
+        consumer stops early, e.g. when the client disconnects.
+        """
+        completed = False
+        try:
+            while True:
+                item = await request.output.get()
+                if item is None:
+                    completed = True
+                    return
+                if isinstance(item, Exception):
+                    completed = True
+                    raise item
+                yield item
+        finally:
+            if not completed:
+                request.cancel()
+                with self.condition:
+                    # Wake the worker so a cancelled queued request is dropped at once
+                    self.condition.notify()
+
+    def _next(self) -> InferenceRequest:
+        """Remove and return the waiting request with the lowest aged cost. Called with the lock held."""
+        now = time.time()
+        for request in [request for request in self.queue if request.cancelled]:
+            self.queue.remove(request)
+            self._finish(request, "cancelled")
+        if not self.queue:
+            return None
+        request = min(self.queue, key=lambda request: (request.cost - request.wait_seconds(now) * self.aging_tokens_per_s, request.created_at))
+        self.queue.remove(request)
+        return request
+
+    def _finish(self, request: InferenceRequest, status: str):
+        request.status = status
+        request.finished_at = time.time()
+        self.counts[status] += 1
+        self.finished.append(request)
+        request._emit(None)
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                request = self._next()
+                while request is None and not self._stop:
+                    self.condition.wait()
+                    request = self._next()
+                if request is None:
+                    return
+                request.status = "running"
+                request.started_at = time.time()
+                self.current = request
+            status = "done"
+            chunks = None
+            try:
+                chunks = request.run()
+                for chunk in chunks:
+                    if request.cancelled:
+                        status = "cancelled"
+                        break
+                    request.chunks += 1
+                    request._emit(chunk)
+            except Exception as e:
+                print(f"Inference request {request.id} failed : {e}")
+                status = "failed"
+                request.error = str(e)
+                request._emit(e)
+            finally:
+                if chunks is not None and hasattr(chunks, "close"):
+                    # Stops llama.cpp generating the rest of a cancelled answer
+                    chunks.close()
+            with self.condition:
+                self.current = None
+                self._finish(request, status)
+
+    def stats(self) -> dict:
+        """Return queue depth, wait times and counters."""
+        with self.condition:
+            now = time.time()
+            waits = sorted(request.wait_seconds() * 1000 for request in self.finished if request.started_at)
+            return {
+                "queue_depth": len(self.queue),
+                "max_queue": self.max_queue,
+                "running": self.current.to_dict() if self.current else None,
+                "queued": [{**request.to_dict(), "waiting_ms": request.wait_seconds(now) * 1000} for request in self.queue],
+                "counts": dict(self.counts),
+                "wait_ms": {
+                    "p50": waits[len(waits) // 2],
+                    "p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))],
+                    "max": waits[-1],
+                } if waits else None,
+                "recent": [request.to_dict() for request in list(self.finished)[-10:]],
+            }
+
+    def shutdown(self):
+        """Cancel waiting requests and stop the worker after the running one."""
+        with self.condition:
+            for request in self.queue:
+                request.cancel()
+            self._stop = True
+            self.condition.notify()
+        self.thread.join()
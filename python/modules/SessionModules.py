@@ -0,0 +1,164 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from modules import config
+from modules.FAISSModules import ImageFaissManager,DocumentFaissManager,AudioFaissManager
+
+def is_nested_session(session_id: str, parent_id: str) -> bool:
+    """Check if `session_id` is `parent_id` itself or a session nested under it."""
+    parent_id = parent_id.rstrip("/\\")
+    return session_id == parent_id or session_id.startswith((parent_id + "/", parent_id + "\\"))
+
+class SessionManagers:
+    """
+    The set of FAISS managers that belong to one session.
+
+    Attributes:
+        session_id (str): Session identifier.
+        imageManager, docManager, audioManager: FAISS index managers of the session.
+    """
+    def __init__(self, session_id, embedding_model, stt_model):
+        """
+        Load the FAISS managers of a session from disk.
+
+        Args:
+            session_id (str): Session identifier.
+            embedding_model: Embedding model used by the managers.
+            stt_model: Speech-to-text model used by the audio manager.
+        """
+        self.session_id = session_id
+        self.imageManager = ImageFaissManager(embedding_model=embedding_model,session_id=session_id,index_path="image.index")
+        self.docManager = DocumentFaissManager(embedding_model=embedding_model,session_id=session_id,index_path="doc.index")
+        self.audioManager = AudioFaissManager(STT_MODEL=stt_model,embedding_model=embedding_model,session_id=session_id,index_path="audio.index")
+
+    def managers(self):
+        """Return all managers of the session."""
+        return [self.imageManager, self.docManager, self.audioManager]
+
+    def estimated_bytes(self) -> int:
+        """Estimate the resident memory used by the session's managers."""
+        return sum(manager.estimated_bytes() for manager in self.managers())
+
+    def flush(self):
+        """Write pending changes of every manager to disk."""
+        for manager in self.managers():
+            manager.flush()
+
+    def close(self):
+        """Flush and release every manager."""
+        for manager in self.managers():
+            manager.close()
+
+class SessionCache:
+    """
+    Bounded LRU cache of loaded SessionManagers, so switching back to a recently
+    used session does not reload its indexes and metadata from disk.
+
+    Sessions are evicted least recently used first once more than `max_sessions`
+    are loaded, or once their estimated resident size exceeds `max_bytes`, and their
+    managers are closed. The most recently used session and sessions pinned by running
+    work (see `acquire`) are never evicted, so a session is only ever loaded once.
+    """
+    def __init__(self, loader, max_sessions: int = config.SESSION_CACHE_SIZE, max_bytes: int = config.SESSION_CACHE_MAX_MB * 1024 * 1024):
+        """
+        Args:
+            loader (Callable[[str], SessionManagers]): Loads the managers of a session.
+            max_sessions (int): Maximum number of cached sessions.
+            max_bytes (int): Maximum estimated resident bytes, 0 to disable.
+        """
+        self.loader = loader
+        self.max_sessions = max(1, max_sessions)
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+        self._sessions: "OrderedDict[str, SessionManagers]" = OrderedDict()
+        # Number of users per pinned session
+        self._pins = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id: str) -> SessionManagers:
+        """Return the managers of a session, loading them on a cache miss."""
+        with self.lock:
+            if session_id in self._sessions:
+                self._sessions.move_to_end(session_id)
+                self.hits += 1
+                return self._sessions[session_id]
+            self.misses += 1
+            managers = self.loader(session_id)
+            self._sessions[session_id] = managers
+            self._evict()
+            return managers
+
+    def acquire(self, session_id: str) -> SessionManagers:
+        """
+        Return the managers of a session and pin it, so it is not evicted until `release` is called
+        as many times. Every piece of work that holds on to managers (ingestion, the active session)
+        must pin them.
+        """
+        with self.lock:
+            managers = self.get(session_id)
+            self._pins[session_id] = self._pins.get(session_id, 0) + 1
+            return managers
+
+    def release(self, session_id: str):
+        """Unpin a session pinned with `acquire`, evicting sessions that no longer fit."""
+        with self.lock:
+            count = self._pins.get(session_id, 0) - 1
+            if count > 0:
+                self._pins[session_id] = count
+            else:
+                self._pins.pop(session_id, None)
+            self._evict()
+
+    @contextmanager
+    def pinned(self, session_id: str):
+        """Pin a session for the duration of the block and yield its managers."""
+        managers = self.acquire(session_id)
+        try:
+            yield managers
+        finally:
+            self.release(session_id)
+
+    def _evict(self):
+        """Evict and close least recently used unpinned sessions until the cache is within its bounds."""
+        while len(self._sessions) > 1:
+            over_count = len(self._sessions) > self.max_sessions
+            over_bytes = self.max_bytes > 0 and self.estimated_bytes() > self.max_bytes
+            if not (over_count or over_bytes):
+                break
+            candidates = [session_id for session_id in list(self._sessions)[:-1] if not self._pins.get(session_id)]
+            if not candidates:
+                break
+            session_id = candidates[0]
+            self._sessions.pop(session_id).close()
+            self.evictions += 1
+            print(f"Evicted session from cache : {session_id}")
+
+    def discard(self, session_id: str):
+        """Close and drop a session and every session nested under it."""
+        with self.lock:
+            for cached_id in list(self._sessions):
+                if is_nested_session(cached_id, session_id):
+                    self._sessions.pop(cached_id).close()
+
+    def estimated_bytes(self) -> int:
+        """Estimate the resident memory used by all cached sessions."""
+        with self.lock:
+            return sum(managers.estimated_bytes() for managers in self._sessions.values())
+
+    def stats(self) -> dict:
+        """Return cache counters and the currently cached sessions."""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "sessions": list(self._sessions),
+                "pinned": dict(self._pins),
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "estimated_bytes": self.estimated_bytes(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -1,213 +1,199 @@
-import os
 import sys
-import whisper
-import urllib.request
-import zipfile
-import platform
 import subprocess
 from pathlib import Path
-import shutil
-import tempfile
+import importlib.util
+import time
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Iterable, Iterator, List
 import numpy as np
+from modules import config
+from modules.AudioModules import AUDIO_DECODER,AudioDecoder,SAMPLE_RATE
+from modules.ModelModules import register_model
+from modules.ResultCacheModules import get_result_cache,package_version
+from modules.HashModules import hash_file,hash_key
+
+WHISPER_SAMPLE_RATE = SAMPLE_RATE
+
+def format_timestamp(seconds: float) -> str:
+    """Format a time in a recording as "M:SS", or "H:MM:SS" from one hour on."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+class SpeechWindow:
+    """
+    Speech from a recording with the long silences removed, short enough for one Whisper pass.
+
+    Attributes:
+        audio (np.ndarray): float32 mono samples at `sample_rate`.
+        positions (np.ndarray): Index in the recording of each frame of `audio`.
+        frame_size (int): Samples per frame.
+        sample_rate (int): Sample rate of the audio.
+    """
+    def __init__(self, frames: List[np.ndarray], positions: List[int], frame_size: int, sample_rate: int = WHISPER_SAMPLE_RATE):
+        self.audio = np.concatenate(frames)
+        self.positions = np.asarray(positions)
+        self.frame_size = frame_size
+        self.sample_rate = sample_rate
+
+    @property
+    def frame_seconds(self) -> float:
+        return self.frame_size / self.sample_rate
+
+    @property
+    def start(self) -> float:
+        """Start of the window in the recording, in seconds."""
+        return float(self.positions[0] * self.frame_seconds)
+
+    @property
+    def end(self) -> float:
+        """End of the window in the recording, in seconds."""
+        return float((self.positions[-1] + 1) * self.frame_seconds)
+
+    def to_absolute(self, seconds: float) -> float:
+        """Map a time in the window audio, e.g. a Whisper segment boundary, to a time in the recording."""
+        index = min(max(int(seconds / self.frame_seconds), 0), len(self.positions) - 1)
+        return float(self.positions[index] * self.frame_seconds + seconds - index * self.frame_seconds)
+
+def speech_windows(blocks: Iterable[np.ndarray], sample_rate: int = WHISPER_SAMPLE_RATE, window_seconds: float = config.AUDIO_STREAM_WINDOW_S,
+                   threshold_db: float = config.AUDIO_VAD_THRESHOLD_DB, min_silence_seconds: float = config.AUDIO_VAD_MIN_SILENCE_S,
+                   frame_seconds: float = 0.03, padding_seconds: float = 0.2) -> Iterator[SpeechWindow]:
+    """
+    Split a stream of audio into speech windows with an energy voice activity detector.
+
+    The audio is cut into frames and a frame whose RMS level is above `threshold_db` dBFS
+    is speech. Pauses shorter than `min_silence_seconds` are kept, longer silences are
+    dropped except for `padding_seconds` on each side of the speech. The remaining frames
+    are packed into windows of at most `window_seconds`, cut at the last pause when
+    possible so words are not split.
+
+    Args:
+        blocks (Iterable[np.ndarray]): float32 mono blocks at `sample_rate`.
+        sample_rate (int): Sample rate of the audio.
+        window_seconds (float): Maximum length of a window. Whisper works on 30 second windows.
+        threshold_db (float): Level separating speech from silence. None treats all audio as speech.
+        min_silence_seconds (float): Shortest silence that is dropped.
+        frame_seconds (float): Length of the frames the level is measured on.
+        padding_seconds (float): Silence kept around speech.
+
+    Yields:
+        SpeechWindow: Windows in recording order. Windows without speech are not produced.
+    """
+    frame_size = int(sample_rate * frame_seconds)
+    max_frames = max(1, int(window_seconds / frame_seconds))
+    silence_frames = max(1, int(min_silence_seconds / frame_seconds))
+    padding = int(padding_seconds / frame_seconds)
+    frames, positions = [], []
+    # Length of the window up to its last silent frame, where it is best cut
+    last_pause = 0
+    # (position, frame) of the current silence: its first frames, and the padding before the next speech
+    pause, pause_tail, pause_length = [], deque(maxlen=padding), 0
+
+    def cut(final=False):
+        nonlocal frames, positions, last_pause
+        split = last_pause if not final and last_pause > max_frames // 2 else len(frames)
+        window = SpeechWindow(frames[:split], positions[:split], frame_size, sample_rate)
+        frames, positions = frames[split:], positions[split:]
+        last_pause = 0
+        return window
+
+    def keep(items, silent):
+        nonlocal last_pause
+        for position, frame in items:
+            frames.append(frame)
+            positions.append(position)
+            if silent:
+                last_pause = len(frames)
+            if len(frames) >= max_frames:
+                yield cut()
+
+    position = 0
+    carry = np.zeros(0, dtype=np.float32)
+    for block in chain(blocks, [None]):
+        if block is not None:
+            data = np.concatenate([carry, block]) if len(carry) else block
+        elif len(carry):
+            # Pad the last partial frame with silence
+            data = np.concatenate([carry, np.zeros(frame_size - len(carry), dtype=np.float32)])
+        else:
+            break
+        count = len(data) // frame_size
+        carry = data[count * frame_size:]
+        chunk = data[:count * frame_size].reshape(count, frame_size)
+        levels = 10 * np.log10(np.mean(np.square(chunk, dtype=np.float64), axis=1) + 1e-10)
+        for frame, level in zip(chunk, levels):
+            if threshold_db is None or level > threshold_db:
+                if pause_length:
+                    yield from keep(pause if pause_length <= silence_frames else list(pause_tail), True)
+                    pause, pause_length = [], 0
+                    pause_tail.clear()
+                yield from keep([(position, frame)], False)
+            else:
+                pause_length += 1
+                if pause_length <= silence_frames:
+                    pause.append((position, frame))
+                else:
+                    if pause_length == silence_frames + 1 and frames:
+                        # A long silence: keep the padding after the speech and drop the rest
+                        yield from keep(pause[:padding], True)
+                    pause_tail.append((position, frame))
+            position += 1
+    if frames and pause_length <= silence_frames:
+        yield from keep(pause[:padding], True)
+    if frames:
+        yield cut(final=True)
 
 class WhisperNoFFmpeg:
-    def __init__(self, model_name="base", verbose=True):
+    def __init__(self, model_name="base", verbose=True, decoder: AudioDecoder = None):
         self.model_name = model_name
         self.verbose = verbose
+        # Audio decoding backends are picked once per process, see AudioModules
+        self.decoder = decoder or AUDIO_DECODER
         
-        # Load the Whisper model
-        if self.verbose:
-            print(f"Loading Whisper model '{model_name}'...")
-        self.model = whisper.load_model(model_name)
-        if self.verbose:
-            print(f"Model loaded successfully!")
+        # The Whisper model is loaded on first transcription (or by the startup warm-up)
+        self.model = register_model("whisper", self._load_model)
+        # The model and its copies used by transcribe_stream, see _replicas
+        self.replicas = [self.model]
+
+    def _load_model(self):
+        """Load the Whisper model. Importing whisper pulls in torch, so it is done here rather than at import time."""
+        import whisper
+        self._log(f"Loading Whisper model '{self.model_name}'...")
+        model = whisper.load_model(self.model_name)
+        self._log("Model loaded successfully!")
+        return model
     
     def _log(self, message):
         """Print message if verbose mode is enabled."""
         if self.verbose:
             print(message)
             
-    def _load_audio_direct(self, file_path):
-        """
-        Load an audio file directly, bypassing Whisper's FFmpeg dependency.
-        Uses Python libraries to read common audio formats.
-        
-        This doesn't support as many formats as FFmpeg but works for common ones.
-        """
-        self._log(f"Loading audio directly: {file_path}")
-        
-        try:
-            # Try using soundfile first (good for WAV files)
-            import soundfile as sf
-            audio, sr = sf.read(file_path)
-            
-            # Convert to mono if needed
-            if len(audio.shape) > 1 and audio.shape[1] > 1:
-                audio = audio.mean(axis=1)
-                
-            # Resample to 16kHz if needed
-            if sr != 16000:
-                self._log(f"Resampling from {sr}Hz to 16000Hz")
-                try:
-                    from librosa import resample
-                    audio = resample(y=audio, orig_sr=sr, target_sr=16000)
-                except ImportError:
-                    # Simple resampling if librosa not available
-                    import scipy.signal
-                    audio = scipy.signal.resample_poly(audio, 16000, sr)
-            
-            # Get audio into the right type and shape
-            audio = audio.astype(np.float32)
-            
-            self._log("Audio loaded successfully via soundfile")
-            return audio
-            
-        except ImportError:
-            self._log("soundfile not available, trying librosa...")
-            
-        try:
-            # Fallback to librosa (handles more formats but has more dependencies)
-            import librosa
-            audio, sr = librosa.load(file_path, sr=16000, mono=True)
-            self._log("Audio loaded successfully via librosa")
-            return audio
-            
-        except ImportError:
-            self._log("librosa not available, trying pydub...")
-            
-        try:
-            # Fallback to pydub (requires ffmpeg but handles it differently)
-            from pydub import AudioSegment
-            import numpy as np
-            
-            self._log("Loading with pydub...")
-            audio = AudioSegment.from_file(file_path)
-            
-            # Convert to mono if needed
-            if audio.channels > 1:
-                audio = audio.set_channels(1)
-                
-            # Convert to 16kHz
-            if audio.frame_rate != 16000:
-                audio = audio.set_frame_rate(16000)
-                
-            # Convert to numpy array
-            samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
-            samples = samples / (1 << (8 * audio.sample_width - 1))  # Convert to float32
-            
-            self._log("Audio loaded successfully via pydub")
-            return samples
-            
-        except ImportError:
-            raise ImportError("Could not find any suitable audio loading library. Please install either soundfile, librosa, or pydub.")
-        except Exception as e:
-            raise RuntimeError(f"Failed to load audio file: {str(e)}")
-    
     def _prepare_audio(self, file_path):
-        """Load audio, convert to correct format/sample rate and return as a numpy array."""
-        try:
-            # Try loading audio directly with available libraries
-            audio = self._load_audio_direct(file_path)
-            return audio
-        except Exception as e:
-            self._log(f"Direct audio loading failed: {str(e)}")
-            
-            # If direct loading failed, try using the embedded FFmpeg helper
-            self._log("Attempting to use embedded FFmpeg helper...")
-            return self._convert_audio_with_embedded_ffmpeg(file_path)
-            
-    def _convert_audio_with_embedded_ffmpeg(self, file_path):
-        """A fallback method that uses embedded FFmpeg when other methods fail."""
-        
-        # First make sure FFmpeg is available
-        ffmpeg_path = self._get_ffmpeg_path()
-        if not ffmpeg_path:
-            raise RuntimeError("Could not find or set up FFmpeg")
-        
-        # Convert to WAV format for compatibility
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            temp_wav = temp_file.name
-        
-        self._log(f"Converting {file_path} to temporary WAV: {temp_wav}")
-        
-        try:
-            # Run FFmpeg to convert the file to WAV
-            cmd = [
-                ffmpeg_path,
-                '-i', file_path,
-                '-ar', '16000',  # 16kHz sample rate
-                '-ac', '1',      # Mono
-                '-c:a', 'pcm_s16le',  # 16-bit PCM
-                '-y',            # Overwrite without asking
-                temp_wav
-            ]
-            
-            subprocess.run(cmd, check=True, capture_output=True)
-            
-            # Load the WAV file
-            import soundfile as sf
-            audio, sr = sf.read(temp_wav)
-            
-            # Clean up
-            os.unlink(temp_wav)
-            
-            # Convert to float32
-            if audio.dtype != np.float32:
-                audio = audio.astype(np.float32)
-                
-            # Normalize if int16
-            if np.max(np.abs(audio)) > 1.0:
-                audio = audio / 32768.0
-                
-            return audio
-            
-        except Exception as e:
-            # Clean up temp file if it exists
-            if os.path.exists(temp_wav):
-                os.unlink(temp_wav)
-            raise RuntimeError(f"Failed to convert audio with FFmpeg: {str(e)}")
-    
-    def _get_ffmpeg_path(self):
-        """Helper function to find or download FFmpeg if needed."""
-        # Try to find system FFmpeg first
-        ffmpeg_path = self._find_system_ffmpeg()
-        if ffmpeg_path:
-            return ffmpeg_path
-            
-        # If no system FFmpeg, set up our own
-        ffmpeg_setup = FFmpegSetup(verbose=self.verbose)
-        return ffmpeg_setup.get_ffmpeg_path()
-        
-    def _find_system_ffmpeg(self):
-        """Try to find system FFmpeg executable."""
-        try:
-            if platform.system().lower() == "windows":
-                # On Windows, use where command
-                result = subprocess.run(["where", "ffmpeg"], 
-                                       capture_output=True, 
-                                       text=True, 
-                                       check=False)
-                if result.returncode == 0:
-                    return result.stdout.strip().split('\n')[0]
-            else:
-                # On Unix-like systems, use which command
-                result = subprocess.run(["which", "ffmpeg"], 
-                                       capture_output=True, 
-                                       text=True, 
-                                       check=False)
-                if result.returncode == 0:
-                    return result.stdout.strip()
-                    
-            return None
-        except Exception:
-            return None
+        """Load audio as a 16kHz mono float32 array, see AudioDecoder."""
+        self._log(f"Loading audio: {file_path}")
+        return self.decoder.load(file_path)
+
+    def _read_blocks(self, file_path, block_seconds=10):
+        """Read an audio file as 16kHz mono blocks, decoding one block at a time, see AudioDecoder."""
+        return self.decoder.iter_blocks(file_path, block_seconds)
             
-    def transcribe(self, audio_path, **options):
+    def cache_model_id(self, **options):
+        """Result cache identifier of this model with the given transcribe options."""
+        return f"whisper-{self.model_name}:openai-whisper-{package_version('openai-whisper')}:{hash_key(options)}"
+
+    def transcribe(self, audio_path, file_hash=None, **options):
         """
         Transcribe audio file using Whisper model.
         
+        Results (text, segments and language) are kept in the machine-wide result cache, so a
+        file with the same content is only transcribed once per model and options.
+
         Args:
             audio_path (str): Path to the audio file
+            file_hash (str, optional): SHA-256 of the file, computed when not given
             **options: Additional options to pass to Whisper's transcribe function
             
         Returns:
@@ -220,6 +206,14 @@ class WhisperNoFFmpeg:
         
         # Use absolute path
         audio_path = str(audio_path_obj.absolute())
+        model_id = self.cache_model_id(**options)
+        cache = get_result_cache()
+        if cache is not None:
+            file_hash = file_hash or hash_file(audio_path)
+            cached = cache.get(file_hash, "transcribe", model_id)
+            if cached is not None:
+                self._log(f"Using cached transcription of: {audio_path}")
+                return cached
         self._log(f"Transcribing audio file: {audio_path}")
         
         try:
@@ -228,8 +222,11 @@ class WhisperNoFFmpeg:
             
             # Call Whisper's transcribe function with the prepared audio
             self._log("Starting transcription...")
-            result = self.model.transcribe(audio_data, **options)
+            with self.model.use() as model:
+                result = model.transcribe(audio_data, **options)
             self._log("Transcription completed successfully")
+            if cache is not None:
+                cache.put(file_hash, "transcribe", model_id, result)
             
             return result
             
@@ -237,244 +234,102 @@ class WhisperNoFFmpeg:
             self._log(f"Transcription failed: {str(e)}")
             raise
 
+    def _replicas(self, count):
+        """
+        The Whisper model and `count - 1` copies of it, each loaded on first use.
 
-class FFmpegSetup:
-    """Helper class to download and set up FFmpeg if needed."""
-    
-    def __init__(self, verbose=True):
-        self.verbose = verbose
-        self.ffmpeg_dir = self._get_ffmpeg_dir()
-        self.ffmpeg_path = None
-        self._setup_ffmpeg()
-        
-    def _log(self, message):
-        """Print message if verbose mode is enabled."""
-        if self.verbose:
-            print(message)
-            
-    def _get_ffmpeg_dir(self):
-        """Create a directory for storing FFmpeg binaries."""
-        # Create directory in user's home folder
-        home_dir = Path.home()
-        ffmpeg_dir = home_dir / ".embedded_ffmpeg"
-        
-        if not ffmpeg_dir.exists():
-            self._log(f"Creating FFmpeg directory at {ffmpeg_dir}")
-            ffmpeg_dir.mkdir(parents=True, exist_ok=True)
-            
-        return ffmpeg_dir
-        
-    def _setup_ffmpeg(self):
-        """Download and set up FFmpeg if not already available."""
-        # Check if FFmpeg already exists in our directory
-        if self._check_existing_ffmpeg():
-            self._log(f"Found existing FFmpeg installation at {self.ffmpeg_path}")
-            return
-            
-        # Determine which FFmpeg to download based on the platform
-        system = platform.system().lower()
-        
-        self._log(f"No existing FFmpeg found. Downloading for {system}...")
-        
-        try:
-            if system == "windows":
-                self._setup_ffmpeg_windows()
-            elif system == "darwin":  # macOS
-                self._setup_ffmpeg_macos()
-            elif system == "linux":
-                self._setup_ffmpeg_linux()
-            else:
-                raise RuntimeError(f"Unsupported operating system: {system}")
-                
-            # Verify FFmpeg works
-            if not self._verify_ffmpeg():
-                raise RuntimeError("FFmpeg installation failed verification")
-                
-        except Exception as e:
-            self._log(f"Error setting up FFmpeg: {str(e)}")
-            raise
-            
-    def _check_existing_ffmpeg(self):
-        """Check if FFmpeg is already in our directory."""
-        system = platform.system().lower()
-        
-        if system == "windows":
-            ffmpeg_exe = self.ffmpeg_dir / "ffmpeg.exe"
-            if ffmpeg_exe.exists():
-                self.ffmpeg_path = str(ffmpeg_exe)
-                return True
-        else:
-            ffmpeg_exe = self.ffmpeg_dir / "ffmpeg"
-            if ffmpeg_exe.exists() and os.access(str(ffmpeg_exe), os.X_OK):
-                self.ffmpeg_path = str(ffmpeg_exe)
-                return True
-        return False
-        
-    def _verify_ffmpeg(self):
-        """Verify FFmpeg works by running a simple command."""
-        try:
-            result = subprocess.run([self.ffmpeg_path, "-version"], 
-                                   capture_output=True, 
-                                   text=True, 
-                                   check=False)
-            if result.returncode == 0:
-                self._log("FFmpeg verification successful")
-                return True
-            else:
-                self._log(f"FFmpeg verification failed: {result.stderr}")
-                return False
-        except Exception as e:
-            self._log(f"FFmpeg verification error: {str(e)}")
-            return False
-            
-    def _setup_ffmpeg_windows(self):
-        """Download and set up FFmpeg for Windows."""
-        # URL for the latest FFmpeg build for Windows (static build)
-        url = "https://github.com/GyanD/codexffmpeg/releases/download/6.1.1/ffmpeg-6.1.1-essentials_build.zip"
-        
-        # Create a temporary directory for downloading
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_dir_path = Path(temp_dir)
-            zip_path = temp_dir_path / "ffmpeg.zip"
-            
-            # Download FFmpeg
-            self._log("Downloading FFmpeg for Windows...")
-            try:
-                urllib.request.urlretrieve(url, zip_path)
-            except Exception as e:
-                raise RuntimeError(f"Failed to download FFmpeg: {str(e)}")
-            
-            # Extract FFmpeg
-            self._log("Extracting FFmpeg...")
-            try:
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(temp_dir_path)
-            except Exception as e:
-                raise RuntimeError(f"Failed to extract FFmpeg: {str(e)}")
-            
-            # Find the extracted FFmpeg executable
-            ffmpeg_exes = list(temp_dir_path.glob("**/ffmpeg.exe"))
-            if not ffmpeg_exes:
-                raise RuntimeError("Failed to find FFmpeg executable after extraction")
-                
-            ffmpeg_exe = ffmpeg_exes[0]
-            
-            # Copy FFmpeg to our directory
-            dest_path = self.ffmpeg_dir / "ffmpeg.exe"
-            self._log(f"Copying FFmpeg to {dest_path}")
-            shutil.copy(ffmpeg_exe, dest_path)
-            self.ffmpeg_path = str(dest_path)
-            
-    def _setup_ffmpeg_macos(self):
-        """Download and set up FFmpeg for macOS."""
-        # URL for the latest FFmpeg build for macOS
-        url = "https://evermeet.cx/ffmpeg/getrelease/ffmpeg/zip"
-        
-        # Create a temporary directory for downloading
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_dir_path = Path(temp_dir)
-            zip_path = temp_dir_path / "ffmpeg.zip"
-            
-            # Download FFmpeg
-            self._log("Downloading FFmpeg for macOS...")
-            try:
-                urllib.request.urlretrieve(url, zip_path)
-            except Exception as e:
-                raise RuntimeError(f"Failed to download FFmpeg: {str(e)}")
-            
-            # Extract FFmpeg
-            self._log("Extracting FFmpeg...")
-            try:
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(temp_dir_path)
-            except Exception as e:
-                raise RuntimeError(f"Failed to extract FFmpeg: {str(e)}")
-            
-            ffmpeg_exe = temp_dir_path / "ffmpeg"
-            
-            if not ffmpeg_exe.exists():
-                # Try to find ffmpeg directly
-                ffmpeg_exes = list(temp_dir_path.glob("**/ffmpeg"))
-                if not ffmpeg_exes:
-                    raise RuntimeError("Failed to find FFmpeg executable after extraction")
-                ffmpeg_exe = ffmpeg_exes[0]
-            
-            # Copy FFmpeg to our directory
-            dest_path = self.ffmpeg_dir / "ffmpeg"
-            self._log(f"Copying FFmpeg to {dest_path}")
-            shutil.copy(ffmpeg_exe, dest_path)
-            
-            # Make it executable
-            os.chmod(dest_path, 0o755)
-            self.ffmpeg_path = str(dest_path)
-            
-    def _setup_ffmpeg_linux(self):
-        """Download and set up FFmpeg for Linux."""
-        # For Linux, we'll use a static build
-        url = "https://johnvansickle.com/ffmpeg/releases/ffmpeg-release-amd64-static.tar.xz"
-        
-        # Create a temporary directory for downloading
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_dir_path = Path(temp_dir)
-            tar_path = temp_dir_path / "ffmpeg.tar.xz"
-            
-            # Download FFmpeg
-            self._log("Downloading FFmpeg for Linux...")
+        Whisper keeps its decoding cache in hooks on the model, so one model cannot transcribe
+        on several threads at once.
+        """
+        while len(self.replicas) < count:
+            self.replicas.append(register_model(f"whisper-{len(self.replicas)}", self._load_model, size_bytes=self.model.size_bytes,
+                                                idle_ttl=config.MODEL_IDLE_TTL.get("whisper")))
+        return self.replicas[:count]
+
+    def transcribe_stream(self, audio_path, file_hash=None, window_seconds=None, workers=None, **options):
+        """
+        Transcribe an audio file window by window, yielding each window as soon as it is transcribed.
+
+        The file is read in blocks, silences are dropped and the speech is packed into windows
+        by `speech_windows`, and the windows are transcribed by `workers` copies of the model.
+        Only the windows being transcribed are held in memory. A fully transcribed file is kept
+        in the result cache.
+
+        Args:
+            audio_path (str): Path to the audio file
+            file_hash (str, optional): SHA-256 of the file, computed when not given
+            window_seconds (float, optional): Maximum window length. Defaults to config.AUDIO_STREAM_WINDOW_S.
+            workers (int, optional): Windows transcribed in parallel. Defaults to config.AUDIO_STREAM_WORKERS.
+            **options: Additional options to pass to Whisper's transcribe function
+
+        Yields:
+            dict: "start", "end", "text", "language" and "segments" of each window with text, in
+                recording order. Times are seconds from the start of the recording, including
+                those of the Whisper segments.
+        """
+        audio_path_obj = Path(audio_path)
+        if not audio_path_obj.exists():
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+        audio_path = str(audio_path_obj.absolute())
+        window_seconds = window_seconds or config.AUDIO_STREAM_WINDOW_S
+        workers = max(1, workers or config.AUDIO_STREAM_WORKERS)
+        # The windowing changes what the model hears, so it is part of the identifier
+        model_id = f"{self.cache_model_id(**options)}:stream:{hash_key({'window': window_seconds, 'vad_db': config.AUDIO_VAD_THRESHOLD_DB, 'silence': config.AUDIO_VAD_MIN_SILENCE_S})}"
+        cache = get_result_cache()
+        if cache is not None:
+            file_hash = file_hash or hash_file(audio_path)
+            cached = cache.get(file_hash, "transcribe_stream", model_id)
+            if cached is not None:
+                self._log(f"Using cached transcription of: {audio_path}")
+                yield from cached
+                return
+        self._log(f"Transcribing audio file in windows of {window_seconds}s with {workers} worker(s): {audio_path}")
+        replicas = queue.Queue()
+        for replica in self._replicas(workers):
+            replicas.put(replica)
+
+        def run(window):
+            replica = replicas.get()
             try:
-                urllib.request.urlretrieve(url, tar_path)
-            except Exception as e:
-                raise RuntimeError(f"Failed to download FFmpeg: {str(e)}")
-            
-            # Extract FFmpeg
-            self._log("Extracting FFmpeg...")
+                with replica.use() as model:
+                    result = model.transcribe(window.audio, **options)
+            finally:
+                replicas.put(replica)
+            segments = [{"start": window.to_absolute(segment["start"]), "end": window.to_absolute(segment["end"]), "text": segment["text"].strip()}
+                        for segment in result.get("segments", [])]
+            return {"start": window.start, "end": window.end, "text": result["text"].strip(), "language": result.get("language"), "segments": segments}
+
+        start = time.perf_counter()
+        windows = speech_windows(self._read_blocks(audio_path), window_seconds=window_seconds)
+        results = []
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="whisper") as pool:
             try:
-                # First try using Python's shutil
-                shutil.unpack_archive(str(tar_path), str(temp_dir_path))
-            except Exception:
-                # If that fails, try using the tar command
-                try:
-                    subprocess.run(["tar", "-xf", str(tar_path), "-C", str(temp_dir_path)], 
-                                  check=True, 
-                                  stdout=subprocess.PIPE, 
-                                  stderr=subprocess.PIPE)
-                except Exception as e:
-                    raise RuntimeError(f"Failed to extract FFmpeg: {str(e)}")
-            
-            # Find the extracted FFmpeg executable
-            ffmpeg_exes = list(temp_dir_path.glob("**/ffmpeg"))
-            if not ffmpeg_exes:
-                raise RuntimeError("Failed to find FFmpeg executable after extraction")
-                
-            ffmpeg_exe = ffmpeg_exes[0]
-            
-            # Copy FFmpeg to our directory
-            dest_path = self.ffmpeg_dir / "ffmpeg"
-            self._log(f"Copying FFmpeg to {dest_path}")
-            shutil.copy(ffmpeg_exe, dest_path)
-            
-            # Make it executable
-            os.chmod(dest_path, 0o755)
-            self.ffmpeg_path = str(dest_path)
-            
-    def get_ffmpeg_path(self):
-        """Return the path to the installed FFmpeg."""
-        return self.ffmpeg_path
+                for window in chain(windows, [None]):
+                    if window is not None:
+                        pending.append(pool.submit(run, window))
+                    # Read ahead one window per worker, and hand finished windows out in order
+                    while pending and (window is None or len(pending) > workers or pending[0].done()):
+                        result = pending.popleft().result()
+                        if result["text"]:
+                            results.append(result)
+                            yield result
+            finally:
+                windows.close()
+                for future in pending:
+                    future.cancel()
+        self._log(f"Transcription completed: {len(results)} windows in {time.perf_counter() - start:.1f}s")
+        if cache is not None:
+            cache.put(file_hash, "transcribe_stream", model_id, results)
 
 
 # Helper function to install required dependencies
 def install_required_packages():
     """Install required packages if they're not already installed."""
-    try:
-        # Try importing each package to check if it's installed
-        import soundfile
-        print("soundfile is already installed")
-    except ImportError:
-        print("Installing soundfile...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "soundfile"])
-    
-    try:
-        import numpy
-        print("numpy is already installed")
-    except ImportError:
-        print("Installing numpy...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "numpy"])
\ No newline at end of file
+    # find_spec only looks the package up, it does not import it
+    for package in ("soundfile", "numpy"):
+        if importlib.util.find_spec(package) is not None:
+            print(f"{package} is already installed")
+        else:
+            print(f"Installing {package}...")
+            subprocess.check_call([sys.executable, "-m", "pip", "install", package])
\ No newline at end of file
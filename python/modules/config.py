@@ -5,6 +5,7 @@ DEFAULT_CONFIG = {
     "CONTEXT_LIMIT":8192,
     "TOKEN_LIMIT":8192,
     "CHUNK_SIZE":512,
+    "CHUNK_OVERLAP":200,
     "MODEL_PATH":"./models/DeepseekR1.gguf",
     "INDEX_BASE_FOLDER":"./index",
     "SCHEDULE_BASE_FOLDER":"./userdata",
@@ -12,8 +13,57 @@ DEFAULT_CONFIG = {
     "FAISS_NLIST":100,
     "N_GPU_LAYERS":0,
     "UPLOAD_FOLDER":"./temp",
-    "STT_MODEL":"tiny"
-    
+    "STT_MODEL":"tiny",
+    "EMBEDDING_BATCH_SIZE":64,
+    "METADATA_BACKEND":"sqlite",
+    "SESSION_CACHE_SIZE":4,
+    "SESSION_CACHE_MAX_MB":0,
+    "INGESTION_WORKERS":1,
+    "INGESTION_JOB_HISTORY":100,
+    "INGESTION_WAIT_TIMEOUT":300,
+    "PDF_WORKERS":0,
+    "PDF_PAGES_PER_TASK":16,
+    "PDF_PARALLEL_MIN_PAGES":32,
+    "EMBEDDING_CACHE":True,
+    "EMBEDDING_CACHE_FOLDER":"embedding_cache",
+    "EMBEDDING_CACHE_MAX_ENTRIES":200000,
+    "EMBEDDING_CACHE_DTYPE":"float16",
+    "SEARCH_EXACT_MAX_IDS":4096,
+    "FAISS_INDEX_TYPE":"auto",
+    "FAISS_INDEX_STORAGE":"flat",
+    "FAISS_INDEX_OVERRIDES":{},
+    "FAISS_AUTO_FLAT_MAX":5000,
+    "FAISS_AUTO_IVF_MIN":200000,
+    "FAISS_HNSW_M":32,
+    "FAISS_HNSW_EF_CONSTRUCTION":40,
+    "FAISS_HNSW_EF_SEARCH":64,
+    "FAISS_NPROBE":8,
+    "FAISS_PQ_M":16,
+    "FAISS_PQ_BITS":8,
+    "WARMUP_MODELS":["embedding","llm"],
+    "MODEL_MEMORY_BUDGET_MB":0,
+    "MODEL_MEMORY_MB":{"embedding":100,"ocr":600,"yolo":100,"whisper":300},
+    "MODEL_IDLE_TTL":{"ocr":600,"yolo":600,"whisper":600},
+    "MODEL_REAPER_INTERVAL":30,
+    "LLM_PROMPT_CACHE":"ram",
+    "LLM_PROMPT_CACHE_MB":512,
+    "LLM_PROMPT_CACHE_FOLDER":"prompt_cache",
+    "CONTEXT_RETRIEVAL_TOKENS":3072,
+    "CONTEXT_MIN_GENERATION_TOKENS":1024,
+    "CONTEXT_TOKEN_CACHE_SIZE":4096,
+    "INFERENCE_QUEUE_SIZE":8,
+    "INFERENCE_AGING_TOKENS_PER_S":100,
+    "IMAGE_BATCH_SIZE":8,
+    "IMAGE_DECODE_WORKERS":4,
+    "IMAGE_MAX_SIDE":1600,
+    "RESULT_CACHE":True,
+    "RESULT_CACHE_PATH":"~/.intellecta/result_cache.db",
+    "RESULT_CACHE_MAX_MB":256,
+    "AUDIO_STREAM_WINDOW_S":30,
+    "AUDIO_STREAM_WORKERS":1,
+    "AUDIO_VAD_THRESHOLD_DB":-45,
+    "AUDIO_VAD_MIN_SILENCE_S":0.5,
+    "AUDIO_INDEX_INTERVAL_S":30
 }
 
 CONFIG_FILE = "config.json"
@@ -49,6 +99,7 @@ os.makedirs(CONFIG["INDEX_BASE_FOLDER"], exist_ok=True)
 CONTEXT_LIMIT = CONFIG["CONTEXT_LIMIT"]
 TOKEN_LIMIT = CONFIG["TOKEN_LIMIT"]
 CHUNK_SIZE = CONFIG["CHUNK_SIZE"]
+CHUNK_OVERLAP = CONFIG["CHUNK_OVERLAP"]
 MODEL_PATH = CONFIG["MODEL_PATH"]
 INDEX_BASE_FOLDER = CONFIG["INDEX_BASE_FOLDER"]
 SCHEDULE_BASE_FOLDER = CONFIG["SCHEDULE_BASE_FOLDER"]
@@ -56,4 +107,54 @@ FAISS_DIM = CONFIG["FAISS_DIM"]
 FAISS_NLIST = CONFIG["FAISS_NLIST"]
 N_GPU_LAYERS = CONFIG["N_GPU_LAYERS"]
 UPLOAD_FOLDER = CONFIG["UPLOAD_FOLDER"]
-STT_MODEL = CONFIG["STT_MODEL"]
\ No newline at end of file
+STT_MODEL = CONFIG["STT_MODEL"]
+EMBEDDING_BATCH_SIZE = CONFIG["EMBEDDING_BATCH_SIZE"]
+METADATA_BACKEND = CONFIG["METADATA_BACKEND"]
+SESSION_CACHE_SIZE = CONFIG["SESSION_CACHE_SIZE"]
+SESSION_CACHE_MAX_MB = CONFIG["SESSION_CACHE_MAX_MB"]
+INGESTION_WORKERS = CONFIG["INGESTION_WORKERS"]
+INGESTION_JOB_HISTORY = CONFIG["INGESTION_JOB_HISTORY"]
+INGESTION_WAIT_TIMEOUT = CONFIG["INGESTION_WAIT_TIMEOUT"]
+PDF_WORKERS = CONFIG["PDF_WORKERS"]
+PDF_PAGES_PER_TASK = CONFIG["PDF_PAGES_PER_TASK"]
+PDF_PARALLEL_MIN_PAGES = CONFIG["PDF_PARALLEL_MIN_PAGES"]
+EMBEDDING_CACHE = CONFIG["EMBEDDING_CACHE"]
+EMBEDDING_CACHE_FOLDER = CONFIG["EMBEDDING_CACHE_FOLDER"]
+EMBEDDING_CACHE_MAX_ENTRIES = CONFIG["EMBEDDING_CACHE_MAX_ENTRIES"]
+EMBEDDING_CACHE_DTYPE = CONFIG["EMBEDDING_CACHE_DTYPE"]
+SEARCH_EXACT_MAX_IDS = CONFIG["SEARCH_EXACT_MAX_IDS"]
+FAISS_INDEX_TYPE = CONFIG["FAISS_INDEX_TYPE"]
+FAISS_INDEX_STORAGE = CONFIG["FAISS_INDEX_STORAGE"]
+FAISS_INDEX_OVERRIDES = CONFIG["FAISS_INDEX_OVERRIDES"]
+FAISS_AUTO_FLAT_MAX = CONFIG["FAISS_AUTO_FLAT_MAX"]
+FAISS_AUTO_IVF_MIN = CONFIG["FAISS_AUTO_IVF_MIN"]
+FAISS_HNSW_M = CONFIG["FAISS_HNSW_M"]
+FAISS_HNSW_EF_CONSTRUCTION = CONFIG["FAISS_HNSW_EF_CONSTRUCTION"]
+FAISS_HNSW_EF_SEARCH = CONFIG["FAISS_HNSW_EF_SEARCH"]
+FAISS_NPROBE = CONFIG["FAISS_NPROBE"]
+FAISS_PQ_M = CONFIG["FAISS_PQ_M"]
+FAISS_PQ_BITS = CONFIG["FAISS_PQ_BITS"]
+WARMUP_MODELS = CONFIG["WARMUP_MODELS"]
+MODEL_MEMORY_BUDGET_MB = CONFIG["MODEL_MEMORY_BUDGET_MB"]
+MODEL_MEMORY_MB = CONFIG["MODEL_MEMORY_MB"]
+MODEL_IDLE_TTL = CONFIG["MODEL_IDLE_TTL"]
+MODEL_REAPER_INTERVAL = CONFIG["MODEL_REAPER_INTERVAL"]
+LLM_PROMPT_CACHE = CONFIG["LLM_PROMPT_CACHE"]
+LLM_PROMPT_CACHE_MB = CONFIG["LLM_PROMPT_CACHE_MB"]
+LLM_PROMPT_CACHE_FOLDER = CONFIG["LLM_PROMPT_CACHE_FOLDER"]
+CONTEXT_RETRIEVAL_TOKENS = CONFIG["CONTEXT_RETRIEVAL_TOKENS"]
+CONTEXT_MIN_GENERATION_TOKENS = CONFIG["CONTEXT_MIN_GENERATION_TOKENS"]
+CONTEXT_TOKEN_CACHE_SIZE = CONFIG["CONTEXT_TOKEN_CACHE_SIZE"]
+INFERENCE_QUEUE_SIZE = CONFIG["INFERENCE_QUEUE_SIZE"]
+INFERENCE_AGING_TOKENS_PER_S = CONFIG["INFERENCE_AGING_TOKENS_PER_S"]
+IMAGE_BATCH_SIZE = CONFIG["IMAGE_BATCH_SIZE"]
+IMAGE_DECODE_WORKERS = CONFIG["IMAGE_DECODE_WORKERS"]
+IMAGE_MAX_SIDE = CONFIG["IMAGE_MAX_SIDE"]
+RESULT_CACHE = CONFIG["RESULT_CACHE"]
+RESULT_CACHE_PATH = CONFIG["RESULT_CACHE_PATH"]
+RESULT_CACHE_MAX_MB = CONFIG["RESULT_CACHE_MAX_MB"]
+AUDIO_STREAM_WINDOW_S = CONFIG["AUDIO_STREAM_WINDOW_S"]
+AUDIO_STREAM_WORKERS = CONFIG["AUDIO_STREAM_WORKERS"]
+AUDIO_VAD_THRESHOLD_DB = CONFIG["AUDIO_VAD_THRESHOLD_DB"]
+AUDIO_VAD_MIN_SILENCE_S = CONFIG["AUDIO_VAD_MIN_SILENCE_S"]
+AUDIO_INDEX_INTERVAL_S = CONFIG["AUDIO_INDEX_INTERVAL_S"]
\ No newline at end of file
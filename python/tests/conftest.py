@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The modules create config.json, index/ and userdata/ in the working directory when imported,
+# so the tests run in a scratch folder instead of the source tree
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="intellecta-tests-"))
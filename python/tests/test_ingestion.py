@@ -0,0 +1,51 @@
+import asyncio
+import os
+import threading
+from modules.IngestionModules import IngestionQueue
+
+def test_job_records_failed_files_and_finishes(tmp_path):
+    good, bad = str(tmp_path / "good.txt"), str(tmp_path / "bad.txt")
+    processed = []
+
+    def process_file(file_paths, file_ids, session_id):
+        if file_paths[0] == bad:
+            raise ValueError("cannot parse")
+        processed.append((file_paths, file_ids, session_id))
+
+    queue = IngestionQueue(process_file, workers=1)
+    job = queue.submit("session", [good, bad], ["1", "2"], cleanup=False)
+
+    assert job.wait(5)
+    assert job.status == "done"
+    assert job.files_done == 2
+    assert job.errors == {bad: "cannot parse"}
+    assert processed == [([good], ["1"], "session")]
+    queue.shutdown()
+
+def test_job_fails_when_every_file_fails_and_removes_the_files(tmp_path):
+    path = tmp_path / "broken.txt"
+    path.write_text("x")
+
+    def process_file(file_paths, file_ids, session_id):
+        raise RuntimeError("model crashed")
+
+    queue = IngestionQueue(process_file, workers=1)
+    job = queue.submit("session", [str(path)], ["1"])
+
+    assert job.wait(5)
+    assert job.status == "failed"
+    assert not os.path.exists(path)
+    queue.shutdown()
+
+def test_wait_for_returns_jobs_unfinished_at_the_timeout():
+    release = threading.Event()
+    queue = IngestionQueue(lambda **kwargs: release.wait(5), workers=1)
+    job = queue.submit("session", ["a.txt"], ["1"], cleanup=False)
+
+    assert asyncio.run(queue.wait_for([job], timeout=0.05)) == [job]
+    assert queue.pending("session") == [job]
+
+    release.set()
+    assert asyncio.run(queue.wait_for([job], timeout=5)) == []
+    assert queue.pending() == []
+    queue.shutdown()
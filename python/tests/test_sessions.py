@@ -0,0 +1,49 @@
+from modules.SessionModules import SessionCache
+
+class FakeManagers:
+    """Stands in for a session's FAISS managers."""
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.closed = False
+
+    def estimated_bytes(self):
+        return 0
+
+    def close(self):
+        self.closed = True
+
+def test_pinned_session_is_not_evicted_until_released():
+    cache = SessionCache(FakeManagers, max_sessions=1, max_bytes=0)
+    pinned = cache.acquire("a")
+    evicted = cache.get("b")
+    cache.get("c")
+
+    assert cache.stats()["sessions"] == ["a", "c"]
+    assert evicted.closed
+    assert not pinned.closed
+
+    cache.release("a")
+    assert cache.stats()["sessions"] == ["c"]
+    assert pinned.closed
+
+def test_session_stays_pinned_while_any_user_holds_it():
+    cache = SessionCache(FakeManagers, max_sessions=1, max_bytes=0)
+    cache.acquire("a")
+    with cache.pinned("a") as managers:
+        cache.get("b")
+    cache.get("c")
+
+    assert "a" in cache.stats()["sessions"]
+    assert cache.stats()["pinned"] == {"a": 1}
+    assert not managers.closed
+
+def test_discard_closes_nested_sessions():
+    cache = SessionCache(FakeManagers, max_sessions=4, max_bytes=0)
+    topic = cache.get("user/course/topic")
+    other = cache.get("user/other")
+
+    cache.discard("user/course")
+
+    assert topic.closed
+    assert not other.closed
+    assert cache.stats()["sessions"] == ["user/other"]
@@ -0,0 +1,93 @@
+import os
+import threading
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+import main
+
+ACTIVE_SESSION = "user/course/active"
+OTHER_SESSION = "user/course/other"
+
+class RecordingQueue:
+    """Stands in for the IngestionQueue and records the submitted jobs."""
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, session_id, file_paths, file_ids, cleanup=True):
+        job = SimpleNamespace(id=f"job-{len(self.jobs)}", session_id=session_id, file_paths=file_paths, file_ids=file_ids)
+        self.jobs.append(job)
+        return job
+
+@pytest.fixture
+def client(monkeypatch):
+    queue = RecordingQueue()
+    monkeypatch.setattr(main, "ingestion_queue", queue)
+    monkeypatch.setattr(main, "llm_manager", SimpleNamespace(session_id=ACTIVE_SESSION))
+    started = threading.Event()
+    started.set()
+    monkeypatch.setattr(main, "backend_started", started)
+    main.files_memory.clear()
+    main.pending_jobs.clear()
+    # Outside a `with` block the startup hook does not run, so no model or index is loaded
+    test_client = TestClient(main.app)
+    test_client.queue = queue
+    return test_client
+
+def upload(client, session_id, name, content, file_id="file-1"):
+    response = client.post("/upload/raw", params={"id": file_id, "name": name, "session_id": session_id}, content=content)
+    assert response.status_code == 200
+    assert response.json()["bytes"] == len(content)
+    return response.json()["token"]
+
+def commit(client, session_id, files, immediate=True):
+    return client.post("/upload/commit", json={"session_id": session_id, "files": files, "IMMEDIATE_PROCESS": immediate})
+
+def test_commit_queues_upload_under_its_name(client):
+    token = upload(client, OTHER_SESSION, "notes.txt", b"some notes")
+    response = commit(client, OTHER_SESSION, [{"id": "file-1", "name": "notes.txt", "token": token}])
+
+    assert response.status_code == 200
+    assert response.json()["job_id"] == "job-0"
+    job = client.queue.jobs[0]
+    path = os.path.join(main.session_upload_folder(OTHER_SESSION), "notes.txt")
+    assert job.session_id == OTHER_SESSION
+    assert job.file_paths == [path]
+    assert job.file_ids == ["file-1"]
+    with open(path, "rb") as f:
+        assert f.read() == b"some notes"
+    assert not os.path.exists(main.raw_upload_path(main.session_upload_folder(OTHER_SESSION), token))
+
+def test_uploads_with_the_same_name_do_not_overwrite_each_other(client):
+    first = upload(client, ACTIVE_SESSION, "slides.pdf", b"first")
+    second = upload(client, ACTIVE_SESSION, "slides.pdf", b"second")
+    assert first != second
+
+    response = commit(client, ACTIVE_SESSION, [{"id": "file-1", "name": "slides.pdf", "token": first}])
+
+    assert response.status_code == 200
+    with open(client.queue.jobs[0].file_paths[0], "rb") as f:
+        assert f.read() == b"first"
+
+def test_commit_rejects_token_from_another_session(client):
+    token = upload(client, OTHER_SESSION, "notes.txt", b"some notes")
+
+    response = commit(client, ACTIVE_SESSION, [{"id": "file-1", "name": "notes.txt", "token": token}])
+
+    assert response.status_code == 400
+    assert client.queue.jobs == []
+    # The upload is still there to be committed to its own session
+    assert os.path.exists(main.raw_upload_path(main.session_upload_folder(OTHER_SESSION), token))
+
+def test_rejects_tokens_and_sessions_outside_the_upload_folder(client):
+    assert commit(client, ACTIVE_SESSION, [{"id": "file-1", "name": "notes.txt", "token": "../notes"}]).status_code == 400
+    response = client.post("/upload/raw", params={"id": "file-1", "name": "notes.txt", "session_id": "../../outside"}, content=b"x")
+    assert response.status_code == 400
+
+def test_only_uploads_to_the_active_session_wait_for_the_next_answer(client):
+    other = upload(client, OTHER_SESSION, "a.txt", b"a")
+    commit(client, OTHER_SESSION, [{"id": "file-1", "name": "a.txt", "token": other}], immediate=False)
+    assert main.pending_jobs == []
+
+    active = upload(client, ACTIVE_SESSION, "b.txt", b"b")
+    commit(client, ACTIVE_SESSION, [{"id": "file-2", "name": "b.txt", "token": active}], immediate=False)
+    assert main.pending_jobs == [client.queue.jobs[1]]